@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# batch_reports.py
+"""
+Отчёты за период по всем клиентам листа Monthly.
+
+Клиенты с заполненными ad_account_id и spreadsheet_id обрабатываются
+report_service.generate_report параллельно (BATCH_WORKERS отчётов одновременно).
+Бюджеты запросов раздельные и общие на процесс:
+  - Facebook — fb.rate_limiter.LIMITER (FB_MAX_CONCURRENCY + заголовки usage);
+  - Google   — sheets.gs_client.GOOGLE_BUCKET (GOOGLE_RPS / GOOGLE_BURST).
+
+CLI:
+    python batch_reports.py 01.10-31.10
+    python batch_reports.py --since 2025-10-01 --until 2025-10-31 --workers 8
+    python batch_reports.py 01.10-31.10 --only "gravo 2" --only "acme"
+    python batch_reports.py 01.10-31.10 --resume         # продолжить последний прогон периода
+    python batch_reports.py 01.10-31.10 --run-id 2025-10-01..2025-10-31@20251101-093000
+
+Прогон пишет контрольные точки (checkpoint.py). Каждый запуск — новый прогон
+со своим run_id; уже записанных клиентов и готовые этапы пропускает только
+явное продолжение упавшего прогона (--resume / --run-id).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+from sheets.gs_client import get_gs_client
+from catalog.master_index import load_clients
+from report_service import generate_report
+from checkpoint import CheckpointJournal, period_key, run_id_for
+from utils import normalize, parse_period_ddmm_dash_ddmm
+from config import BATCH_WORKERS
+
+# ── отбор клиентов ────────────────────────────────────────────────────────────
+def select_clients(
+    clients: List[Dict[str, Any]],
+    only: Optional[List[str]] = None,
+) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Делит клиентов на (к запуску, пропущенные с причиной)."""
+    wanted = {normalize(n) for n in only or []}
+    todo, skipped = [], []
+    for c in clients:
+        name = c.get("ad_name") or ""
+        if wanted and normalize(name) not in wanted:
+            continue
+        if not (c.get("ad_account_id") or "").strip():
+            skipped.append({"ad_name": name, "reason": "пустой ad_account_id"})
+        elif not (c.get("spreadsheet_id") or "").strip():
+            skipped.append({"ad_name": name, "reason": "пустой spreadsheet_id (таблица из пула: /onboard)"})
+        else:
+            todo.append(c)
+    return todo, skipped
+
+# ── прогон ────────────────────────────────────────────────────────────────────
+def _run_one(
+    c: Dict[str, Any],
+    since: str,
+    until: str,
+    journal: Optional[CheckpointJournal],
+    run_id: Optional[str],
+) -> Dict[str, Any]:
+    started = time.time()
+    url = generate_report(
+        ad_name=c["ad_name"],
+        ad_account_id=c["ad_account_id"].strip(),
+        spreadsheet_id=c["spreadsheet_id"].strip(),
+        since=since,
+        until=until,
+        journal=journal,
+        run_id=run_id,
+    )
+    return {"ad_name": c["ad_name"], "url": url, "seconds": round(time.time() - started, 1)}
+
+def run_batch(
+    since: str,
+    until: str,
+    workers: int = BATCH_WORKERS,
+    only: Optional[List[str]] = None,
+    progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+    run_id: Optional[str] = None,
+    resume: bool = False,
+    fresh: bool = False,
+    checkpoint: bool = True,
+) -> Dict[str, Any]:
+    """
+    Отчёты по всем подходящим клиентам за [since..until] (YYYY-MM-DD).
+    progress(done, total, item) вызывается после каждого клиента (item — запись ok/failed).
+    Ошибка одного клиента не останавливает остальных.
+    checkpoint=True — этапы пишутся в журнал под run_id. По умолчанию это новый
+    прогон (run_id_for); продолжить упавший — передать его run_id или resume=True
+    (последний прогон периода). fresh=True — журнал прогона сначала очищается.
+    Возвращает сводку: {since, until, run_id, total, ok, failed, skipped, seconds}.
+    """
+    started = time.time()
+    journal = CheckpointJournal() if checkpoint else None
+    if journal:
+        if not run_id and resume:
+            run_id = journal.latest_run(period_key(since, until))
+            if run_id:
+                print(f"↻ Продолжаю прогон {run_id}")
+        run_id = run_id or run_id_for(since, until, started)
+        if fresh:
+            journal.reset(run_id)
+    else:
+        run_id = None
+    todo, skipped = select_clients(load_clients(get_gs_client()), only)
+    summary: Dict[str, Any] = {
+        "since": since, "until": until, "run_id": run_id, "total": len(todo),
+        "ok": [], "failed": [], "skipped": skipped,
+    }
+    print(f"▶ Пакетный прогон {since}..{until}: клиентов {len(todo)}, пропущено {len(skipped)}, потоков {workers}")
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo) or 1))) as pool:
+        futures = {pool.submit(_run_one, c, since, until, journal, run_id): c for c in todo}
+        for fut in as_completed(futures):
+            c = futures[fut]
+            try:
+                item = fut.result()
+                summary["ok"].append(item)
+            except Exception as e:
+                item = {"ad_name": c.get("ad_name"), "error": f"{type(e).__name__}: {e}"}
+                summary["failed"].append(item)
+                print(f"❌ {item['ad_name']}: {item['error']}")
+            done += 1
+            if progress:
+                try:
+                    progress(done, len(todo), item)
+                except Exception as e:
+                    print(f"⚠️ progress callback: {type(e).__name__}: {e}")
+
+    summary["seconds"] = round(time.time() - started, 1)
+    return summary
+
+def format_summary(summary: Dict[str, Any], max_lines: int = 30) -> str:
+    """Человекочитаемая сводка (plain text — для консоли и Telegram)."""
+    lines = [
+        f"Период: {summary['since']}..{summary['until']}"
+        + (f" (прогон {summary['run_id']})" if summary.get("run_id") else ""),
+        f"ОК: {len(summary['ok'])} | ERR: {len(summary['failed'])} | "
+        f"пропущено: {len(summary['skipped'])} | за {summary.get('seconds', 0):.0f} с",
+    ]
+    if summary["failed"]:
+        lines.append("❌ Ошибки:")
+        lines += [f"  - {f['ad_name']}: {f['error']}" for f in summary["failed"][:max_lines]]
+    if summary["skipped"]:
+        lines.append("⚠️ Пропущены:")
+        lines += [f"  - {s['ad_name']}: {s['reason']}" for s in summary["skipped"][:max_lines]]
+    return "\n".join(lines)
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Отчёты за период по всем клиентам Monthly")
+    ap.add_argument("period", nargs="?", help="период DD.MM-DD.MM")
+    ap.add_argument("--since", help="YYYY-MM-DD (вместо period)")
+    ap.add_argument("--until", help="YYYY-MM-DD (вместо period)")
+    ap.add_argument("--workers", type=int, default=BATCH_WORKERS, help="параллельных отчётов")
+    ap.add_argument("--only", action="append", help="только эти клиенты (ad_name), можно несколько раз")
+    ap.add_argument("--json", action="store_true", help="вывести сводку в JSON")
+    ap.add_argument("--run-id", help="продолжить прогон с этим id (см. python checkpoint.py runs)")
+    ap.add_argument("--resume", action="store_true", help="продолжить последний прогон периода")
+    ap.add_argument("--fresh", action="store_true", help="с --run-id/--resume: забыть его контрольные точки")
+    ap.add_argument("--no-checkpoint", action="store_true", help="не вести журнал контрольных точек")
+    args = ap.parse_args(argv)
+
+    if args.since and args.until:
+        since, until = args.since, args.until
+    elif args.period:
+        since, until = parse_period_ddmm_dash_ddmm(args.period)
+    else:
+        ap.error("нужен period или --since/--until")
+
+    def _progress(done: int, total: int, item: Dict[str, Any]):
+        mark = "✅" if "url" in item else "❌"
+        print(f"[{done}/{total}] {mark} {item['ad_name']}")
+
+    summary = run_batch(
+        since, until, workers=args.workers, only=args.only, progress=_progress,
+        run_id=args.run_id, resume=args.resume, fresh=args.fresh, checkpoint=not args.no_checkpoint,
+    )
+    print("\n— РЕЗЮМЕ —")
+    print(json.dumps(summary, ensure_ascii=False, indent=2) if args.json else format_summary(summary))
+    sys.exit(1 if summary["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+# benchmarks/run.py
+"""
+Сквозные бенчмарки конвейера отчётов на локальном стенде (fakes/stand.py).
+
+Сценарии:
+  report/<N>   — report_service.generate_report по аккаунту из N кампаний:
+                 cold (пустые кэши) и rerun (повтор того же периода новым процессом);
+  monthly/<N>  — run_monthly_report.main по тому же аккаунту;
+  batch/<K>    — batch_reports.run_batch по K клиентам (по --batch-campaigns кампаний);
+  micro/<fn>   — strict_result_value, build_overall_effectiveness_from_fb,
+                 sheets.writer._build_campaign_rows на синтетических строках инсайтов.
+
+На каждый прогон: время, пик памяти Python (tracemalloc), вызовы Graph и Google
+(HTTP-запросы, из них Drive), запросы записи Sheets и подзапросы batchUpdate —
+всего и на отчёт. Каждый прогон — отдельный процесс: config.py читает env при
+импорте, а кэши процесса (meta_cache, master_index, клиенты) не должны
+переживать прогон. Стенд живёт в родительском процессе и в замер памяти не входит.
+
+    python -m benchmarks.run run                                  # полный набор → .cache/bench/<rev>.json
+    python -m benchmarks.run run --quick --out /tmp/bench.json
+    python -m benchmarks.run run --only report --campaigns 5,2000 --latency 50
+    python -m benchmarks.run compare .cache/bench/old.json .cache/bench/new.json
+
+compare завершается с кодом 1, если в каком-то сценарии выросло число вызовов
+API или запросов записи; время и память сравниваются с допуском (--tolerance)
+и только предупреждают.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fakes.base import Faults
+from fakes.stand import Stand
+from fakes.synthetic import World
+
+FORMAT_VERSION = 1
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CAMPAIGN_SIZES = (5, 50, 200, 1000, 2000)
+CLIENT_COUNTS = (10, 50, 100, 500)
+QUICK_CAMPAIGN_SIZES = (5, 200)
+QUICK_CLIENT_COUNTS = (10,)
+PERIOD = "01.09-30.09"   # закрытый месяц: данные не «дозревают», кэш FB живёт долго
+
+# Окружение прогонов: без пауз лимитеров и длинных бэкоффов — меряем работу, а не сон.
+# Google-бюджет выключен: на стенде квот нет, а с ним время упирается в GOOGLE_RPS.
+BENCH_ENV = {
+    "GOOGLE_RPS": "0",
+    "FB_BACKOFF_BASE": "0.05",
+    "FB_BACKOFF_MAX": "1",
+    "FB_USAGE_PAUSE_SEC": "1",
+    "FB_ASYNC_POLL_MIN": "0.05",
+    "FB_ASYNC_POLL_MAX": "0.2",
+    "PYTHONIOENCODING": "utf-8",
+}
+
+# Счётчики, рост которых — регрессия (compare)
+COUNT_KEYS = ("graph_calls", "google_calls", "drive_calls", "sheets_writes", "sheet_requests")
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                       ДОЧЕРНИЙ ПРОЦЕСС: ОДИН ПРОГОН
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _fake_call(base_url: str, path: str) -> Dict[str, Any]:
+    method = "POST" if path == "/__reset" else "GET"
+    req = urllib.request.Request(base_url + path, data=b"" if method == "POST" else None, method=method)
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+def _reset_stats() -> None:
+    for var in ("FB_GRAPH_URL", "GOOGLE_API_URL"):
+        _fake_call(os.environ[var], "/__reset")
+
+def _api_counts() -> Dict[str, Any]:
+    graph = _fake_call(os.environ["FB_GRAPH_URL"], "/__stats")
+    google = _fake_call(os.environ["GOOGLE_API_URL"], "/__stats")
+    return {
+        "graph_calls": graph.get("requests", 0),
+        "google_calls": google.get("requests", 0),
+        "drive_calls": sum(v for k, v in google.items() if k.startswith("drive.")) - google.get("drive.batch", 0),
+        "sheets_writes": google.get("writes", 0),
+        "sheet_requests": sum(v for k, v in google.items() if k.startswith("req.")),
+        "graph": {k: v for k, v in sorted(graph.items()) if k != "requests"},
+        "google": {k: v for k, v in sorted(google.items()) if k != "requests"},
+    }
+
+def _measure(fn: Callable[[], Any]) -> Tuple[Dict[str, Any], Any]:
+    """Время и пик памяти одного вызова; ошибка не роняет прогон, а попадает в результат."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    value, error = None, None
+    try:
+        value = fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_s": round(wall, 3), "peak_mb": round(peak / 2**20, 2), "error": error}, value
+
+def _client(name: str) -> Dict[str, Any]:
+    from sheets.gs_client import get_gs_client
+    from catalog.master_index import find_client_by_name
+
+    client = find_client_by_name(get_gs_client(), name)
+    if not client:
+        raise RuntimeError(f"Клиент не найден на стенде: {name}")
+    return client
+
+def _case_report(spec: Dict[str, Any]) -> Dict[str, Any]:
+    from report_service import generate_report
+    from utils import parse_period_ddmm_dash_ddmm
+
+    client = _client(spec["client"])
+    since, until = parse_period_ddmm_dash_ddmm(PERIOD)
+    _reset_stats()
+    out, _ = _measure(lambda: generate_report(
+        client["ad_name"], client["ad_account_id"], client["spreadsheet_id"], since, until,
+    ))
+    out.update(_api_counts())
+    return out
+
+def _case_monthly(spec: Dict[str, Any]) -> Dict[str, Any]:
+    import run_monthly_report
+
+    _client(spec["client"])   # прогреть master_index, как у бота к моменту команды
+    _reset_stats()
+    out, _ = _measure(lambda: run_monthly_report.main(spec["client"], PERIOD))
+    out.update(_api_counts())
+    return out
+
+def _case_batch(spec: Dict[str, Any]) -> Dict[str, Any]:
+    from batch_reports import run_batch
+    from utils import parse_period_ddmm_dash_ddmm
+
+    since, until = parse_period_ddmm_dash_ddmm(PERIOD)
+    _reset_stats()
+    out, summary = _measure(lambda: run_batch(since, until))
+    out.update(_api_counts())
+    if summary:
+        out["ok"] = len(summary["ok"])
+        out["failed"] = len(summary["failed"])
+        if summary["failed"] and not out["error"]:
+            out["error"] = summary["failed"][0]["error"]
+        reports = max(len(summary["ok"]), 1)
+        out["per_report"] = {k: round(out[k] / reports, 2) for k in COUNT_KEYS}
+    return out
+
+def _micro_rows(campaigns: int, seed: int) -> List[Dict[str, Any]]:
+    world = World(seed)
+    acc = world.add_account(campaigns=campaigns, deleted_share=0.0)
+    since, until = dt.date(2025, 9, 1), dt.date(2025, 9, 30)
+    rows = list(world.insights(acc.id, since, until, daily=False))
+    for i, r in enumerate(rows):
+        # поля после обогащения (fb/enrichment.py) — их читает _build_campaign_rows
+        r["effective_status"] = "ACTIVE" if i % 3 else "PAUSED"
+        r["daily_budget"] = 10.0 + i % 50
+        r["preview_link"] = f"https://fb.me/{r['campaign_id']}"
+    return rows
+
+def _case_micro(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Лучшее из repeat прогонов функции по всем строкам. Строки каждый раз — свежие
+    копии: parse_row кэширует разбор в самой строке, а мерить нужно первый проход.
+    """
+    from fb.insights import strict_result_value, build_overall_effectiveness_from_fb
+    from sheets.writer import _build_campaign_rows
+
+    fns: Dict[str, Callable[[List[Dict[str, Any]]], Any]] = {
+        "strict_result_value": lambda rows: [strict_result_value(r) for r in rows],
+        "build_overall_effectiveness_from_fb":
+            lambda rows: build_overall_effectiveness_from_fb(rows, "2025-09-01", "2025-09-30"),
+        "_build_campaign_rows": _build_campaign_rows,
+    }
+    fn = fns[spec["fn"]]
+    rows = _micro_rows(spec["rows"], spec.get("seed", 1))
+    best = float("inf")
+    for _ in range(spec["repeat"]):
+        batch = [dict(r) for r in rows]
+        started = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "rows": len(rows),
+        "repeat": spec["repeat"],
+        "best_s": round(best, 6),
+        "us_per_row": round(best / max(len(rows), 1) * 1e6, 3),
+    }
+
+_CASES = {
+    "report": _case_report,
+    "monthly": _case_monthly,
+    "batch": _case_batch,
+    "micro": _case_micro,
+}
+
+def _child(spec: Dict[str, Any], verbose: bool) -> None:
+    # вывод конвейера — в stderr (verbose) или в никуда; stdout — только результат
+    sink = sys.stderr if verbose else io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        result = _CASES[spec["kind"]](spec)
+    print(json.dumps(result, ensure_ascii=False))
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                       РОДИТЕЛЬ: СТЕНД И НАБОР СЦЕНАРИЕВ
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _spawn(spec: Dict[str, Any], env: Dict[str, str], verbose: bool, timeout: float) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "benchmarks.run", "_case", json.dumps(spec)]
+    if verbose:
+        cmd.append("--verbose")
+    try:
+        proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"error": f"timeout {timeout:.0f}s"}
+    lines = proc.stdout.decode("utf-8", "replace").strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {"error": f"процесс завершился с кодом {proc.returncode}"}
+    return json.loads(lines[-1])
+
+def _child_env(stand: Optional[Stand]) -> Dict[str, str]:
+    env = dict(os.environ)
+    if stand:
+        env.update(stand.env)
+    env.update(BENCH_ENV)
+    return env
+
+def _faults(args) -> Optional[Faults]:
+    if not (args.latency or args.jitter):
+        return None
+    return Faults(args.latency, args.jitter, seed=args.seed)
+
+def _with_stand(world: World, args, runs: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Поднять стенд по world и выполнить прогоны по очереди (кэши FB/журнал — общие на стенд)."""
+    out: Dict[str, Any] = {}
+    with Stand(world, _faults(args), _faults(args)) as stand:
+        env = _child_env(stand)
+        for name, spec in runs:
+            out[name] = _spawn(spec, env, args.verbose, args.timeout)
+    return out
+
+def _single_account(campaigns: int, seed: int) -> World:
+    world = World(seed)
+    world.add_account(campaigns=campaigns, name=f"bench {campaigns}")
+    return world
+
+def _plan(args) -> List[Tuple[str, Callable[[], Dict[str, Any]]]]:
+    """Список (имя сценария, функция, возвращающая его результат)."""
+    plan: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+    kinds = set(args.only or _CASES)
+
+    for n in args.campaigns:
+        name = f"bench {n}"
+        if "report" in kinds:
+            spec = {"kind": "report", "client": name}
+            plan.append((f"report/{n}", lambda n=n, spec=spec: {
+                "campaigns": n,
+                "runs": _with_stand(_single_account(n, args.seed), args, [("cold", spec), ("rerun", spec)]),
+            }))
+        if "monthly" in kinds:
+            spec = {"kind": "monthly", "client": name}
+            plan.append((f"monthly/{n}", lambda n=n, spec=spec: {
+                "campaigns": n,
+                "runs": _with_stand(_single_account(n, args.seed), args, [("cold", spec)]),
+            }))
+
+    if "batch" in kinds:
+        for k in args.clients:
+            def _batch(k=k):
+                world = World(args.seed)
+                for i in range(k):
+                    world.add_account(campaigns=args.batch_campaigns, name=f"bench client {i + 1}")
+                return {
+                    "clients": k,
+                    "campaigns": args.batch_campaigns,
+                    "runs": _with_stand(world, args, [("cold", {"kind": "batch"})]),
+                }
+            plan.append((f"batch/{k}", _batch))
+
+    if "micro" in kinds:
+        for fn in ("strict_result_value", "build_overall_effectiveness_from_fb", "_build_campaign_rows"):
+            spec = {"kind": "micro", "fn": fn, "rows": args.micro_rows, "repeat": args.micro_repeat, "seed": args.seed}
+            plan.append((f"micro/{fn}", lambda spec=spec: _spawn(spec, _child_env(None), args.verbose, args.timeout)))
+    return plan
+
+def _git_rev() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=10)
+        return out.stdout.decode().strip() or "unknown"
+    except Exception:
+        return "unknown"
+
+def _summary_line(name: str, case: Dict[str, Any]) -> str:
+    if name.startswith("micro/"):
+        if case.get("error"):
+            return f"❌ {name}: {case['error']}"
+        return f"⏱ {name}: {case['us_per_row']} мкс/строка ({case['rows']} строк)"
+    parts = []
+    for run, m in case.get("runs", {}).items():
+        if m.get("error"):
+            parts.append(f"{run} ❌ {m['error']}")
+            continue
+        parts.append(
+            f"{run} {m['wall_s']}s {m['peak_mb']}MB graph={m['graph_calls']} "
+            f"google={m['google_calls']} writes={m['sheets_writes']}"
+        )
+    return f"📊 {name}: " + " | ".join(parts)
+
+def run_suite(args) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "format": FORMAT_VERSION,
+        "rev": _git_rev(),
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "params": {
+            "period": PERIOD, "seed": args.seed, "latency_ms": args.latency, "jitter_ms": args.jitter,
+            "batch_campaigns": args.batch_campaigns, "micro_rows": args.micro_rows, "env": BENCH_ENV,
+        },
+        "cases": {},
+    }
+    for name, fn in _plan(args):
+        started = time.time()
+        case = fn()
+        result["cases"][name] = case
+        print(_summary_line(name, case) + f"  [{time.time() - started:.0f}s]", flush=True)
+    return result
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                       СРАВНЕНИЕ ДВУХ ПРОГОНОВ
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _flatten(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """{"report/200 cold": метрики, "batch/10 cold": …, "micro/…": …}"""
+    flat: Dict[str, Dict[str, Any]] = {}
+    for name, case in data.get("cases", {}).items():
+        if "runs" in case:
+            for run, m in case["runs"].items():
+                flat[f"{name} {run}"] = m
+        else:
+            flat[name] = case
+    return flat
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.25) -> Tuple[List[str], List[str]]:
+    """
+    (регрессии, предупреждения). Регрессия — рост любого счётчика вызовов
+    (COUNT_KEYS, в т.ч. на отчёт) или новая ошибка; предупреждение — время/память
+    хуже более чем на tolerance.
+    """
+    regressions, warnings = [], []
+    a, b = _flatten(old), _flatten(new)
+    for key in sorted(set(a) & set(b)):
+        was, now = a[key], b[key]
+        if now.get("error") and not was.get("error"):
+            regressions.append(f"{key}: ошибка {now['error']}")
+            continue
+        if was.get("error") or now.get("error"):
+            continue
+        for k in COUNT_KEYS:
+            if k in was and k in now and now[k] > was[k]:
+                regressions.append(f"{key}: {k} {was[k]} → {now[k]}")
+        for k in COUNT_KEYS:
+            x, y = (was.get("per_report") or {}).get(k), (now.get("per_report") or {}).get(k)
+            if x is not None and y is not None and y > x:
+                regressions.append(f"{key}: {k}/отчёт {x} → {y}")
+        for k in ("wall_s", "peak_mb", "us_per_row"):
+            x, y = was.get(k), now.get(k)
+            if x and y and y > x * (1 + tolerance):
+                warnings.append(f"{key}: {k} {x} → {y} (+{(y / x - 1) * 100:.0f}%)")
+    for key in sorted(set(a) - set(b)):
+        warnings.append(f"{key}: нет в новом прогоне")
+    return regressions, warnings
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+def _ints(s: str) -> List[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Бенчмарки конвейера отчётов на стенде")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rp = sub.add_parser("run", help="прогнать набор сценариев и записать JSON")
+    rp.add_argument("--out", help="куда записать JSON (по умолчанию .cache/bench/<rev>.json)")
+    rp.add_argument("--quick", action="store_true", help=f"кампаний {QUICK_CAMPAIGN_SIZES}, клиентов {QUICK_CLIENT_COUNTS}")
+    rp.add_argument("--only", action="append", choices=sorted(_CASES), help="только эти виды сценариев (можно несколько)")
+    rp.add_argument("--campaigns", type=_ints, help="размеры аккаунтов через запятую")
+    rp.add_argument("--clients", type=_ints, help="размеры пакетных прогонов через запятую")
+    rp.add_argument("--batch-campaigns", type=int, default=20, help="кампаний у клиента в пакетном прогоне")
+    rp.add_argument("--micro-rows", type=int, default=2000)
+    rp.add_argument("--micro-repeat", type=int, default=5)
+    rp.add_argument("--latency", type=float, default=0.0, help="задержка ответа стенда, мс")
+    rp.add_argument("--jitter", type=float, default=0.0, help="± к задержке, мс")
+    rp.add_argument("--seed", type=int, default=1)
+    rp.add_argument("--timeout", type=float, default=3600, help="предел на один прогон, сек")
+    rp.add_argument("--verbose", action="store_true", help="вывод конвейера в stderr")
+
+    cp = sub.add_parser("compare", help="сравнить два JSON (код 1 — рост числа вызовов)")
+    cp.add_argument("old")
+    cp.add_argument("new")
+    cp.add_argument("--tolerance", type=float, default=0.25, help="допуск по времени/памяти (доля)")
+
+    xp = sub.add_parser("_case", help=argparse.SUPPRESS)
+    xp.add_argument("spec")
+    xp.add_argument("--verbose", action="store_true")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "_case":
+        _child(json.loads(args.spec), args.verbose)
+        return 0
+
+    if args.cmd == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        regressions, warnings = compare(old, new, args.tolerance)
+        print(f"Сравнение {old.get('rev')} → {new.get('rev')}")
+        for line in warnings:
+            print(f"⚠️ {line}")
+        for line in regressions:
+            print(f"❌ {line}")
+        if not regressions:
+            print("✅ Число вызовов API не выросло")
+        return 1 if regressions else 0
+
+    args.campaigns = args.campaigns or list(QUICK_CAMPAIGN_SIZES if args.quick else CAMPAIGN_SIZES)
+    args.clients = args.clients or list(QUICK_CLIENT_COUNTS if args.quick else CLIENT_COUNTS)
+    result = run_suite(args)
+    out = args.out or os.path.join(ROOT, ".cache", "bench", f"{result['rev']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,10 +16,19 @@ from telebot.types import Message
 # Тогда импорты ниже работают без sys.path-хаков.
 import gspread
 from sheets.gs_client import get_gs_client
-from catalog.master_index import load_clients, find_client_by_name
+from catalog.master_index import load_clients
 
 # 👇 Главный оркестратор отчёта (создание листа из шаблона, бюджеты, превью)
 from run_monthly_report import main as run_monthly  # main(ad_name: str, period_text: str) -> url
+from batch_reports import run_batch, format_summary
+from sheets.pool import assign_missing, start_refiller
+from bot.jobs import JobQueue, Job, QUEUED, RUNNING, DONE, FAILED
+from fb.rate_limiter import LIMITER
+from config import (
+    REPORT_WORKERS, REPORT_JOBS_HISTORY, REPORT_RESULT_TTL,
+    POOL_SIZE, GDRIVE_FOLDER_ID, TEMPLATE_SPREADSHEET_ID,
+)
+from utils import parse_period_ddmm_dash_ddmm, normalize
 
 # ──────────────────────────────────────────────────────────────────────────────
 # ENV
@@ -313,48 +322,220 @@ def on_period_reply(msg, ad_name: str):
 
     period_text = (msg.text or "").strip()
 
-    # Стартовое уведомление — можно с Markdown
-    _send_safe(f"⏳ Формирую отчёт: {_bold_safe(ad_name)} • {period_text}")
+    # Отчёт считается в фоне — хендлер сразу свободен для следующих запросов.
+    # Тот же аккаунт и период, что уже в работе/недавно готов, — не пересобираем.
+    job, attached = JOBS.submit_once(
+        _report_key(ad_name, period_text),
+        run_monthly, ad_name, period_text,
+        reuse_ttl=REPORT_RESULT_TTL,
+        label=f"{ad_name} • {period_text}",
+        meta={"ad_name": ad_name, "period": period_text},
+    )
+    if attached and job.finished:
+        _send_plain(
+            f"✅ Отчёт уже готов (#{job.id}, {time.time() - job.finished_at:.0f} с назад)\n"
+            f"Клиент: {ad_name}\n"
+            f"Период: {period_text}\n"
+            f"{job.result}",
+            disable_web_page_preview=True,
+        )
+        _send_make_report_button()
+        return
+    if attached:
+        _send_safe(f"⏳ Такой отчёт уже формируется — присоединил к задаче #{job.id}: "
+                   f"{_bold_safe(ad_name)} • {period_text}")
+        return
 
+    ahead = JOBS.position(job)
+    queue_note = f" (перед ней в очереди: {ahead})" if ahead else ""
+    _send_safe(f"⏳ Задача #{job.id}: {_bold_safe(ad_name)} • {period_text}{queue_note}")
+
+def _report_key(ad_name: str, period_text: str) -> Tuple[str, str, str]:
+    """
+    Ключ склейки одинаковых отчётов: (ad_account_id, since, until).
+    Период разбираем тем же парсером, что и run_monthly_report; аккаунт — из
+    списка клиентов, по которому построена клавиатура (_CLIENTS_CACHE): он уже
+    в памяти, и хендлер Telegram не ходит в Sheets. Нет клиента в списке —
+    ключом служит имя: задача всё равно встанет в очередь, а ошибку покажет она сама.
+    """
     try:
-        # 💥 Главный вызов
-        url = run_monthly(ad_name, period_text)
+        since, until = parse_period_ddmm_dash_ddmm(period_text)
+    except Exception:
+        since, until = _period_parse(period_text)
+    key = normalize(ad_name)
+    clients = _CLIENTS_CACHE   # без _get_clients(): по TTL он перечитал бы лист
+    client = next((c for c in clients if normalize(c.get("ad_name", "")) == key), {})
+    account = (client.get("ad_account_id") or "").strip() or key
+    return account, since, until
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ФОНОВАЯ ОЧЕРЕДЬ ОТЧЁТОВ
+
+_STATUS_ICONS = {QUEUED: "🕒", RUNNING: "⏳", DONE: "✅", FAILED: "⚠️"}
+
+def _on_job_finish(job: Job):
+    """Вызывается из рабочего потока: результат задачи — в форум-тему, строго plain."""
+    ad_name = job.meta.get("ad_name", "")
+    period_text = job.meta.get("period", "")
+
+    if job.meta.get("kind") == "onboard":
+        if job.status == DONE:
+            res = job.result or {}
+            ok = [n for n, sid in res.items() if sid]
+            lines = [f"🆕 Онбординг #{job.id}: таблицы выданы {len(ok)} из {len(res)}"]
+            lines += [f"  - {n}: не выдана" for n, sid in res.items() if not sid][:30]
+            _send_plain("\n".join(lines), disable_web_page_preview=True)
+        else:
+            log_err(RuntimeError(f"job #{job.id} {job.label}: {job.error}"))
+            _send_plain(f"⚠️ Онбординг #{job.id} упал: {job.error}")
+        return
+
+    if job.meta.get("kind") == "batch":
+        if job.status == DONE:
+            _send_plain(f"🏁 Пакет #{job.id} завершён\n" + format_summary(job.result),
+                        disable_web_page_preview=True)
+        else:
+            log_err(RuntimeError(f"job #{job.id} {job.label}: {job.error}"))
+            _send_plain(f"⚠️ Пакет #{job.id} упал: {job.error}")
+        return
+
+    if job.status == DONE:
+        url = job.result
         if not url:
             url = "(URL не получен)"
         elif not isinstance(url, str):
             url = str(url)
-
-        # ✅ Успешное сообщение — строго plain (без Markdown/HTML)
-        success_plain = (
-            "✅ Отчёт готов\n"
+        merged = f", запросов: {1 + len(job.followers)}" if job.followers else ""
+        _send_plain(
+            f"✅ Отчёт готов (#{job.id}, {job.elapsed():.0f} с{merged})\n"
             f"Клиент: {ad_name}\n"
             f"Период: {period_text}\n"
-            f"{url}"
+            f"{url}",
+            disable_web_page_preview=True,
         )
-
-        print("[DEBUG] Попытка отправить сообщение в форум (plain)")
-        print(f"[DEBUG] CHAT_ID={TELEGRAM_CHAT_ID}, TOPIC_ID={TELEGRAM_TOPIC_ID}")
-        print(f"[DEBUG] TEXT:\n{success_plain}")
-
-        _send_plain(success_plain, disable_web_page_preview=True)
-
-        # Кнопка — отдельно
         _send_make_report_button()
+        return
 
-    except Exception as e:
-        import traceback
-        print("[ERROR] Ошибка при отправке сообщения:")
-        traceback.print_exc()
-        log_err(e)
+    log_err(RuntimeError(f"job #{job.id} {job.label}: {job.error}"))
+    _send_plain(
+        f"⚠️ Отчёт #{job.id} не сформирован\n"
+        f"Клиент: {ad_name}\n"
+        f"Период: {period_text}\n"
+        f"Ошибка: {job.error}",
+        disable_web_page_preview=True,
+    )
+    _send_make_report_button("Хочешь попробовать другой отчёт?")
+
+JOBS = JobQueue(REPORT_WORKERS, on_finish=_on_job_finish, history=REPORT_JOBS_HISTORY, name="report")
+
+def _job_line(job: Job) -> str:
+    icon = _STATUS_ICONS.get(job.status, "")
+    return f"{icon} #{job.id} {job.status} · {job.elapsed():.0f} с · {job.label}"
+
+def _fb_usage_line(max_scopes: int = 5) -> str:
+    """Загрузка лимитов Graph по заголовкам usage (LIMITER) и активные паузы — для /jobs."""
+    snap = LIMITER.snapshot()
+    usage = sorted(snap["usage"].items(), key=lambda kv: -kv[1])[:max_scopes]
+    parts = [f"{scope} {pct:.0f}%" for scope, pct in usage]
+    parts += [f"⏸ {scope} {sec:.0f} с" for scope, sec in snap["blocked"].items()]
+    return "FB usage: " + (" · ".join(parts) if parts else "нет данных")
+
+def _batch_progress(title: str):
+    """Прогресс пакета в тему — примерно каждые 10% (не спамим на сотнях клиентов)."""
+    last = {"step": -1}
+
+    def _cb(done: int, total: int, item: Dict[str, Any]):
+        step = done * 10 // max(total, 1)
+        if step != last["step"] or done == total:
+            last["step"] = step
+            _send_plain(f"📊 {title}: {done}/{total} (последний: {item.get('ad_name')})")
+    return _cb
+
+@BOT.message_handler(commands=["all"])
+def cmd_all(msg):
+    """
+    /all 01.10-31.10 [resume] — отчёты по всем клиентам Monthly за период (в фоне).
+    Каждый /all — новый прогон: все клиенты пересобираются по свежим данным.
+    resume — продолжить последний (упавший) прогон периода по контрольным точкам,
+    уже записанные клиенты пропускаются.
+    """
+    if msg.chat.id != TELEGRAM_CHAT_ID:
+        return
+    args = (msg.text or "").split()[1:]
+    resume = "resume" in args
+    period_text = " ".join(a for a in args if a != "resume")
+    try:
+        since, until = parse_period_ddmm_dash_ddmm(period_text)
+    except Exception:
+        _send_plain("Использование: /all 01.10-31.10 [resume]")
+        return
 
-        # Фолбек — тоже строго plain
-        _send_plain(
-            f"⚠️ Отчёт сформирован, но возникла ошибка при отправке сообщения.\nСсылка: {url}",
-            disable_web_page_preview=True,
-        )
-        _send_make_report_button("Хочешь попробовать другой отчёт?")
+    job, attached = JOBS.submit_once(
+        ("__all__", since, until),
+        run_batch, since, until,
+        progress=_batch_progress(f"Пакет {since}..{until}"),
+        resume=resume,
+        label=f"ВСЕ КЛИЕНТЫ • {period_text}",
+        meta={"kind": "batch", "period": period_text},
+    )
+    if attached:
+        _send_plain(f"⏳ Пакет за этот период уже идёт — задача #{job.id}")
+        return
+    _send_plain(f"⏳ Пакет #{job.id}: все клиенты • {since}..{until} (сводка придёт в конце)")
 
+@BOT.message_handler(commands=["onboard"])
+def cmd_onboard(msg):
+    """
+    /onboard — выдать таблицы отчётов из пула (sheets/pool.py) всем строкам Monthly
+    без spreadsheet_id, одной пачкой и в фоне; пул потом пополняется сам.
+    """
+    if msg.chat.id != TELEGRAM_CHAT_ID:
+        return
+    job, attached = JOBS.submit_once(
+        ("__onboard__",),
+        assign_missing,
+        label="ОНБОРДИНГ • таблицы из пула",
+        meta={"kind": "onboard"},
+    )
+    if attached:
+        _send_plain(f"⏳ Онбординг уже идёт — задача #{job.id}")
+        return
+    _send_plain(f"⏳ Онбординг #{job.id}: выдаю таблицы новым строкам Monthly")
 
+@BOT.message_handler(commands=["jobs"])
+def cmd_jobs(msg):
+    if msg.chat.id != TELEGRAM_CHAT_ID:
+        return
+    counts = JOBS.counts()
+    lines = [
+        f"Очередь: {counts[QUEUED]} · в работе: {counts[RUNNING]} · "
+        f"готово: {counts[DONE]} · ошибок: {counts[FAILED]} · потоков: {JOBS.workers}",
+        _fb_usage_line(),
+    ]
+    lines += [_job_line(j) for j in JOBS.jobs(limit=15)]
+    _send_plain("\n".join(lines), disable_web_page_preview=True)
+
+@BOT.message_handler(commands=["job"])
+def cmd_job(msg):
+    if msg.chat.id != TELEGRAM_CHAT_ID:
+        return
+    parts = (msg.text or "").split()
+    try:
+        job = JOBS.get(int(parts[1].lstrip("#")))
+    except (IndexError, ValueError):
+        _send_plain("Использование: /job <номер>")
+        return
+    if job is None:
+        _send_plain("Нет такой задачи (или она уже выпала из истории).")
+        return
+    lines = [_job_line(job)]
+    if job.status == QUEUED:
+        lines.append(f"Перед ней в очереди: {JOBS.position(job)}")
+    if job.status == DONE:
+        lines.append(str(job.result))
+    if job.status == FAILED:
+        lines.append(f"Ошибка: {job.error}")
+    _send_plain("\n".join(lines), disable_web_page_preview=True)
 
 # ──────────────────────────────────────────────────────────────────────────────
 @BOT.message_handler(commands=["ping"])
@@ -364,6 +545,8 @@ def ping(msg):
     _send_safe("pong ✅")
 
 def main():
+    if POOL_SIZE > 0 and GDRIVE_FOLDER_ID and TEMPLATE_SPREADSHEET_ID:
+        start_refiller()   # держим POOL_SIZE готовых таблиц для /onboard
     print("▶ bot_monthly: polling started")
     BOT.infinity_polling(timeout=60, long_polling_timeout=50)
 
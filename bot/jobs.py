@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-  # bot/jobs.py
+"""
+Очередь фоновых задач для бота (в процессе).
+
+Хендлер telebot только ставит задачу и сразу освобождается; отчёты считают
+REPORT_WORKERS рабочих потоков. У каждой задачи есть номер и статус
+queued → running → done/failed; по завершении вызывается on_finish(job)
+(бот отправляет результат в форум-тему).
+
+Одинаковые запросы склеиваются по ключу (submit_once): пока задача с тем же
+ключом в очереди/в работе — новые запросы присоединяются к ней; успешный
+результат ещё reuse_ttl секунд отдаётся без повторного запуска.
+"""
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+@dataclass
+class Job:
+    id: int
+    label: str
+    fn: Callable[..., Any] = field(repr=False)
+    args: tuple = field(default=(), repr=False)
+    kwargs: Dict[str, Any] = field(default_factory=dict, repr=False)
+    meta: Dict[str, Any] = field(default_factory=dict)   # что угодно для on_finish (клиент, период…)
+    key: Optional[Hashable] = None                        # ключ склейки одинаковых запросов
+    followers: List[Dict[str, Any]] = field(default_factory=list)  # meta присоединившихся запросов
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def elapsed(self) -> float:
+        start = self.started_at or self.created_at
+        return (self.finished_at or time.time()) - start
+
+class JobQueue:
+    """FIFO-очередь с пулом из workers потоков и историей последних history задач."""
+
+    def __init__(
+        self,
+        workers: int,
+        on_finish: Optional[Callable[[Job], None]] = None,
+        history: int = 200,
+        name: str = "jobs",
+    ):
+        self._q: "queue.Queue[Job]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._by_key: Dict[Hashable, Job] = {}   # ключ -> последняя задача с этим ключом
+        self._history = history
+        self.on_finish = on_finish
+        self.workers = workers
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"{name}-{i + 1}", daemon=True).start()
+
+    # ── постановка ───────────────────────────────────────────────────────────
+    def submit(self, fn: Callable[..., Any], *args, label: str = "", meta: Dict[str, Any] | None = None, **kwargs) -> Job:
+        with self._lock:
+            job = Job(id=next(self._ids), label=label, fn=fn, args=args, kwargs=kwargs, meta=meta or {})
+            self._jobs[job.id] = job
+            self._trim_locked()
+        self._q.put(job)
+        return job
+
+    def submit_once(
+        self,
+        key: Hashable,
+        fn: Callable[..., Any],
+        *args,
+        reuse_ttl: float = 0.0,
+        label: str = "",
+        meta: Dict[str, Any] | None = None,
+        **kwargs,
+    ) -> Tuple[Job, bool]:
+        """
+        Как submit, но с дедупликацией по key. Возвращает (job, attached):
+          - задача с тем же ключом в очереди/в работе → присоединяемся к ней;
+          - успешно завершилась не раньше reuse_ttl секунд назад → отдаём её (уже finished);
+          - иначе ставим новую задачу (attached=False).
+        """
+        with self._lock:
+            prev = self._by_key.get(key)
+            if prev is not None:
+                fresh = prev.status == DONE and time.time() - (prev.finished_at or 0) < reuse_ttl
+                if not prev.finished or fresh:
+                    if not prev.finished:
+                        prev.followers.append(meta or {})
+                    return prev, True
+            job = Job(id=next(self._ids), label=label, fn=fn, args=args, kwargs=kwargs,
+                      meta=meta or {}, key=key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            self._trim_locked()
+        self._q.put(job)
+        return job, False
+
+    def _trim_locked(self) -> None:
+        """Держим в памяти не больше history завершённых задач."""
+        finished = [jid for jid, j in self._jobs.items() if j.finished]
+        for jid in finished[: max(0, len(finished) - self._history)]:
+            job = self._jobs.pop(jid)
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    # ── выполнение ───────────────────────────────────────────────────────────
+    def _worker(self) -> None:
+        while True:
+            job = self._q.get()
+            job.status, job.started_at = RUNNING, time.time()
+            status, result, error = DONE, None, None
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                traceback.print_exc()
+                status, error = FAILED, f"{type(e).__name__}: {e}"
+            # статус меняем под локом: присоединение (submit_once) видит либо
+            # ещё живую задачу, либо уже готовый результат — без гонки
+            with self._lock:
+                job.result, job.error, job.status = result, error, status
+                job.finished_at = time.time()
+            self._q.task_done()
+            if self.on_finish:
+                try:
+                    self.on_finish(job)
+                except Exception:
+                    traceback.print_exc()
+
+    # ── статус ───────────────────────────────────────────────────────────────
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, active_only: bool = False, limit: int = 20) -> List[Job]:
+        """Последние задачи (новые в конце)."""
+        with self._lock:
+            items = [j for j in self._jobs.values() if not (active_only and j.finished)]
+        return items[-limit:]
+
+    def position(self, job: Job) -> int:
+        """Сколько задач в очереди перед job (0 — уже выполняется или следующая)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status == QUEUED and j.id < job.id)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            out = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for j in self._jobs.values():
+                out[j.status] += 1
+        return out
+
+__all__ = ["Job", "JobQueue", "QUEUED", "RUNNING", "DONE", "FAILED"]
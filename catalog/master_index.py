@@ -1,8 +1,12 @@
 # catalog/master_index.py
 from __future__ import annotations
 from typing import Optional, Dict, Any, List, Tuple
+import threading
+import time
 import gspread
 from utils import normalize
+from config import MASTER_INDEX_TTL
+from sheets import meta_cache
 
 # ── Конфиг: поддержим новые константы и обратную совместимость ────────────────
 try:
@@ -15,10 +19,14 @@ except Exception:
 HEADERS = ["ad_account_id", "ad_name", "spreadsheet_id"]
 COL_A, COL_B, COL_C = 1, 2, 3  # A, B, C
 
+# Промах по имени перечитывает лист, но не чаще раза в столько секунд
+_MISS_REFRESH_SEC = 30
+
 # ── Вспомогательно ────────────────────────────────────────────────────────────
 def _ws(gc: gspread.Client):
-    """Вернёт объект Worksheet для листа Monthly."""
-    return gc.open_by_key(SHEET_ID).worksheet(TAB_NAME)
+    """Вернёт объект Worksheet для листа Monthly (таблица и список листов — из кэша метаданных)."""
+    doc = meta_cache.open_doc(gc, SHEET_ID)
+    return meta_cache.get_worksheet(doc, TAB_NAME) or doc.worksheet(TAB_NAME)
 
 def _row_to_dict(row: List[str]) -> Dict[str, Any]:
     """Собираем dict из сырых значений ряда (A..C)."""
@@ -27,15 +35,50 @@ def _row_to_dict(row: List[str]) -> Dict[str, Any]:
     c = row[2].strip() if len(row) > 2 else ""
     return {"ad_account_id": a, "ad_name": b, "spreadsheet_id": c}
 
-def _find_row_index_by_ad_name(ws, ad_name: str) -> Optional[int]:
-    """Найдёт индекс строки (1-based) по значению в колонке B (ad_name)."""
-    target = normalize(ad_name)
-    col_b = ws.col_values(COL_B)  # весь столбец B, включая заголовок
-    # Пропускаем заголовок (строка 1)
-    for idx, val in enumerate(col_b[1:], start=2):
-        if normalize(val) == target:
-            return idx
-    return None
+# ── Индекс в памяти ───────────────────────────────────────────────────────────
+# Весь лист читается одним get_all_values; дальше поиск по нормализованному
+# ad_name — O(1). Индекс перечитывается по TTL (MASTER_INDEX_TTL) и при промахе.
+_LOCK = threading.Lock()
+_INDEX: Dict[str, Any] = {"loaded_at": 0.0, "clients": [], "by_name": {}}
+_PENDING: Dict[str, str] = {}   # normalize(ad_name) -> spreadsheet_id (очередь записи в колонку C)
+
+def _load_index(gc: gspread.Client, force: bool = False) -> Dict[str, Any]:
+    with _LOCK:
+        if not force and time.time() - _INDEX["loaded_at"] < MASTER_INDEX_TTL:
+            return _INDEX
+
+    values = _ws(gc).get_all_values()
+    clients: List[Dict[str, Any]] = []
+    by_name: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    # Ожидаем, что заголовок в первой строке
+    for idx, r in enumerate(values[1:], start=2):
+        d = _row_to_dict(r)
+        if not d["ad_name"]:
+            continue
+        clients.append(d)
+        # при дублях имени побеждает первая строка — как при линейном поиске раньше
+        by_name.setdefault(normalize(d["ad_name"]), (idx, d))
+
+    with _LOCK:
+        _INDEX.update(loaded_at=time.time(), clients=clients, by_name=by_name)
+        return _INDEX
+
+def _lookup(gc: gspread.Client, ad_name: str) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+    key = normalize(ad_name)
+    index = _load_index(gc)
+    hit = index["by_name"].get(key)
+    if hit is None and time.time() - index["loaded_at"] >= _MISS_REFRESH_SEC:
+        # клиента могли добавить только что — перечитываем лист
+        hit = _load_index(gc, force=True)["by_name"].get(key)
+    if hit is None:
+        return None, None
+    row_idx, d = hit
+    return row_idx, dict(d)
+
+def invalidate_index() -> None:
+    """Сбросить индекс (следующий запрос перечитает лист)."""
+    with _LOCK:
+        _INDEX["loaded_at"] = 0.0
 
 # ── Публичные функции ─────────────────────────────────────────────────────────
 def load_clients(gc: gspread.Client) -> List[Dict[str, Any]]:
@@ -43,52 +86,73 @@ def load_clients(gc: gspread.Client) -> List[Dict[str, Any]]:
     Загрузить всех клиентов из листа Monthly (A2:C).
     Возвращает список словарей с ключами: ad_account_id, ad_name, spreadsheet_id.
     """
-    ws = _ws(gc)
-    # get_all_records() ориентируется на заголовок в 1-й строке
-    # и вернёт список словарей; но чтобы быть устойчивыми к порядку,
-    # считываем сырые значения и сами маппим.
-    values = ws.get_all_values()
-    if not values:
-        return []
-    # Ожидаем, что заголовок в первой строке
-    data_rows = values[1:]  # со второй строки и ниже
-    clients: List[Dict[str, Any]] = []
-    for r in data_rows:
-        d = _row_to_dict(r)
-        if d["ad_name"]:
-            clients.append(d)
-    return clients
+    return [dict(d) for d in _load_index(gc)["clients"]]
 
 def find_client_by_name(gc: gspread.Client, ad_name: str) -> Optional[Dict[str, Any]]:
     """
     Найти клиента по имени (колонка B: ad_name), регистр/пробелы не важны.
     """
-    ws = _ws(gc)
-    row_idx = _find_row_index_by_ad_name(ws, ad_name)
-    if row_idx is None:
-        return None
-    row = ws.row_values(row_idx)
-    return _row_to_dict(row)
+    return _lookup(gc, ad_name)[1]
 
 def find_client_row(gc: gspread.Client, ad_name: str) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
     """
     Вернёт (row_index, client_dict). Удобно, когда сразу нужна строка для апдейта.
     """
-    ws = _ws(gc)
-    row_idx = _find_row_index_by_ad_name(ws, ad_name)
-    if row_idx is None:
-        return None, None
-    row = ws.row_values(row_idx)
-    return row_idx, _row_to_dict(row)
+    return _lookup(gc, ad_name)
 
 def write_spreadsheet_id(gc: gspread.Client, ad_name: str, spreadsheet_id: str) -> bool:
     """
     Записать spreadsheet_id (колонка C) для клиента с именем ad_name.
     Возвращает True, если запись выполнена.
     """
-    ws = _ws(gc)
-    row_idx = _find_row_index_by_ad_name(ws, ad_name)
-    if row_idx is None:
-        return False
-    ws.update_cell(row_idx, COL_C, spreadsheet_id)
-    return True
+    queue_spreadsheet_id(ad_name, spreadsheet_id)
+    return flush_spreadsheet_ids(gc).get(normalize(ad_name), False)
+
+# ── Пакетная запись ───────────────────────────────────────────────────────────
+def queue_spreadsheet_id(ad_name: str, spreadsheet_id: str) -> None:
+    """Поставить запись spreadsheet_id в очередь; отправляется flush_spreadsheet_ids()."""
+    with _LOCK:
+        _PENDING[normalize(ad_name)] = spreadsheet_id
+
+def flush_spreadsheet_ids(gc: gspread.Client) -> Dict[str, bool]:
+    """
+    Записать все накопленные spreadsheet_id одним ws.batch_update (см. write_spreadsheet_ids).
+    Очередь забирается целиком: если запись упала, исключение уходит вызывающему,
+    а в очередь ничего не возвращается — иначе старый id пережил бы более новую
+    запись того же клиента и дописался бы в Monthly позже. Повтор — забота вызывающего.
+    Возвращает {normalize(ad_name): записано ли}.
+    """
+    with _LOCK:
+        pending = dict(_PENDING)
+        _PENDING.clear()
+    return write_spreadsheet_ids(gc, pending)
+
+def write_spreadsheet_ids(gc: gspread.Client, ids: Dict[str, str]) -> Dict[str, bool]:
+    """
+    Записать пачку {ad_name: spreadsheet_id} одним ws.batch_update — мимо очереди:
+    при ошибке ничего не откладывается, повтор — забота вызывающего.
+    Строки берутся из свежего индекса (лист перечитывается, чтобы не промахнуться,
+    если строки сдвинули руками) — итого 2 запроса на любую пачку.
+    Возвращает {normalize(ad_name): записано ли}.
+    """
+    pending = {normalize(name): sid for name, sid in ids.items()}
+    if not pending:
+        return {}
+
+    by_name = _load_index(gc, force=True)["by_name"]
+    data, done = [], {}
+    for key, sid in pending.items():
+        hit = by_name.get(key)
+        done[key] = hit is not None
+        if hit is None:
+            print(f"⚠️ master_index: клиент '{key}' не найден, spreadsheet_id не записан")
+            continue
+        row_idx, _ = hit
+        data.append({"range": gspread.utils.rowcol_to_a1(row_idx, COL_C), "values": [[sid]]})
+
+    if data:
+        _ws(gc).batch_update(data)
+        for key, sid in pending.items():
+            if done[key]:
+                by_name[key][1]["spreadsheet_id"] = sid
+    return done
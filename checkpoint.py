@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# checkpoint.py
+"""
+Журнал контрольных точек пакетных прогонов (SQLite).
+
+Для каждого (run_id, клиент) фиксируются пройденные этапы отчёта:
+    fetched → enriched → sheet_created → written
+вместе с их результатом (строки инсайтов, обогащённые строки, лист, URL).
+Клиент — ad_account_id/spreadsheet_id (client_key), а не имя из Monthly:
+переименование строки не теряет этапы, одноимённые строки не смешиваются.
+
+Каждый прогон получает свой run_id (период + время запуска, run_id_for).
+Продолжить упавший прогон можно только явно — тем же run_id (или последним
+прогоном периода, latest_run): готовые этапы пропускаются, их результат
+берётся из журнала; повтор после ошибки переделывает только упавший этап.
+
+CLI:
+    python checkpoint.py runs   2025-10-01..2025-10-31
+    python checkpoint.py status 2025-10-01..2025-10-31@20251101-093000
+    python checkpoint.py reset  2025-10-01..2025-10-31@20251101-093000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import CHECKPOINT_PATH
+
+FETCHED, ENRICHED, SHEET_CREATED, WRITTEN = "fetched", "enriched", "sheet_created", "written"
+STAGES = (FETCHED, ENRICHED, SHEET_CREATED, WRITTEN)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    run_id      TEXT NOT NULL,
+    client      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (run_id, client, stage)
+);
+CREATE TABLE IF NOT EXISTS failures (
+    run_id      TEXT NOT NULL,
+    client      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    error       TEXT NOT NULL,
+    attempts    INTEGER NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (run_id, client)
+);
+"""
+
+def period_key(since: str, until: str) -> str:
+    return f"{since}..{until}"
+
+def run_id_for(since: str, until: str, started: float | None = None) -> str:
+    """Новый run_id: период + время запуска (повторный прогон месяца — новый прогон, а не продолжение)."""
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started or time.time()))
+    return f"{period_key(since, until)}@{stamp}"
+
+def client_key(ad_account_id: str, spreadsheet_id: str) -> str:
+    """Ключ клиента в журнале — аккаунт и файл отчёта, а не ad_name."""
+    return f"{ad_account_id.strip()}/{spreadsheet_id.strip()}"
+
+class CheckpointJournal:
+    """Потокобезопасный (одно соединение под локом) журнал этапов на SQLite."""
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ── этапы ────────────────────────────────────────────────────────────────
+    def get(self, run_id: str, client: str, stage: str) -> Optional[Any]:
+        """Результат этапа (None — этап ещё не пройден)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM stages WHERE run_id = ? AND client = ? AND stage = ?",
+                (run_id, client, stage),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, run_id: str, client: str, stage: str, payload: Any) -> None:
+        """Отметить этап пройденным; ошибка клиента (если была) снимается."""
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages(run_id, client, stage, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, client, stage, body, time.time()),
+            )
+            self._conn.execute("DELETE FROM failures WHERE run_id = ? AND client = ?", (run_id, client))
+            self._conn.commit()
+
+    def done_stages(self, run_id: str, client: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT stage FROM stages WHERE run_id = ? AND client = ?", (run_id, client)
+            ).fetchall()
+        done = {r[0] for r in rows}
+        return [s for s in STAGES if s in done]
+
+    # ── ошибки ───────────────────────────────────────────────────────────────
+    def fail(self, run_id: str, client: str, stage: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO failures(run_id, client, stage, error, attempts, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(run_id, client) DO UPDATE SET stage = excluded.stage, error = excluded.error, "
+                "attempts = attempts + 1, updated_at = excluded.updated_at",
+                (run_id, client, stage, error, time.time()),
+            )
+            self._conn.commit()
+
+    # ── прогон целиком ───────────────────────────────────────────────────────
+    def runs(self, period: str) -> List[str]:
+        """run_id прогонов периода (period_key), последний по активности — первым."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT run_id, MAX(updated_at) AS ts FROM ("
+                "  SELECT run_id, updated_at FROM stages UNION ALL SELECT run_id, updated_at FROM failures"
+                ") WHERE run_id LIKE ? GROUP BY run_id ORDER BY ts DESC",
+                (f"{period}@%",),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def latest_run(self, period: str) -> Optional[str]:
+        runs = self.runs(period)
+        return runs[0] if runs else None
+
+    def reset(self, run_id: str) -> None:
+        """Забыть прогон (для --fresh)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM stages WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM failures WHERE run_id = ?", (run_id,))
+            self._conn.commit()
+
+    def status(self, run_id: str) -> Dict[str, Any]:
+        """{"run_id": ..., "by_stage": {stage: N, ...}, "failures": [{client, stage, error, attempts}]}"""
+        with self._lock:
+            by_stage = dict(self._conn.execute(
+                "SELECT stage, COUNT(*) FROM stages WHERE run_id = ? GROUP BY stage", (run_id,)
+            ).fetchall())
+            failures = self._conn.execute(
+                "SELECT client, stage, error, attempts FROM failures WHERE run_id = ? ORDER BY client", (run_id,)
+            ).fetchall()
+        return {
+            "run_id": run_id,
+            "by_stage": {s: by_stage.get(s, 0) for s in STAGES},
+            "failures": [dict(zip(("client", "stage", "error", "attempts"), f)) for f in failures],
+        }
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Журнал контрольных точек пакетных прогонов")
+    ap.add_argument("cmd", choices=["runs", "status", "reset"])
+    ap.add_argument("run_id", help="runs: период 2025-10-01..2025-10-31; status/reset: run_id прогона")
+    args = ap.parse_args(argv)
+
+    journal = CheckpointJournal()
+    if args.cmd == "runs":
+        for run_id in journal.runs(args.run_id):
+            print(run_id)
+    elif args.cmd == "status":
+        print(json.dumps(journal.status(args.run_id), ensure_ascii=False, indent=2))
+    else:
+        journal.reset(args.run_id)
+        print(f"🧹 Прогон {args.run_id} сброшен")
+
+if __name__ == "__main__":
+    main()
@@ -11,20 +11,100 @@ GOOGLE_SERVICE_ACCOUNT_JSON = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
 # Если в .env не задано, fallback на старые константы
 MONTHLY_SHEET_ID = os.getenv("MONTHLY_SHEET_ID") or os.getenv("MASTER_INDEX_SHEET_ID")
 MONTHLY_SHEET_NAME = os.getenv("MONTHLY_SHEET_NAME", "Monthly")
+# Сколько секунд живёт индекс листа Monthly в памяти (catalog/master_index.py)
+MASTER_INDEX_TTL = int(os.getenv("MASTER_INDEX_TTL", "300"))
 
 # Папка-хранилище для клиентских отчётов (Drive)
 GDRIVE_FOLDER_ID = os.getenv("GDRIVE_FOLDER_ID")  # ID папки, куда будут создаваться файлы
 TEMPLATE_SPREADSHEET_ID = os.getenv("TEMPLATE_SPREADSHEET_ID")  # шаблон отчёта
 TEMPLATE_SHEET_NAME = os.getenv("TEMPLATE_SHEET_NAME", "Report_Template")
+# Как часто (сек) перепроверять modifiedTime мастер-шаблона в Drive (sheets/template_manager.py)
+TEMPLATE_VERSION_TTL = int(os.getenv("TEMPLATE_VERSION_TTL", "300"))
+
+# Пул заранее скопированных таблиц для новых клиентов (sheets/pool.py)
+POOL_SIZE = int(os.getenv("POOL_SIZE", "10"))                   # сколько свободных держать
+POOL_SHARE_WITH = os.getenv("POOL_SHARE_WITH", "")              # e-mail'ы через запятую (writer)
+POOL_BATCH_SIZE = int(os.getenv("POOL_BATCH_SIZE", "20"))       # подзапросов в одном Drive batch
+POOL_REFILL_SEC = float(os.getenv("POOL_REFILL_SEC", "600"))    # период фонового пополнения
+
+# Пул keep-alive соединений общего gspread-клиента (sheets/gs_client.py)
+GOOGLE_POOL_SIZE = int(os.getenv("GOOGLE_POOL_SIZE", "10"))
+# Сколько секунд доверяем закэшированному списку листов таблицы (sheets/meta_cache.py)
+GS_META_TTL = int(os.getenv("GS_META_TTL", "600"))
+# Общий бюджет запросов к Google API на процесс (ведро токенов): запросов/сек и всплеск
+# (квота Sheets — 60 запросов в минуту на пользователя; 0 — без ограничения)
+GOOGLE_RPS = float(os.getenv("GOOGLE_RPS", "1.0"))
+GOOGLE_BURST = float(os.getenv("GOOGLE_BURST", "10"))
+# Параллельных проверок в verify_sheets.py (темп всё равно держит GOOGLE_RPS)
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "8"))
+# Адрес локальной заглушки Sheets/Drive (fakes/stand.py); пусто — настоящий Google.
+# Если задан, запросы к *.googleapis.com уходят туда и сервисный аккаунт не нужен
+GOOGLE_API_URL = os.getenv("GOOGLE_API_URL", "").rstrip("/")
 
 # === Facebook Ads ============================================================
 FB_API_VERSION = os.getenv("FB_API_VERSION", "v19.0")
+# Базовый адрес Graph API (для локальной заглушки fakes/stand.py — http://127.0.0.1:<порт>)
+FB_GRAPH_URL = os.getenv("FB_GRAPH_URL", "https://graph.facebook.com").rstrip("/")
 FB_ACCESS_TOKEN = os.getenv("FB_ACCESS_TOKEN")
 
+# HTTP-клиент Graph API: пул keep-alive соединений, таймаут и повторы
+FB_POOL_SIZE = int(os.getenv("FB_POOL_SIZE", "10"))
+FB_TIMEOUT = float(os.getenv("FB_TIMEOUT", "60"))
+FB_MAX_RETRIES = int(os.getenv("FB_MAX_RETRIES", "5"))
+FB_BACKOFF_BASE = float(os.getenv("FB_BACKOFF_BASE", "1.0"))   # сек
+FB_BACKOFF_MAX = float(os.getenv("FB_BACKOFF_MAX", "60"))      # сек
+FB_PAGE_SIZE = int(os.getenv("FB_PAGE_SIZE", "500"))           # limit страницы при пагинации
+
+# Параллельность: общий потолок одновременных запросов к Graph на процесс
+# и лимит параллельного обогащения кампаний в рамках одного отчёта
+FB_MAX_CONCURRENCY = int(os.getenv("FB_MAX_CONCURRENCY", "8"))
+FB_REPORT_CONCURRENCY = int(os.getenv("FB_REPORT_CONCURRENCY", "4"))
+
+# Адаптивный лимитер по заголовкам X-App-Usage / X-Ad-Account-Usage / X-Business-Use-Case-Usage
+FB_USAGE_SLOW_PCT = float(os.getenv("FB_USAGE_SLOW_PCT", "75"))     # от N% — притормаживаем
+FB_USAGE_PAUSE_PCT = float(os.getenv("FB_USAGE_PAUSE_PCT", "95"))   # от N% — пауза
+FB_USAGE_MAX_DELAY = float(os.getenv("FB_USAGE_MAX_DELAY", "10"))   # сек, макс. притормаживание
+FB_USAGE_PAUSE_SEC = float(os.getenv("FB_USAGE_PAUSE_SEC", "60"))   # сек, пауза без подсказки от FB
+
+# Вложенный запрос кампании → adset'ы → ad → creative (fb/enrichment.py)
+FB_ENRICH_PAGE_SIZE = int(os.getenv("FB_ENRICH_PAGE_SIZE", "50"))       # кампаний на страницу
+FB_NESTED_ADSETS_LIMIT = int(os.getenv("FB_NESTED_ADSETS_LIMIT", "100"))  # adset'ов на кампанию
+FB_ENRICH_FILTER_IDS = int(os.getenv("FB_ENRICH_FILTER_IDS", "100"))    # id кампаний в одном filtering
+
+# Асинхронные отчёты инсайтов (report runs) для больших аккаунтов/периодов
+FB_ASYNC_MIN_DAYS = int(os.getenv("FB_ASYNC_MIN_DAYS", "93"))       # период от N дней → async
+FB_ASYNC_MIN_ROWS = int(os.getenv("FB_ASYNC_MIN_ROWS", "5000"))     # ожидаемых строк от N → async
+FB_ASYNC_POLL_MIN = float(os.getenv("FB_ASYNC_POLL_MIN", "2"))      # сек
+FB_ASYNC_POLL_MAX = float(os.getenv("FB_ASYNC_POLL_MAX", "30"))     # сек
+FB_ASYNC_TIMEOUT = float(os.getenv("FB_ASYNC_TIMEOUT", "1800"))     # сек на одно задание
+
+# Локальный кэш ответов Graph API (fb/cache.py), TTL — в секундах
+FB_CACHE_ENABLED = os.getenv("FB_CACHE_ENABLED", "1") == "1"
+FB_CACHE_PATH = os.getenv("FB_CACHE_PATH", ".cache/fb_cache.sqlite")
+FB_CACHE_MAX_MB = float(os.getenv("FB_CACHE_MAX_MB", "256"))
+FB_CACHE_TTL_SHORT = int(os.getenv("FB_CACHE_TTL_SHORT", "900"))              # 15 мин: данные за сегодня, бюджеты
+FB_CACHE_TTL_CLOSED = int(os.getenv("FB_CACHE_TTL_CLOSED", str(30 * 86400)))  # закрытые периоды
+FB_CACHE_TTL_CREATIVE = int(os.getenv("FB_CACHE_TTL_CREATIVE", str(7 * 86400)))  # ссылки на креативы
+# Сколько последних дней инсайты ещё «дозревают» (атрибуция) и не считаются закрытыми
+FB_INSIGHTS_MUTABLE_DAYS = int(os.getenv("FB_INSIGHTS_MUTABLE_DAYS", "3"))
+
+# Дневное хранилище инсайтов (fb/daily_store.py): период собирается локально из дней
+FB_DAILY_STORE_ENABLED = os.getenv("FB_DAILY_STORE_ENABLED", "1") == "1"
+FB_DAILY_STORE_PATH = os.getenv("FB_DAILY_STORE_PATH", ".cache/fb_daily.sqlite")
+
 # === Telegram ================================================================
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 TELEGRAM_TOPIC_ID = os.getenv("TELEGRAM_TOPIC_ID")
+# Фоновая очередь отчётов бота (bot/jobs.py): рабочих потоков и сколько завершённых задач помнить
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "3"))
+REPORT_JOBS_HISTORY = int(os.getenv("REPORT_JOBS_HISTORY", "200"))
+# Сколько секунд готовый отчёт (клиент+период) отдаётся повторно без пересборки
+REPORT_RESULT_TTL = float(os.getenv("REPORT_RESULT_TTL", "600"))
+# Пакетная генерация по всем клиентам (batch_reports.py): параллельных отчётов
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "6"))
+# Журнал контрольных точек пакетных прогонов (checkpoint.py)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", ".cache/checkpoints.sqlite")
 
 # === Timezone ================================================================
 TZ = os.getenv("TZ", "Asia/Almaty")
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# fakes/base.py
+"""
+Общая часть локальных заглушек API: ThreadingHTTPServer в фоновом потоке,
+счётчики вызовов по видам запросов и инъекция задержек / 429 / 5xx.
+
+Служебные эндпоинты (без задержек, ошибок и учёта в счётчиках):
+    GET  /__stats   — счётчики вызовов
+    POST /__reset   — обнулить счётчики
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+def json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return status, {"Content-Type": "application/json; charset=UTF-8", **(headers or {})}, body
+
+# ── НЕИСПРАВНОСТИ ────────────────────────────────────────────────────────────
+@dataclass
+class Faults:
+    """
+    Что подмешивать к каждому запросу:
+      latency_ms ± jitter_ms — задержка ответа;
+      rate_429 / rate_5xx — доля ответов «слишком много запросов» / 503.
+    Случайность детерминирована seed — прогоны воспроизводимы.
+    """
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    seed: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def roll(self) -> Tuple[float, Optional[int]]:
+        """(задержка в секундах, код ошибки или None)."""
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            x = self._rng.random()
+        if x < self.rate_429:
+            return delay, 429
+        if x < self.rate_429 + self.rate_5xx:
+            return delay, 503
+        return delay, None
+
+# ── СЕРВЕР ───────────────────────────────────────────────────────────────────
+class FakeServer:
+    """
+    Базовый сервер заглушки. Наследник реализует handle() (и fault_response()
+    в формате ошибок своего API) и считает вызовы через count().
+    """
+    name = "fake"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: Faults | None = None):
+        self.faults = faults or Faults()
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ── жизненный цикл ───────────────────────────────────────────────────────
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=f"fake-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # ── счётчики ─────────────────────────────────────────────────────────────
+    def count(self, kind: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[kind] += n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.stats.clear()
+
+    # ── для наследников ──────────────────────────────────────────────────────
+    def handle(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes) -> Response:
+        return json_response(404, {"error": "not implemented"})
+
+    def fault_response(self, status: int) -> Response:
+        return json_response(status, {"error": {"code": status, "message": "injected fault"}})
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, как у настоящих API
+    fake: FakeServer
+
+    def log_message(self, *args):   # без шума в консоли
+        pass
+
+    def _dispatch(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if parts.path == "/__stats":
+            resp = json_response(200, self.fake.snapshot())
+        elif parts.path == "/__reset":
+            self.fake.reset_stats()
+            resp = json_response(200, {"ok": True})
+        else:
+            delay, fault = self.fake.faults.roll()
+            if delay:
+                time.sleep(delay)
+            self.fake.count("requests")
+            if fault:
+                self.fake.count(f"fault_{fault}")
+                resp = self.fake.fault_response(fault)
+            else:
+                query = dict(parse_qsl(parts.query, keep_blank_values=True))
+                try:
+                    resp = self.fake.handle(self.command, parts.path, query, dict(self.headers), body)
+                except Exception as e:
+                    resp = json_response(500, {"error": {"code": 500, "message": f"{type(e).__name__}: {e}"}})
+
+        status, headers, payload = resp
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+__all__ = ["Response", "json_response", "Faults", "FakeServer"]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# fakes/cassette.py
+"""
+Кассеты для заглушки Graph API: запись реальных ответов и их воспроизведение.
+
+Файл — JSON Lines, по взаимодействию на строку:
+    {"key", "method", "path", "params", "status", "headers", "body"}
+Ключ — метод + путь + отсортированные параметры без access_token (как fb/cache.py).
+Токен вырезается и из тел ответов (ссылки paging.next). Если один и тот же
+запрос записан несколько раз (опрос async-отчёта), ответы отдаются по кругу.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from fakes.base import Response
+
+REPLAY, RECORD = "replay", "record"
+
+_TOKEN_RE = re.compile(r"access_token=[^&\"\s]+")
+# Заголовки ответа, которые имеет смысл сохранять (usage — для лимитера)
+_KEEP_HEADERS = ("content-type", "x-app-usage", "x-ad-account-usage", "x-business-use-case-usage")
+
+def request_key(method: str, path: str, params: Dict[str, Any]) -> str:
+    p = sorted((k, str(v)) for k, v in (params or {}).items() if k != "access_token")
+    raw = json.dumps([method.upper(), path.strip("/"), p], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class Cassette:
+    def __init__(self, path: str, mode: str = REPLAY):
+        if mode not in (REPLAY, RECORD):
+            raise ValueError(f"mode: {REPLAY}|{RECORD}, получено {mode!r}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._items: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        self._items.setdefault(item["key"], []).append(item)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._items.values())
+
+    def lookup(self, method: str, path: str, params: Dict[str, Any]) -> Optional[Response]:
+        key = request_key(method, path, params)
+        with self._lock:
+            items = self._items.get(key)
+            if not items:
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            item = items[i % len(items)]
+        return item["status"], dict(item["headers"]), item["body"].encode("utf-8")
+
+    def record(self, method: str, path: str, params: Dict[str, Any], resp: Response) -> None:
+        status, headers, body = resp
+        item = {
+            "key": request_key(method, path, params),
+            "method": method.upper(),
+            "path": path.strip("/"),
+            "params": {k: v for k, v in params.items() if k != "access_token"},
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() in _KEEP_HEADERS},
+            "body": _TOKEN_RE.sub("access_token=REDACTED", body.decode("utf-8", "replace")),
+        }
+        with self._lock:
+            self._items.setdefault(item["key"], []).append(item)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+__all__ = ["REPLAY", "RECORD", "request_key", "Cassette"]
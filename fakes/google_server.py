@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+# fakes/google_server.py
+"""
+Локальная заглушка Google Sheets v4 + Drive v3 (таблицы хранятся в памяти).
+
+Sheets:
+    GET  /v4/spreadsheets/{id}                          метаданные (+ developerMetadata листов)
+    GET  /v4/spreadsheets/{id}/values/{range}
+    PUT  /v4/spreadsheets/{id}/values/{range}, POST values:batchUpdate
+    POST /v4/spreadsheets/{id}:batchUpdate              листы, строки, метаданные, очистка;
+                                                        оформление принимается без эффекта
+    POST /v4/spreadsheets/{id}/sheets/{sheetId}:copyTo
+Drive:
+    GET/PATCH/DELETE /drive/v3/files/{id}, GET /drive/v3/files (q: parents, appProperties, name),
+    POST /drive/v3/files/{id}/copy, POST /drive/v3/files/{id}/permissions, POST /batch/drive/v3
+
+Ошибки — в формате Google и с теми же текстами, на которые реагирует код
+(«already exists», «No grid with id», «exceeds grid limits»). batchUpdate атомарен.
+Счётчики: sheets.get, values.get, values.update, batchUpdate, req.<тип>, copyTo, drive.<метод>.
+Записи (values.update, batchUpdate) дополнительно считаются в writes.
+"""
+from __future__ import annotations
+
+import copy
+import datetime as dt
+import json
+import random
+import re
+import threading
+from email.parser import BytesParser
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from fakes.base import FakeServer, Faults, Response, json_response
+from fakes.synthetic import World
+
+DEFAULT_ROWS, DEFAULT_COLS = 1000, 26
+
+# Запросы batchUpdate, которые только оформляют — принимаем и ничего не меняем
+_FORMAT_ONLY = {
+    "repeatCell", "setBasicFilter", "clearBasicFilter", "updateBorders", "mergeCells", "unmergeCells",
+    "autoResizeDimensions", "updateDimensionProperties", "addConditionalFormatRule",
+    "deleteConditionalFormatRule", "setDataValidation", "addBanding", "addProtectedRange",
+}
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, reason: str = "INVALID_ARGUMENT"):
+        super().__init__(message)
+        self.status, self.reason = status, reason
+
+# ── A1 ───────────────────────────────────────────────────────────────────────
+_CELL_RE = re.compile(r"^([A-Za-z]*)(\d*)$")
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+def _col_letters(idx: int) -> str:
+    s, n = "", idx + 1
+    while n:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+def _is_a1(s: str) -> bool:
+    return all(_CELL_RE.match(p) and p for p in s.split(":")) and len(s.split(":")) <= 2
+
+def _a1_bounds(a1: str) -> Tuple[Optional[int], Optional[int], Optional[int], Optional[int]]:
+    """'B3:D' → (r1, c1, r2, c2): 0-based, r2/c2 — не включая; None — «до края»."""
+    first, _, last = a1.partition(":")
+    m1, m2 = _CELL_RE.match(first), _CELL_RE.match(last or first)
+    r1 = int(m1.group(2)) - 1 if m1.group(2) else 0
+    c1 = _col_index(m1.group(1)) if m1.group(1) else 0
+    r2 = int(m2.group(2)) if m2.group(2) else None
+    c2 = _col_index(m2.group(1)) + 1 if m2.group(1) else None
+    return r1, c1, r2, c2
+
+def _unquote_title(s: str) -> str:
+    return s[1:-1].replace("''", "'") if len(s) >= 2 and s[0] == s[-1] == "'" else s
+
+def _fmt(v: Any) -> Any:
+    if isinstance(v, bool):
+        return "TRUE" if v else "FALSE"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return v if isinstance(v, str) else str(v)
+
+# ── МОДЕЛЬ ───────────────────────────────────────────────────────────────────
+class Sheet:
+    def __init__(self, sheet_id: int, title: str, index: int, rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLS):
+        self.props: Dict[str, Any] = {
+            "sheetId": sheet_id, "title": title, "index": index, "sheetType": "GRID",
+            "gridProperties": {"rowCount": rows, "columnCount": cols},
+        }
+        self.cells: List[List[Any]] = []
+        self.dev_meta: List[Dict[str, Any]] = []
+
+    @property
+    def id(self) -> int:
+        return self.props["sheetId"]
+
+    @property
+    def title(self) -> str:
+        return self.props["title"]
+
+    @property
+    def grid(self) -> Dict[str, int]:
+        return self.props["gridProperties"]
+
+    def check(self, r2: int, c2: int, label: str) -> None:
+        if r2 > self.grid["rowCount"] or c2 > self.grid["columnCount"]:
+            raise ApiError(400, f"Range ({label}) exceeds grid limits. Max rows: {self.grid['rowCount']}, "
+                                f"max columns: {self.grid['columnCount']}")
+
+    def set(self, r: int, c: int, value: Any) -> None:
+        while len(self.cells) <= r:
+            self.cells.append([])
+        row = self.cells[r]
+        while len(row) <= c:
+            row.append("")
+        row[c] = value
+
+    def write(self, r1: int, c1: int, values: List[List[Any]], label: str) -> None:
+        width = max((len(v) for v in values), default=0)
+        self.check(r1 + len(values), c1 + width, label)
+        for i, row in enumerate(values):
+            for j, v in enumerate(row):
+                self.set(r1 + i, c1 + j, "" if v is None else v)
+
+    def clear(self, r1: int, c1: int, r2: int, c2: int) -> None:
+        for r in range(r1, min(r2, len(self.cells))):
+            row = self.cells[r]
+            for c in range(c1, min(c2, len(row))):
+                row[c] = ""
+
+    def read(self, r1: int, c1: int, r2: Optional[int], c2: Optional[int], raw: bool) -> List[List[Any]]:
+        out = []
+        for row in self.cells[r1:r2]:
+            vals = [v if raw else _fmt(v) for v in row[c1:c2]]
+            while vals and vals[-1] == "":
+                vals.pop()
+            out.append(vals)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+class Spreadsheet:
+    def __init__(self, file_id: str, title: str, parents: List[str] | None = None):
+        self.id = file_id
+        self.title = title
+        self.parents = list(parents or [])
+        self.app_properties: Dict[str, str] = {}
+        self.sheets: List[Sheet] = []
+        self.created = self.modified = _now()
+        self._meta_seq = 0
+
+    def sheet(self, sheet_id: int) -> Sheet:
+        for s in self.sheets:
+            if s.id == sheet_id:
+                return s
+        raise ApiError(400, f"No grid with id: {sheet_id}")
+
+    def by_title(self, title: str) -> Sheet:
+        for s in self.sheets:
+            if s.title == title:
+                return s
+        raise ApiError(400, f"Unable to parse range: {title}")
+
+    def add_sheet(self, title: str, sheet_id: int | None = None, index: int | None = None, **grid) -> Sheet:
+        if any(s.title == title for s in self.sheets):
+            raise ApiError(400, f'A sheet with the name "{title}" already exists. Please enter another name.')
+        taken = {s.id for s in self.sheets}
+        if sheet_id is None:
+            sheet_id = 0 if not self.sheets else random.randint(1, 2**31 - 1)
+            while sheet_id in taken:
+                sheet_id = random.randint(1, 2**31 - 1)
+        elif sheet_id in taken:
+            raise ApiError(400, f"A grid with id {sheet_id} already exists.")
+        sheet = Sheet(sheet_id, title, 0, **grid)
+        self.sheets.insert(len(self.sheets) if index is None else index, sheet)
+        self._reindex()
+        return sheet
+
+    def _reindex(self) -> None:
+        for i, s in enumerate(self.sheets):
+            s.props["index"] = i
+
+    def next_meta_id(self) -> int:
+        self._meta_seq += 1
+        return self._meta_seq
+
+    def metadata(self) -> Dict[str, Any]:
+        sheets = []
+        for s in self.sheets:
+            item: Dict[str, Any] = {"properties": copy.deepcopy(s.props)}
+            if s.dev_meta:
+                item["developerMetadata"] = copy.deepcopy(s.dev_meta)
+            sheets.append(item)
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "ru_RU", "timeZone": "Asia/Almaty"},
+            "sheets": sheets,
+            "spreadsheetUrl": f"https://docs.google.com/spreadsheets/d/{self.id}/edit",
+        }
+
+    def drive_file(self) -> Dict[str, Any]:
+        return {
+            "kind": "drive#file", "id": self.id, "name": self.title,
+            "mimeType": "application/vnd.google-apps.spreadsheet",
+            "parents": list(self.parents), "appProperties": dict(self.app_properties),
+            "createdTime": self.created, "modifiedTime": self.modified,
+            "capabilities": {"canEdit": True},
+        }
+
+def _now() -> str:
+    return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+# ── СЕРВЕР ───────────────────────────────────────────────────────────────────
+_SHEETS_RE = re.compile(r"^/v4/spreadsheets/([^/:]+)(.*)$")
+_DRIVE_RE = re.compile(r"^/drive/v3/files(?:/([^/]+))?(/copy|/permissions)?$")
+_APPPROP_RE = re.compile(r"appProperties has \{\s*key='([^']*)' and value='([^']*)'\s*\}")
+_PARENT_RE = re.compile(r"'([^']+)' in parents")
+_NAME_Q_RE = re.compile(r"name = '([^']*)'")
+
+class GoogleServer(FakeServer):
+    name = "google"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: Faults | None = None):
+        super().__init__(host, port, faults)
+        self.files: Dict[str, Spreadsheet] = {}
+        self._lock = threading.RLock()
+        self._seq = 0
+
+    def fault_response(self, status: int) -> Response:
+        reason = "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"
+        return _error(status, "injected fault", reason)
+
+    # ── наполнение ───────────────────────────────────────────────────────────
+    def create(self, title: str, sheet_titles: List[str] = ("Sheet1",), parents: List[str] | None = None) -> Spreadsheet:
+        with self._lock:
+            self._seq += 1
+            ss = Spreadsheet(f"fake{self._seq:06d}{'x' * 30}", title, parents)
+            for t in sheet_titles:
+                ss.add_sheet(t)
+            self.files[ss.id] = ss
+            return ss
+
+    def seed(
+        self,
+        world: World,
+        monthly_sheet: str = "Monthly",
+        template_sheet: str = "Report_Template",
+        folder_id: str = "fake-folder",
+    ) -> Dict[str, str]:
+        """
+        Monthly со строкой на каждый аккаунт world, файл клиента на каждый аккаунт
+        и мастер-шаблон. Возвращает переменные окружения для config.py.
+        """
+        tpl = self.create("Monthly report template", [template_sheet])
+        tpl.by_title(template_sheet).write(0, 0, [["Ежемесячный отчёт"], ["Клиент:", ""]], "template")
+        tpl.by_title(template_sheet).write(43, 0, [["Общая эффективность"]], "template")
+
+        monthly = self.create("Monthly", [monthly_sheet])
+        rows = [["ad_account_id", "ad_name", "spreadsheet_id"]]
+        for acc in world.accounts.values():
+            client = self.create(f"Monthly_report_{acc.name}", ["Sheet1"], [folder_id])
+            rows.append([acc.id, acc.name, client.id])
+        sheet = monthly.by_title(monthly_sheet)
+        sheet.grid["rowCount"] = max(sheet.grid["rowCount"], len(rows) + 10)
+        sheet.write(0, 0, rows, monthly_sheet)
+        return {
+            "MONTHLY_SHEET_ID": monthly.id,
+            "MONTHLY_SHEET_NAME": monthly_sheet,
+            "TEMPLATE_SPREADSHEET_ID": tpl.id,
+            "TEMPLATE_SHEET_NAME": template_sheet,
+            "GDRIVE_FOLDER_ID": folder_id,
+        }
+
+    # ── вход ─────────────────────────────────────────────────────────────────
+    def handle(self, method, path, query, headers, body) -> Response:
+        try:
+            if path == "/batch/drive/v3":
+                return self._drive_batch(headers, body)
+            data = json.loads(body) if body else {}
+            with self._lock:
+                m = _SHEETS_RE.match(path)
+                if m:
+                    status, payload = self._sheets(method, m.group(1), unquote(m.group(2)), query, data)
+                    return json_response(status, payload)
+                m = _DRIVE_RE.match(path)
+                if m:
+                    status, payload = self._drive(method, m.group(1), m.group(2) or "", query, data)
+                    return (status, {}, b"") if status == 204 else json_response(status, payload)
+            return _error(404, f"Unknown path {path}", "NOT_FOUND")
+        except ApiError as e:
+            return _error(e.status, str(e), e.reason)
+
+    def _file(self, file_id: str) -> Spreadsheet:
+        ss = self.files.get(file_id)
+        if ss is None:
+            raise ApiError(404, f"Requested entity was not found. ({file_id})", "NOT_FOUND")
+        return ss
+
+    # ── Sheets ───────────────────────────────────────────────────────────────
+    def _sheets(self, method: str, ssid: str, rest: str, query: Dict[str, str], data: Dict[str, Any]) -> Tuple[int, Any]:
+        ss = self._file(ssid)
+        if rest == "" and method == "GET":
+            self.count("sheets.get")
+            return 200, ss.metadata()
+        if rest == ":batchUpdate":
+            self.count("batchUpdate")
+            self.count("writes")
+            return 200, self._batch_update(ss, data.get("requests") or [])
+        if rest == "/values:batchUpdate":
+            self.count("values.update")
+            self.count("writes")
+            for item in data.get("data") or []:
+                self._write_range(ss, item["range"], item.get("values") or [])
+            ss.modified = _now()
+            return 200, {"spreadsheetId": ss.id, "totalUpdatedCells": 0}
+        if rest.startswith("/values/"):
+            rng = rest[len("/values/"):]
+            if method == "GET":
+                self.count("values.get")
+                return 200, self._read_range(ss, rng, query)
+            if method == "PUT":
+                self.count("values.update")
+                self.count("writes")
+                self._write_range(ss, rng, data.get("values") or [])
+                ss.modified = _now()
+                return 200, {"spreadsheetId": ss.id, "updatedRange": rng}
+        m = re.match(r"^/sheets/(\d+):copyTo$", rest)
+        if m and method == "POST":
+            self.count("copyTo")
+            src = ss.sheet(int(m.group(1)))
+            dst = self._file(data.get("destinationSpreadsheetId", ""))
+            title, n = f"Copy of {src.title}", 2
+            while any(s.title == title for s in dst.sheets):
+                title, n = f"Copy of {src.title} {n}", n + 1
+            new = dst.add_sheet(title, rows=src.grid["rowCount"], cols=src.grid["columnCount"])
+            new.cells = copy.deepcopy(src.cells)
+            dst.modified = _now()
+            return 200, copy.deepcopy(new.props)
+        raise ApiError(404, f"Unknown Sheets method {method} {rest}", "NOT_FOUND")
+
+    def _resolve(self, ss: Spreadsheet, rng: str) -> Tuple[Sheet, str]:
+        if "!" in rng:
+            title, a1 = rng.rsplit("!", 1)
+            return ss.by_title(_unquote_title(title)), a1
+        if _is_a1(rng):
+            return ss.sheets[0], rng
+        return ss.by_title(_unquote_title(rng)), ""
+
+    def _read_range(self, ss: Spreadsheet, rng: str, query: Dict[str, str]) -> Dict[str, Any]:
+        sheet, a1 = self._resolve(ss, rng)
+        r1, c1, r2, c2 = _a1_bounds(a1) if a1 else (0, 0, None, None)
+        raw = query.get("valueRenderOption") == "UNFORMATTED_VALUE"
+        out: Dict[str, Any] = {"range": rng, "majorDimension": "ROWS"}
+        values = sheet.read(r1, c1, r2, c2, raw)
+        if values:
+            out["values"] = values
+        return out
+
+    def _write_range(self, ss: Spreadsheet, rng: str, values: List[List[Any]]) -> None:
+        sheet, a1 = self._resolve(ss, rng)
+        r1, c1, _, _ = _a1_bounds(a1) if a1 else (0, 0, None, None)
+        sheet.write(r1, c1, values, rng)
+
+    # ── batchUpdate ──────────────────────────────────────────────────────────
+    def _batch_update(self, ss: Spreadsheet, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # атомарно: работаем на копии листов, при ошибке оригинал не тронут
+        sheets_backup, title_backup, seq_backup = copy.deepcopy(ss.sheets), ss.title, ss._meta_seq
+        replies = []
+        try:
+            for i, req in enumerate(requests):
+                (kind, body), = req.items()
+                self.count(f"req.{kind}")
+                try:
+                    replies.append(self._apply(ss, kind, body))
+                except ApiError as e:
+                    raise ApiError(e.status, f"Invalid requests[{i}].{kind}: {e}", e.reason)
+        except Exception:
+            ss.sheets, ss.title, ss._meta_seq = sheets_backup, title_backup, seq_backup
+            raise
+        ss.modified = _now()
+        return {"spreadsheetId": ss.id, "replies": replies}
+
+    def _grid(self, ss: Spreadsheet, rng: Dict[str, Any], kind: str) -> Tuple[Sheet, int, int, int, int]:
+        sheet = ss.sheet(rng.get("sheetId", 0))
+        r1, c1 = rng.get("startRowIndex", 0), rng.get("startColumnIndex", 0)
+        r2 = rng.get("endRowIndex", sheet.grid["rowCount"])
+        c2 = rng.get("endColumnIndex", sheet.grid["columnCount"])
+        sheet.check(r2, c2, f"{sheet.title}!{_col_letters(c1)}{r1 + 1}:{_col_letters(max(c2 - 1, 0))}{r2}")
+        return sheet, r1, c1, r2, c2
+
+    def _apply(self, ss: Spreadsheet, kind: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if kind in _FORMAT_ONLY:
+            rng = body.get("range") or (body.get("filter") or {}).get("range")
+            if rng:
+                self._grid(ss, rng, kind)
+            return {}
+
+        if kind == "addSheet":
+            p = body.get("properties") or {}
+            grid = p.get("gridProperties") or {}
+            sheet = ss.add_sheet(
+                p.get("title") or f"Sheet{len(ss.sheets) + 1}", p.get("sheetId"), p.get("index"),
+                rows=grid.get("rowCount", DEFAULT_ROWS), cols=grid.get("columnCount", DEFAULT_COLS),
+            )
+            return {"addSheet": {"properties": copy.deepcopy(sheet.props)}}
+
+        if kind == "duplicateSheet":
+            src = ss.sheet(body["sourceSheetId"])
+            title = body.get("newSheetName") or f"Copy of {src.title}"
+            new = ss.add_sheet(title, body.get("newSheetId"), body.get("insertSheetIndex"),
+                               rows=src.grid["rowCount"], cols=src.grid["columnCount"])
+            new.cells = copy.deepcopy(src.cells)
+            if src.props.get("hidden"):
+                new.props["hidden"] = True
+            return {"duplicateSheet": {"properties": copy.deepcopy(new.props)}}
+
+        if kind == "deleteSheet":
+            sheet = ss.sheet(body["sheetId"])
+            ss.sheets.remove(sheet)
+            ss._reindex()
+            return {}
+
+        if kind == "updateSheetProperties":
+            p = body["properties"]
+            sheet = ss.sheet(p.get("sheetId", 0))
+            for f in (body.get("fields") or "").split(","):
+                f = f.strip()
+                if not f:
+                    continue
+                if f == "title" and any(s.title == p.get("title") and s is not sheet for s in ss.sheets):
+                    raise ApiError(400, f'A sheet with the name "{p["title"]}" already exists.')
+                src, dst, keys = p, sheet.props, f.split(".")
+                for k in keys[:-1]:
+                    src, dst = src.get(k) or {}, dst.setdefault(k, {})
+                if keys[-1] in src:
+                    dst[keys[-1]] = src[keys[-1]]
+                else:
+                    dst.pop(keys[-1], None)
+            return {}
+
+        if kind == "updateSpreadsheetProperties":
+            if "title" in (body.get("fields") or "") and body.get("properties", {}).get("title"):
+                ss.title = body["properties"]["title"]
+            return {}
+
+        if kind == "createDeveloperMetadata":
+            meta = copy.deepcopy(body["developerMetadata"])
+            loc = meta.get("location") or {}
+            sheet = ss.sheet(loc["sheetId"]) if "sheetId" in loc else ss.sheets[0]
+            meta["metadataId"] = ss.next_meta_id()
+            meta["location"] = {"locationType": "SHEET", "sheetId": sheet.id}
+            sheet.dev_meta.append(meta)
+            return {"createDeveloperMetadata": {"developerMetadata": copy.deepcopy(meta)}}
+
+        if kind in ("updateDeveloperMetadata", "deleteDeveloperMetadata"):
+            filters = body.get("dataFilters") or ([body["dataFilter"]] if "dataFilter" in body else [])
+            matched = []
+            for sheet in ss.sheets:
+                for meta in list(sheet.dev_meta):
+                    if any(_meta_matches(meta, sheet, f.get("developerMetadataLookup") or {}) for f in filters):
+                        if kind == "deleteDeveloperMetadata":
+                            sheet.dev_meta.remove(meta)
+                        else:
+                            for f in (body.get("fields") or "").split(","):
+                                f = f.strip()
+                                if f in ("metadataKey", "metadataValue", "visibility"):
+                                    meta[f] = body["developerMetadata"].get(f)
+                        matched.append(copy.deepcopy(meta))
+            key = "developerMetadata" if kind == "updateDeveloperMetadata" else "deletedDeveloperMetadata"
+            return {kind: {key: matched}}
+
+        if kind in ("insertDimension", "deleteDimension"):
+            rng = body["range"]
+            sheet = ss.sheet(rng.get("sheetId", 0))
+            start, end = rng["startIndex"], rng["endIndex"]
+            rows = rng.get("dimension") == "ROWS"
+            count_key = "rowCount" if rows else "columnCount"
+            limit = sheet.grid[count_key]
+            n = end - start
+            if kind == "insertDimension":
+                if start > limit:
+                    raise ApiError(400, f"Cannot insert at {start}: sheet has only {limit} {'rows' if rows else 'columns'}")
+                if rows:
+                    if start < len(sheet.cells):
+                        sheet.cells[start:start] = [[] for _ in range(n)]
+                else:
+                    for row in sheet.cells:
+                        if start < len(row):
+                            row[start:start] = [""] * n
+                sheet.grid[count_key] = limit + n
+            else:
+                if end > limit or n >= limit:
+                    raise ApiError(400, f"Cannot delete {start}..{end}: sheet has {limit} {'rows' if rows else 'columns'}")
+                if rows:
+                    del sheet.cells[start:end]
+                else:
+                    for row in sheet.cells:
+                        del row[start:end]
+                sheet.grid[count_key] = limit - n
+            return {}
+
+        if kind == "appendDimension":
+            sheet = ss.sheet(body.get("sheetId", 0))
+            key = "rowCount" if body.get("dimension") == "ROWS" else "columnCount"
+            sheet.grid[key] += int(body.get("length") or 0)
+            return {}
+
+        if kind == "updateCells":
+            rng = body.get("range")
+            if rng:
+                sheet, r1, c1, r2, c2 = self._grid(ss, rng, kind)
+            else:
+                start = body["start"]
+                sheet, r1, c1 = ss.sheet(start.get("sheetId", 0)), start.get("rowIndex", 0), start.get("columnIndex", 0)
+                r2, c2 = sheet.grid["rowCount"], sheet.grid["columnCount"]
+            fields = body.get("fields") or ""
+            if "rows" in body:
+                for i, row in enumerate(body["rows"]):
+                    for j, cell in enumerate(row.get("values") or []):
+                        v = (cell.get("userEnteredValue") or {})
+                        sheet.set(r1 + i, c1 + j, next(iter(v.values()), ""))
+            elif "userEnteredValue" in fields or fields == "*":
+                sheet.clear(r1, c1, r2, c2)
+            return {}
+
+        raise ApiError(400, f"unsupported request type {kind}")
+
+    # ── Drive ────────────────────────────────────────────────────────────────
+    def _drive(self, method: str, file_id: Optional[str], sub: str, query: Dict[str, str], data: Dict[str, Any]) -> Tuple[int, Any]:
+        if not file_id:
+            if method == "GET":
+                self.count("drive.list")
+                return 200, self._drive_list(query)
+            if method == "POST":
+                self.count("drive.create")
+                ss = self.create(data.get("name") or "Untitled", parents=data.get("parents"))
+                ss.app_properties.update(data.get("appProperties") or {})
+                return 200, ss.drive_file()
+        ss = self._file(file_id)
+        if sub == "/copy" and method == "POST":
+            self.count("drive.copy")
+            new = self.create(data.get("name") or f"Copy of {ss.title}", [], data.get("parents") or ss.parents)
+            new.sheets = copy.deepcopy(ss.sheets)
+            new.app_properties.update(data.get("appProperties") or {})
+            return 200, new.drive_file()
+        if sub == "/permissions" and method == "POST":
+            self.count("drive.permissions")
+            return 200, {"kind": "drive#permission", "id": f"perm{random.randint(1, 10**9)}", **data}
+        if method == "GET":
+            self.count("drive.get")
+            return 200, ss.drive_file()
+        if method == "PATCH":
+            self.count("drive.update")
+            if data.get("name"):
+                ss.title = data["name"]
+            for k, v in (data.get("appProperties") or {}).items():
+                if v is None:                       # null — удалить свойство, как в Drive
+                    ss.app_properties.pop(k, None)
+                else:
+                    ss.app_properties[k] = v
+            ss.modified = _now()
+            return 200, ss.drive_file()
+        if method == "DELETE":
+            self.count("drive.delete")
+            del self.files[ss.id]
+            return 204, None
+        raise ApiError(404, f"Unknown Drive method {method} {sub}", "NOT_FOUND")
+
+    def _drive_list(self, query: Dict[str, str]) -> Dict[str, Any]:
+        q = query.get("q", "")
+        files = list(self.files.values())
+        for parent in _PARENT_RE.findall(q):
+            files = [f for f in files if parent in f.parents]
+        for key, value in _APPPROP_RE.findall(q):
+            files = [f for f in files if f.app_properties.get(key) == value]
+        for name in _NAME_Q_RE.findall(q):
+            files = [f for f in files if f.title == name]
+        if "createdTime" in query.get("orderBy", ""):
+            files.sort(key=lambda f: f.created)
+        size = int(query.get("pageSize") or 100)
+        start = int(query.get("pageToken") or 0)
+        out: Dict[str, Any] = {"files": [f.drive_file() for f in files[start:start + size]]}
+        if start + size < len(files):
+            out["nextPageToken"] = str(start + size)
+        return out
+
+    def _drive_batch(self, headers: Dict[str, str], body: bytes) -> Response:
+        """multipart/mixed: под-запросы выполняются по очереди, ответы — тем же multipart."""
+        self.count("drive.batch")
+        ctype = next((v for k, v in headers.items() if k.lower() == "content-type"), "")
+        msg = BytesParser().parsebytes(f"Content-Type: {ctype}\r\n\r\n".encode() + body)
+        boundary = "batch_fake_boundary"
+        parts = []
+        for part in msg.get_payload():
+            raw = part.get_payload(decode=False)
+            head, _, sub_body = raw.replace("\r\n", "\n").partition("\n\n")
+            request_line = head.split("\n", 1)[0]
+            method, target, _ = request_line.split(" ", 2)
+            u = urlsplit(target)
+            q = dict(parse_qsl(u.query, keep_blank_values=True))
+            try:
+                m = _DRIVE_RE.match(u.path)
+                if not m:
+                    raise ApiError(404, f"Unknown path {u.path}", "NOT_FOUND")
+                with self._lock:
+                    status, payload = self._drive(method, m.group(1), m.group(2) or "", q, json.loads(sub_body) if sub_body.strip() else {})
+            except ApiError as e:
+                status, payload = e.status, {"error": {"code": e.status, "message": str(e), "status": e.reason}}
+            cid = part.get("Content-ID", "")
+            cid = f"<response-{cid[1:]}" if cid.startswith("<") else cid
+            text = json.dumps(payload or {}, ensure_ascii=False)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {cid}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{text}\r\n"
+            )
+        payload = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        return 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, payload
+
+def _meta_matches(meta: Dict[str, Any], sheet: Sheet, lookup: Dict[str, Any]) -> bool:
+    if "metadataId" in lookup and lookup["metadataId"] != meta.get("metadataId"):
+        return False
+    if "metadataKey" in lookup and lookup["metadataKey"] != meta.get("metadataKey"):
+        return False
+    loc = lookup.get("metadataLocation") or {}
+    if "sheetId" in loc and loc["sheetId"] != sheet.id:
+        return False
+    return True
+
+def _error(status: int, message: str, reason: str) -> Response:
+    return json_response(status, {"error": {"code": status, "message": message, "status": reason}})
+
+__all__ = ["Sheet", "Spreadsheet", "GoogleServer"]
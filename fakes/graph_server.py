@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+# fakes/graph_server.py
+"""
+Локальная заглушка Facebook Graph API — ровно то подмножество, которым пользуется fb/:
+
+    GET  act_X/insights            (level=campaign, time_range, time_increment=1, курсоры)
+    POST act_X/insights  → report_run_id;  GET <run>  (async_status);  GET <run>/insights
+    GET  act_X/campaigns           (вложенные поля: adsets.limit(N){… ads.limit(1){… creative{…}}}, filtering id IN)
+    GET  <campaign>/adsets, <adset>/ads, <ad>/previews, <id>?fields=…, ?ids=a,b&fields=…
+    POST /  batch=[…]              (Batch API, включая {result=name:$.data.*.id})
+
+Данные — из fakes/synthetic.World. С кассетой (fakes/cassette.py) ответы
+берутся из записи (replay) или проксируются в настоящий Graph и пишутся (record);
+промах кассеты в replay отдаётся синтетикой.
+Счётчики: insights, async_start, async_status, campaigns, adsets, ads, object, ids, previews,
+batch (POST) и batch.<вид> (под-запросы).
+"""
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from fakes.base import FakeServer, Faults, Response, json_response
+from fakes.cassette import Cassette, RECORD
+from fakes.synthetic import World
+
+UPSTREAM = "https://graph.facebook.com"
+DEFAULT_LIMIT = 25
+
+_VERSION_RE = re.compile(r"v\d+\.\d+")
+_RESULT_REF_RE = re.compile(r"\{result=([^:}]+):\$\.data\.\*\.id\}")
+_NAME_RE = re.compile(r"\s*([A-Za-z_]\w*)")
+_MOD_RE = re.compile(r"\.(\w+)\(([^)]*)\)")
+
+# ── ПОЛЯ GRAPH ───────────────────────────────────────────────────────────────
+Field = Tuple[str, Optional[int], Optional[list]]
+
+def parse_fields(expr: str) -> List[Field]:
+    """'id,adsets.limit(5){id,ads{id}}' → [('id', None, None), ('adsets', 5, [...])]."""
+    pos = 0
+
+    def _list() -> List[Field]:
+        nonlocal pos
+        out: List[Field] = []
+        while pos < len(expr) and expr[pos] != "}":
+            m = _NAME_RE.match(expr, pos)
+            if not m:
+                raise ValueError(f"не разобрать fields с позиции {pos}: {expr!r}")
+            name, limit, sub = m.group(1), None, None
+            pos = m.end()
+            while pos < len(expr) and expr[pos] == ".":
+                mod = _MOD_RE.match(expr, pos)
+                if not mod:
+                    raise ValueError(f"не разобрать модификатор в {expr!r}")
+                if mod.group(1) == "limit":
+                    limit = int(mod.group(2))
+                pos = mod.end()
+            if pos < len(expr) and expr[pos] == "{":
+                pos += 1
+                sub = _list()
+                pos += 1
+            out.append((name, limit, sub))
+            if pos < len(expr) and expr[pos] == ",":
+                pos += 1
+        return out
+
+    return _list() if expr else []
+
+_EDGES = ("adsets", "ads")
+_HIDDEN = {"daily_spend", "adsets", "ads", "creative"}
+
+def _cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+def _offset(cursor: str | None) -> int:
+    try:
+        return int(base64.urlsafe_b64decode((cursor or "").encode()).decode())
+    except Exception:
+        return 0
+
+def render(obj: Dict[str, Any], fields: List[Field]) -> Dict[str, Any]:
+    """Объект Graph с запрошенными полями (вложенные edge — с limit и paging)."""
+    out: Dict[str, Any] = {"id": obj["id"]}
+    for name, limit, sub in fields or [("id", None, None)]:
+        if name in _EDGES and name in obj:
+            items, lim = obj[name], limit or DEFAULT_LIMIT
+            edge: Dict[str, Any] = {"data": [render(x, sub or []) for x in items[:lim]]}
+            if len(items) > lim:
+                edge["paging"] = {"cursors": {"after": _cursor(lim)}, "next": f"{UPSTREAM}/next"}
+            out[name] = edge
+        elif name == "creative" and obj.get("creative"):
+            out["creative"] = render(obj["creative"], sub or [])
+        elif name in obj and name not in _HIDDEN:
+            out[name] = obj[name]
+    return out
+
+def _graph_error(status: int, code: int, message: str, **extra) -> Response:
+    return json_response(status, {"error": {"message": message, "type": "OAuthException", "code": code, **extra}})
+
+# ── СЕРВЕР ───────────────────────────────────────────────────────────────────
+class GraphServer(FakeServer):
+    name = "graph"
+
+    def __init__(
+        self,
+        world: World | None = None,
+        cassette: Cassette | None = None,
+        upstream: str = UPSTREAM,
+        async_polls: int = 0,
+        usage_pct: float = 1.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        faults: Faults | None = None,
+    ):
+        super().__init__(host, port, faults)
+        self.world = world or World()
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/")
+        self.async_polls = async_polls      # сколько опросов async-отчёт «в работе»
+        self.usage_pct = usage_pct          # что отдавать в X-App-Usage / X-Ad-Account-Usage
+        self._lock = threading.Lock()
+        self._runs: Dict[str, Dict[str, Any]] = {}
+        self._rows_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+
+    def fault_response(self, status: int) -> Response:
+        if status == 429:
+            return _graph_error(429, 4, "(#4) Application request limit reached", is_transient=True)
+        return _graph_error(status, 2, "Service temporarily unavailable", is_transient=True)
+
+    def _usage_headers(self, rel: str) -> Dict[str, str]:
+        u = self.usage_pct
+        headers = {"X-App-Usage": json.dumps({"call_count": u, "total_cputime": u, "total_time": u})}
+        if rel.startswith("act_"):
+            headers["X-Ad-Account-Usage"] = json.dumps({"acc_id_util_pct": u})
+        return headers
+
+    # ── вход ─────────────────────────────────────────────────────────────────
+    def handle(self, method, path, query, headers, body) -> Response:
+        parts = path.strip("/").split("/", 1)
+        version = parts[0] if parts and _VERSION_RE.fullmatch(parts[0]) else ""
+        rel = (parts[1] if len(parts) > 1 else "") if version else path.strip("/")
+        params = dict(query)
+        if method == "POST" and body:
+            params.update(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+
+        if self.cassette is not None:
+            hit = self.cassette.lookup(method, rel, params)
+            if hit is not None:
+                self.count("cassette_hit")
+                return hit
+            if self.cassette.mode == RECORD:
+                resp = self._forward(method, path, query, params)
+                self.cassette.record(method, rel, params, resp)
+                self.count("cassette_recorded")
+                return resp
+            self.count("cassette_miss")
+
+        status, payload = self.route(method, rel, params, version)
+        return json_response(status, payload, self._usage_headers(rel))
+
+    def _forward(self, method: str, path: str, query: Dict[str, str], params: Dict[str, str]) -> Response:
+        import requests   # только для записи кассет
+
+        url = f"{self.upstream}{path}"
+        if method == "GET":
+            r = requests.get(url, params=params, timeout=120)
+        else:
+            r = requests.request(method, url, params=query, data={k: v for k, v in params.items() if k not in query}, timeout=120)
+        return r.status_code, dict(r.headers), r.content
+
+    # ── маршруты ─────────────────────────────────────────────────────────────
+    def route(self, method: str, rel: str, params: Dict[str, str], version: str = "", prefix: str = "") -> Tuple[int, Any]:
+        """(статус, тело) для запроса rel — и для обычных запросов, и для под-запросов batch."""
+        def _count(kind: str):
+            self.count(prefix + kind)
+
+        try:
+            fields = parse_fields(params.get("fields", ""))
+        except ValueError as e:
+            return 400, {"error": {"message": str(e), "type": "OAuthException", "code": 100}}
+
+        if rel == "":
+            if method == "POST" and "batch" in params:
+                _count("batch")
+                return 200, self._batch(json.loads(params["batch"]), version)
+            if "ids" in params:
+                _count("ids")
+                ids = [i for i in params["ids"].split(",") if i]
+                return 200, {i: render(self.world.objects[i], fields) for i in ids if i in self.world.objects}
+            return 400, {"error": {"message": "Unsupported request", "code": 100}}
+
+        segs = rel.split("/")
+        head, edge = segs[0], (segs[1] if len(segs) > 1 else "")
+
+        if head.startswith("act_"):
+            if head not in self.world.accounts:
+                return 400, {"error": {"message": f"Unsupported get request. Object with ID '{head}' does not exist", "code": 100}}
+            if edge == "insights" and method == "POST":
+                _count("async_start")
+                return 200, {"report_run_id": self._start_run(head, params)}
+            if edge == "insights":
+                _count("insights")
+                return 200, self._page(self._insights(head, params), params, rel, version, fields_filter=True)
+            if edge == "campaigns":
+                _count("campaigns")
+                camps = self.world.accounts[head].campaigns
+                for f in json.loads(params.get("filtering") or "[]"):
+                    if f.get("field") == "id" and f.get("operator") == "IN":
+                        wanted = {str(v) for v in f.get("value") or []}
+                        camps = [c for c in camps if c["id"] in wanted]
+                rows = [render(c, fields) for c in camps]
+                return 200, self._page(rows, params, rel, version)
+
+        if head in self._runs:
+            run = self._runs[head]
+            if edge == "insights":
+                _count("async_rows")
+                return 200, self._page(self._insights(run["account"], run["params"]), params, rel, version, fields_filter=True, run=run)
+            _count("async_status")
+            with self._lock:
+                running = run["polls"] > 0
+                run["polls"] -= 1
+            return 200, {
+                "id": head,
+                "async_status": "Job Running" if running else "Job Completed",
+                "async_percent_completion": 50 if running else 100,
+            }
+
+        obj = self.world.objects.get(head)
+        if obj is None:
+            return 400, {"error": {"message": f"Unsupported get request. Object with ID '{head}' does not exist", "code": 100}}
+        if edge in _EDGES:
+            _count(edge)
+            rows = [render(x, fields) for x in obj.get(edge, [])]
+            return 200, self._page(rows, params, rel, version)
+        if edge == "previews":
+            _count("previews")
+            return 200, {"data": [{"body": f'<iframe src="https://www.facebook.com/ads/api/preview_iframe.php?d={head}"></iframe>'}]}
+        if edge:
+            return 400, {"error": {"message": "Unknown path components", "code": 2500}}
+        _count("object")
+        return 200, render(obj, fields)
+
+    # ── инсайты ──────────────────────────────────────────────────────────────
+    def _insights(self, account: str, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        tr = json.loads(params.get("time_range") or "{}")
+        today = dt.date.today().isoformat()
+        since = dt.date.fromisoformat(tr.get("since") or today)
+        until = dt.date.fromisoformat(tr.get("until") or tr.get("since") or today)
+        daily = str(params.get("time_increment", "")) == "1"
+        key = (account, since, until, daily)
+        with self._lock:
+            rows = self._rows_cache.get(key)
+            if rows is not None:
+                self._rows_cache.move_to_end(key)
+                return rows
+        rows = list(self.world.insights(account, since, until, daily))
+        with self._lock:
+            self._rows_cache[key] = rows
+            while len(self._rows_cache) > 64:
+                self._rows_cache.popitem(last=False)
+        return rows
+
+    def _start_run(self, account: str, params: Dict[str, str]) -> str:
+        with self._lock:
+            run_id = f"{900000 + len(self._runs) + 1}"
+            self._runs[run_id] = {"account": account, "params": dict(params), "polls": self.async_polls}
+        return run_id
+
+    def _page(
+        self,
+        rows: List[Dict[str, Any]],
+        params: Dict[str, str],
+        rel: str,
+        version: str,
+        fields_filter: bool = False,
+        run: Dict[str, Any] | None = None,
+    ) -> Dict[str, Any]:
+        limit = int(params.get("limit") or DEFAULT_LIMIT)
+        start = _offset(params.get("after"))
+        chunk = rows[start:start + limit]
+        if fields_filter:
+            wanted = (run or {}).get("params", params).get("fields")
+            keep = set(wanted.split(",")) | {"date_start", "date_stop"} if wanted else None
+            chunk = [{k: v for k, v in r.items() if keep is None or k in keep} for r in chunk]
+        out: Dict[str, Any] = {"data": chunk}
+        if rows:
+            out["paging"] = {"cursors": {"before": _cursor(start), "after": _cursor(start + len(chunk))}}
+            if start + limit < len(rows):
+                q = urlencode({**params, "after": _cursor(start + len(chunk))})
+                out["paging"]["next"] = f"{self.url}/{version}/{rel}?{q}"
+        return out
+
+    # ── Batch API ────────────────────────────────────────────────────────────
+    def _batch(self, ops: List[Dict[str, Any]], version: str) -> List[Dict[str, Any]]:
+        named: Dict[str, Tuple[int, Any]] = {}
+        out = []
+        for op in ops:
+            rel_url = op.get("relative_url", "")
+            missing = None
+
+            def _sub(m):
+                nonlocal missing
+                status, payload = named.get(m.group(1), (0, None))
+                if status != 200:
+                    missing = m.group(1)
+                    return ""
+                return ",".join(str(x.get("id")) for x in payload.get("data", []) or [])
+
+            rel_url = _RESULT_REF_RE.sub(_sub, rel_url)
+            if missing:
+                status, payload = 400, {"error": {"message": f"batch: нет результата {missing}", "code": 100}}
+            else:
+                parts = urlsplit(rel_url)
+                params = dict(parse_qsl(parts.query, keep_blank_values=True))
+                status, payload = self.route(op.get("method", "GET"), parts.path.strip("/"), params, version, prefix="batch.")
+            if op.get("name"):
+                named[op["name"]] = (status, payload)
+            out.append({"code": status, "headers": [], "body": json.dumps(payload, ensure_ascii=False)})
+        return out
+
+__all__ = ["UPSTREAM", "parse_fields", "render", "GraphServer"]
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# fakes/stand.py
+"""
+Локальный стенд: заглушки Graph API и Sheets/Drive с синтетическими клиентами.
+
+Stand поднимает оба сервера, заполняет Google-заглушку (Monthly, файлы клиентов,
+мастер-шаблон) по синтетическому миру и отдаёт env — переменные для config.py:
+FB_GRAPH_URL, GOOGLE_API_URL, MONTHLY_SHEET_ID, TEMPLATE_SPREADSHEET_ID, …
+плюс пути кэшей/журналов во временной папке, чтобы не трогать рабочие.
+config.py читает окружение при импорте — env нужно применить до импорта
+модулей бота (apply_env) или экспортировать в shell (CLI ниже).
+
+    python -m fakes.stand serve --accounts 5 --campaigns 200 --latency 80 --p429 0.02
+    python -m fakes.stand serve --cassette .cache/graph.jsonl --record    # записать настоящий Graph
+    python -m fakes.stand serve --cassette .cache/graph.jsonl             # воспроизвести
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict
+
+from fakes.base import Faults
+from fakes.cassette import Cassette, RECORD, REPLAY
+from fakes.graph_server import GraphServer
+from fakes.google_server import GoogleServer
+from fakes.synthetic import World, make_world
+
+class Stand:
+    def __init__(
+        self,
+        world: World | None = None,
+        graph_faults: Faults | None = None,
+        google_faults: Faults | None = None,
+        cassette: Cassette | None = None,
+        async_polls: int = 0,
+        graph_port: int = 0,
+        google_port: int = 0,
+        workdir: str | None = None,
+    ):
+        self.world = world or make_world()
+        self.graph = GraphServer(self.world, cassette=cassette, async_polls=async_polls,
+                                 port=graph_port, faults=graph_faults)
+        self.google = GoogleServer(port=google_port, faults=google_faults)
+        self.workdir = workdir or tempfile.mkdtemp(prefix="mr-stand-")
+        self.env: Dict[str, str] = {
+            "FB_GRAPH_URL": self.graph.url,
+            "GOOGLE_API_URL": self.google.url,
+            "FB_CACHE_PATH": os.path.join(self.workdir, "fb_cache.sqlite"),
+            "FB_DAILY_STORE_PATH": os.path.join(self.workdir, "fb_daily.sqlite"),
+            "CHECKPOINT_PATH": os.path.join(self.workdir, "checkpoints.sqlite"),
+            **self.google.seed(self.world),
+        }
+        if cassette is None or cassette.mode != RECORD:
+            self.env["FB_ACCESS_TOKEN"] = "fake-token"   # при записи нужен настоящий
+
+    def start(self) -> "Stand":
+        self.graph.start()
+        self.google.start()
+        return self
+
+    def stop(self) -> None:
+        self.graph.stop()
+        self.google.stop()
+
+    def __enter__(self) -> "Stand":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def apply_env(self) -> None:
+        """Прописать env в os.environ (до импорта config и модулей бота)."""
+        os.environ.update(self.env)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"graph": self.graph.snapshot(), "google": self.google.snapshot()}
+
+    def reset_stats(self) -> None:
+        self.graph.reset_stats()
+        self.google.reset_stats()
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m fakes.stand", description="Локальные заглушки Graph и Sheets/Drive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="поднять стенд и ждать Ctrl+C")
+    sp.add_argument("--accounts", type=int, default=3)
+    sp.add_argument("--campaigns", type=int, default=20)
+    sp.add_argument("--adsets", type=int, default=2)
+    sp.add_argument("--ads", type=int, default=1)
+    sp.add_argument("--seed", type=int, default=1)
+    sp.add_argument("--graph-port", type=int, default=8801)
+    sp.add_argument("--google-port", type=int, default=8802)
+    sp.add_argument("--latency", type=float, default=0.0, help="задержка ответа, мс")
+    sp.add_argument("--jitter", type=float, default=0.0, help="± к задержке, мс")
+    sp.add_argument("--p429", type=float, default=0.0, help="доля ответов 429")
+    sp.add_argument("--p5xx", type=float, default=0.0, help="доля ответов 503")
+    sp.add_argument("--faults-on", choices=("both", "graph", "google"), default="both")
+    sp.add_argument("--async-polls", type=int, default=0, help="сколько опросов async-отчёт «в работе»")
+    sp.add_argument("--cassette", help="файл кассеты Graph (JSON Lines)")
+    sp.add_argument("--record", action="store_true", help="писать кассету, проксируя в настоящий Graph")
+    args = ap.parse_args(argv)
+
+    def _faults(target: str) -> Faults | None:
+        if args.faults_on not in ("both", target):
+            return None
+        return Faults(args.latency, args.jitter, args.p429, args.p5xx, seed=args.seed)
+
+    cassette = Cassette(args.cassette, RECORD if args.record else REPLAY) if args.cassette else None
+    world = make_world(args.accounts, args.campaigns, args.adsets, args.ads, seed=args.seed)
+    stand = Stand(world, _faults("graph"), _faults("google"), cassette, args.async_polls,
+                  args.graph_port, args.google_port).start()
+
+    print("🧪 Стенд поднят. Для бота/скриптов:")
+    for k, v in stand.env.items():
+        print(f"export {k}={v}")
+    print("\nКлиенты:", ", ".join(a.name for a in world.accounts.values()))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n📊", stand.stats())
+        stand.stop()
+
+if __name__ == "__main__":
+    main()
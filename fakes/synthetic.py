@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# fakes/synthetic.py
+"""
+Синтетические рекламные аккаунты для локальной заглушки Graph API (fakes/graph_server.py).
+
+Аккаунт — N кампаний × M adset'ов × K объявлений с креативами разных видов
+(IG permalink / пост / thumbnail / только превью). Статистика по дням
+детерминирована: зависит только от seed, id кампании и даты, поэтому любой
+период любого аккаунта отдаётся одинаково между запусками — без хранения.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import random
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# objective → action_type результата (как их понимает fb/insights.py)
+OBJECTIVES = {
+    "OUTCOME_ENGAGEMENT": "onsite_conversion.messaging_conversation_started_7d",
+    "OUTCOME_LEADS": "lead",
+    "OUTCOME_TRAFFIC": "link_click",
+    "OUTCOME_SALES": "offsite_conversion.fb_pixel_purchase",
+}
+
+@dataclass
+class Account:
+    id: str                                   # act_<digits>
+    name: str
+    campaigns: List[Dict[str, Any]] = field(default_factory=list)
+    # Кампании, которые есть в инсайтах, но не в /campaigns (удалённые/архивные)
+    deleted: List[Dict[str, Any]] = field(default_factory=list)
+
+class World:
+    """Все синтетические аккаунты и индекс объектов Graph по id."""
+
+    def __init__(self, seed: int = 1):
+        self.seed = seed
+        self.accounts: Dict[str, Account] = {}
+        self.objects: Dict[str, Dict[str, Any]] = {}   # id → кампания / adset / ad / пост
+
+    # ── генерация ────────────────────────────────────────────────────────────
+    def add_account(
+        self,
+        campaigns: int = 20,
+        adsets: int = 2,
+        ads: int = 1,
+        name: Optional[str] = None,
+        deleted_share: float = 0.05,
+        active_share: float = 0.6,
+    ) -> Account:
+        n = len(self.accounts) + 1
+        acc = Account(id=f"act_{1000000 + n}", name=name or f"client {n}")
+        rng = random.Random(f"{self.seed}:acc:{n}")
+        objectives = list(OBJECTIVES)
+
+        for c in range(campaigns):
+            cid = f"23{n:06d}{c:06d}"
+            camp = {
+                "id": cid,
+                "account_id": acc.id,
+                "name": f"{acc.name} • кампания {c + 1}",
+                "objective": rng.choice(objectives),
+                "status": "ACTIVE" if rng.random() < active_share else "PAUSED",
+                "daily_spend": round(rng.uniform(2, 80), 2),
+                "adsets": [],
+            }
+            camp["effective_status"] = camp["status"]
+            for s in range(adsets):
+                sid = f"24{n:06d}{c:06d}{s:03d}"
+                adset = {
+                    "id": sid,
+                    "campaign_id": cid,
+                    "name": f"adset {s + 1}",
+                    "status": camp["status"],
+                    "daily_budget": str(rng.choice([500, 1000, 1500, 2000, 5000])),
+                    "ads": [],
+                }
+                for a in range(ads):
+                    aid = f"25{n:06d}{c:06d}{s:03d}{a:02d}"
+                    ad = {"id": aid, "adset_id": sid, "creative": self._creative(rng, aid)}
+                    adset["ads"].append(ad)
+                    self.objects[aid] = ad
+                camp["adsets"].append(adset)
+                self.objects[sid] = adset
+            self.objects[cid] = camp
+            if rng.random() < deleted_share:
+                camp["status"] = camp["effective_status"] = "DELETED"
+                acc.deleted.append(camp)
+            else:
+                acc.campaigns.append(camp)
+
+        self.accounts[acc.id] = acc
+        return acc
+
+    def _creative(self, rng: random.Random, ad_id: str) -> Dict[str, Any]:
+        kind = rng.random()
+        cr: Dict[str, Any] = {"id": f"cr{ad_id}"}
+        if kind < 0.4:
+            cr["instagram_permalink_url"] = f"https://www.instagram.com/p/{ad_id}/"
+        elif kind < 0.7:
+            story = f"1000{ad_id[-8:]}_{ad_id}"
+            cr["object_story_id"] = cr["effective_object_story_id"] = story
+            self.objects[story] = {"id": story, "permalink_url": f"https://www.facebook.com/{story}"}
+        elif kind < 0.9:
+            cr["thumbnail_url"] = f"https://scontent.example/{ad_id}.jpg"
+        return cr
+
+    # ── статистика ───────────────────────────────────────────────────────────
+    def all_campaigns(self, account_id: str) -> List[Dict[str, Any]]:
+        acc = self.accounts.get(account_id)
+        return (acc.campaigns + acc.deleted) if acc else []
+
+    def day_stats(self, camp: Dict[str, Any], day: dt.date) -> Optional[Dict[str, Any]]:
+        """Строка инсайтов кампании за день (None — показов не было)."""
+        rng = random.Random(f"{self.seed}:{camp['id']}:{day.isoformat()}")
+        if rng.random() < 0.15:
+            return None
+        spend = round(camp["daily_spend"] * rng.uniform(0.5, 1.5), 2)
+        impressions = int(spend * rng.uniform(80, 200))
+        clicks = int(impressions * rng.uniform(0.005, 0.03))
+        results = int(clicks * rng.uniform(0.05, 0.4))
+        actions = [{"action_type": "link_click", "value": str(clicks)}]
+        result_type = OBJECTIVES[camp["objective"]]
+        if result_type != "link_click":
+            actions.append({"action_type": result_type, "value": str(results)})
+        return {
+            "campaign_id": camp["id"],
+            "campaign_name": camp["name"],
+            "objective": camp["objective"],
+            "spend": f"{spend:.2f}",
+            "impressions": str(impressions),
+            "reach": str(int(impressions * rng.uniform(0.5, 0.8))),
+            "clicks": str(clicks),
+            "actions": actions,
+            "date_start": day.isoformat(),
+            "date_stop": day.isoformat(),
+        }
+
+    def insights(self, account_id: str, since: dt.date, until: dt.date, daily: bool) -> Iterator[Dict[str, Any]]:
+        """Инсайты level=campaign за период: по строке на кампанию (или на кампанию×день)."""
+        days = [since + dt.timedelta(days=i) for i in range((until - since).days + 1)]
+        for camp in self.all_campaigns(account_id):
+            rows = [r for r in (self.day_stats(camp, d) for d in days) if r]
+            if daily:
+                yield from rows
+                continue
+            if not rows:
+                continue
+            actions: Dict[str, float] = {}
+            for r in rows:
+                for a in r["actions"]:
+                    actions[a["action_type"]] = actions.get(a["action_type"], 0) + int(a["value"])
+            yield {
+                "campaign_id": camp["id"],
+                "campaign_name": camp["name"],
+                "objective": camp["objective"],
+                "spend": f"{sum(float(r['spend']) for r in rows):.2f}",
+                "impressions": str(sum(int(r["impressions"]) for r in rows)),
+                # уникальный охват не аддитивен — берём «с пересечением»
+                "reach": str(int(sum(int(r["reach"]) for r in rows) * 0.7)),
+                "clicks": str(sum(int(r["clicks"]) for r in rows)),
+                "actions": [{"action_type": k, "value": str(v)} for k, v in actions.items()],
+                "date_start": since.isoformat(),
+                "date_stop": until.isoformat(),
+            }
+
+def make_world(
+    accounts: int = 1,
+    campaigns: int = 20,
+    adsets: int = 2,
+    ads: int = 1,
+    seed: int = 1,
+) -> World:
+    """Мир из accounts одинаковых по размеру аккаунтов."""
+    world = World(seed)
+    for _ in range(accounts):
+        world.add_account(campaigns=campaigns, adsets=adsets, ads=ads)
+    return world
+
+__all__ = ["OBJECTIVES", "Account", "World", "make_world"]
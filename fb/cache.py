@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# fb/cache.py
+"""
+Локальный кэш ответов Graph API (SQLite).
+
+Ключ — путь + нормализованные параметры (без access_token).
+TTL зависит от эндпоинта (см. ttl_for): закрытые периоды инсайтов живут долго,
+текущие — недолго, статусы кампаний не кэшируются вовсе.
+Размер ограничен FB_CACHE_MAX_MB, при переполнении вытесняются давно читанные записи (LRU).
+
+CLI:
+    python -m fb.cache stats
+    python -m fb.cache purge --expired
+    python -m fb.cache purge --prefix act_123/insights
+    python -m fb.cache purge --all
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import (
+    FB_CACHE_ENABLED,
+    FB_CACHE_PATH,
+    FB_CACHE_MAX_MB,
+    FB_CACHE_TTL_SHORT,
+    FB_CACHE_TTL_CLOSED,
+    FB_CACHE_TTL_CREATIVE,
+    FB_INSIGHTS_MUTABLE_DAYS,
+)
+
+# =====================================================================
+#                         КЛЮЧ И TTL
+# =====================================================================
+
+def _norm_path(path: str) -> str:
+    return (path or "").strip("/")
+
+def cache_key(path: str, params: Dict[str, Any]) -> str:
+    """sha256 от пути и отсортированных параметров; access_token в ключ не попадает."""
+    p = {k: str(v) for k, v in (params or {}).items() if k != "access_token"}
+    raw = json.dumps({"path": _norm_path(path), "params": sorted(p.items())}, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _insights_until(params: Dict[str, Any]) -> Optional[dt.date]:
+    tr = params.get("time_range")
+    if isinstance(tr, str):
+        try:
+            tr = json.loads(tr)
+        except Exception:
+            return None
+    try:
+        return dt.date.fromisoformat((tr or {}).get("until"))
+    except Exception:
+        return None
+
+def ttl_for(path: str, params: Dict[str, Any]) -> int:
+    """
+    Сколько секунд можно хранить ответ (0 — не кэшировать):
+      - /campaigns (статусы)                → 0
+      - /insights за закрытый период        → FB_CACHE_TTL_CLOSED
+        (until старше окна атрибуции FB_INSIGHTS_MUTABLE_DAYS)
+      - /insights, захватывающие последние дни → FB_CACHE_TTL_SHORT
+      - creative / permalink / previews     → FB_CACHE_TTL_CREATIVE
+      - всё остальное (adset'ы, бюджеты)    → FB_CACHE_TTL_SHORT
+    """
+    p = _norm_path(path)
+    tail = p.rsplit("/", 1)[-1]
+    fields = str((params or {}).get("fields", ""))
+
+    if tail == "campaigns" or "effective_status" in fields:
+        return 0
+    if tail == "insights":
+        until = _insights_until(params or {})
+        if until and until < dt.date.today() - dt.timedelta(days=FB_INSIGHTS_MUTABLE_DAYS):
+            return FB_CACHE_TTL_CLOSED
+        return FB_CACHE_TTL_SHORT
+    if tail == "previews" or fields.startswith("creative") or fields == "permalink_url":
+        return FB_CACHE_TTL_CREATIVE
+    return FB_CACHE_TTL_SHORT
+
+# =====================================================================
+#                         ХРАНИЛИЩЕ (SQLite)
+# =====================================================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    path        TEXT NOT NULL,
+    body        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_responses_lru ON responses(last_access);
+CREATE INDEX IF NOT EXISTS ix_responses_path ON responses(path);
+"""
+
+class ResponseCache:
+    """Потокобезопасный (одно соединение под локом) кэш ответов на SQLite."""
+
+    def __init__(self, path: str = FB_CACHE_PATH, max_bytes: int = int(FB_CACHE_MAX_MB * 1024 * 1024)):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, path: str, value: Any, ttl: int) -> None:
+        if ttl <= 0:
+            return
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses(key, path, body, size, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, _norm_path(path), body, len(body), now, now + ttl, now),
+            )
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        """LRU: пока общий размер больше max_bytes — удаляем давно читанные записи."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def purge(self, everything: bool = False, expired: bool = False, prefix: str | None = None) -> int:
+        """Удаляет записи: все / просроченные / по префиксу пути. Возвращает число удалённых."""
+        with self._lock:
+            if everything:
+                cur = self._conn.execute("DELETE FROM responses")
+            elif prefix:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE path LIKE ?", (_norm_path(prefix) + "%",)
+                )
+            elif expired:
+                cur = self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            else:
+                return 0
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, size, n_expired = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(CASE WHEN expires_at <= ? THEN 1 ELSE 0 END), 0) FROM responses",
+                (time.time(),),
+            ).fetchone()
+        return {"path": self.path, "entries": n, "expired": n_expired, "bytes": size, "max_bytes": self.max_bytes}
+
+# =====================================================================
+#                         ОБЩИЙ ЭКЗЕМПЛЯР
+# =====================================================================
+
+_CACHE: ResponseCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache() -> ResponseCache | None:
+    """Кэш процесса (None, если выключен через FB_CACHE_ENABLED=0)."""
+    global _CACHE
+    if not FB_CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache()
+    return _CACHE
+
+# =====================================================================
+#                                CLI
+# =====================================================================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m fb.cache", description="Кэш ответов Graph API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="показать размер кэша")
+    pp = sub.add_parser("purge", help="удалить записи")
+    g = pp.add_mutually_exclusive_group(required=True)
+    g.add_argument("--all", action="store_true", help="удалить всё")
+    g.add_argument("--expired", action="store_true", help="удалить просроченные")
+    g.add_argument("--prefix", help="удалить по префиксу пути, напр. act_123/insights")
+    args = ap.parse_args(argv)
+
+    cache = ResponseCache()
+    if args.cmd == "stats":
+        print(json.dumps(cache.stats(), ensure_ascii=False, indent=2))
+    else:
+        n = cache.purge(everything=args.all, expired=args.expired, prefix=args.prefix)
+        print(f"🧹 Удалено записей: {n}")
+
+if __name__ == "__main__":
+    main()
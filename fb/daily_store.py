@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# fb/daily_store.py
+"""
+Локальное хранилище дневных инсайтов по кампаниям (time_increment=1), по аккаунтам.
+
+Дни, загруженные после окна атрибуции (FB_INSIGHTS_MUTABLE_DAYS), считаются окончательными
+и повторно не запрашиваются; свежие дни перезагружаются не чаще FB_CACHE_TTL_SHORT.
+Любой период собирается из хранилища локально (см. fb/insights.py).
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from config import (
+    FB_DAILY_STORE_PATH,
+    FB_INSIGHTS_MUTABLE_DAYS,
+    FB_CACHE_TTL_SHORT,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_rows (
+    account     TEXT NOT NULL,
+    day         TEXT NOT NULL,
+    campaign_id TEXT NOT NULL,
+    row         TEXT NOT NULL,
+    PRIMARY KEY (account, day, campaign_id)
+);
+CREATE TABLE IF NOT EXISTS fetched_days (
+    account     TEXT NOT NULL,
+    day         TEXT NOT NULL,
+    fetched_at  REAL NOT NULL,
+    PRIMARY KEY (account, day)
+);
+"""
+
+def _days(since: dt.date, until: dt.date) -> List[dt.date]:
+    return [since + dt.timedelta(days=i) for i in range((until - since).days + 1)]
+
+def day_ranges(days: Iterable[dt.date]) -> List[Tuple[dt.date, dt.date]]:
+    """Сворачивает даты в непрерывные отрезки [(since, until), ...]."""
+    out: List[Tuple[dt.date, dt.date]] = []
+    for d in sorted(set(days)):
+        if out and d == out[-1][1] + dt.timedelta(days=1):
+            out[-1] = (out[-1][0], d)
+        else:
+            out.append((d, d))
+    return out
+
+class DailyInsightsStore:
+    """Потокобезопасное (одно соединение под локом) хранилище дневных строк на SQLite."""
+
+    def __init__(self, path: str = FB_DAILY_STORE_PATH):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def stale_days(self, account: str, since: dt.date, until: dt.date) -> List[dt.date]:
+        """
+        Дни периода, которые нужно (пере)загрузить:
+          - ещё не загружались;
+          - загружены, пока день был «изменяемым» (атрибуция не закрыта),
+            и с тех пор прошло больше FB_CACHE_TTL_SHORT.
+        """
+        with self._lock:
+            fetched = dict(self._conn.execute(
+                "SELECT day, fetched_at FROM fetched_days WHERE account = ? AND day BETWEEN ? AND ?",
+                (account, since.isoformat(), until.isoformat()),
+            ).fetchall())
+        now = time.time()
+        out = []
+        for d in _days(since, until):
+            ts = fetched.get(d.isoformat())
+            if ts is None:
+                out.append(d)
+                continue
+            fetched_on = dt.date.fromtimestamp(ts)
+            final = fetched_on > d + dt.timedelta(days=FB_INSIGHTS_MUTABLE_DAYS)
+            if not final and now - ts > FB_CACHE_TTL_SHORT:
+                out.append(d)
+        return out
+
+    def replace_days(self, account: str, since: dt.date, until: dt.date, rows: Iterable[Dict[str, Any]]) -> int:
+        """Заменяет все строки аккаунта за [since..until] и отмечает дни загруженными."""
+        s, u = since.isoformat(), until.isoformat()
+        now = time.time()
+        n = 0
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM daily_rows WHERE account = ? AND day BETWEEN ? AND ?", (account, s, u)
+            )
+            for r in rows:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO daily_rows(account, day, campaign_id, row) VALUES (?, ?, ?, ?)",
+                    (account, r.get("date_start") or s, r.get("campaign_id") or "",
+                     json.dumps(r, ensure_ascii=False, separators=(",", ":"))),
+                )
+                n += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fetched_days(account, day, fetched_at) VALUES (?, ?, ?)",
+                [(account, d.isoformat(), now) for d in _days(since, until)],
+            )
+            self._conn.commit()
+        return n
+
+    def rows(self, account: str, since: dt.date, until: dt.date) -> Iterator[Dict[str, Any]]:
+        """Дневные строки аккаунта за период (по дням по возрастанию)."""
+        with self._lock:
+            raw = self._conn.execute(
+                "SELECT row FROM daily_rows WHERE account = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (account, since.isoformat(), until.isoformat()),
+            ).fetchall()
+        for (r,) in raw:
+            yield json.loads(r)
+
+    def purge(self, account: str | None = None) -> None:
+        with self._lock:
+            if account:
+                self._conn.execute("DELETE FROM daily_rows WHERE account = ?", (account,))
+                self._conn.execute("DELETE FROM fetched_days WHERE account = ?", (account,))
+            else:
+                self._conn.execute("DELETE FROM daily_rows")
+                self._conn.execute("DELETE FROM fetched_days")
+            self._conn.commit()
+
+_STORE: DailyInsightsStore | None = None
+_STORE_LOCK = threading.Lock()
+
+def get_store() -> DailyInsightsStore:
+    """Хранилище процесса (создаётся лениво)."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = DailyInsightsStore()
+    return _STORE
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# fb/enrichment.py
+import json
+from typing import Dict, Any, List, Iterable, Optional
+
+from config import FB_ENRICH_PAGE_SIZE, FB_NESTED_ADSETS_LIMIT, FB_ENRICH_FILTER_IDS, FB_REPORT_CONCURRENCY
+from utils import run_bounded
+from .fb_client import iter_rows
+from .insights import _sanitize_account_id
+from .budgets import (
+    _budgets_of,
+    fetch_adsets_daily_budgets,
+    fetch_adsets_daily_budgets_batch,
+)
+from .previews import (
+    CREATIVE_FIELDS,
+    resolve_creative_links,
+    fetch_creative_links_batch,
+    fetch_any_ad_id_of_campaign,
+    get_best_creative_link_for_ad,
+)
+
+# =====================================================================
+#            ОБОГАЩЕНИЕ КАМПАНИЙ ОДНИМ ВЛОЖЕННЫМ ЗАПРОСОМ
+# =====================================================================
+
+# Вся иерархия кампания → adset'ы (бюджеты) → первый ad → creative за один запрос
+CAMPAIGN_TREE_FIELDS = (
+    "id,name,status,effective_status,"
+    f"adsets.limit({FB_NESTED_ADSETS_LIMIT}){{id,daily_budget,status,"
+    f"ads.limit(1){{id,creative{{{CREATIVE_FIELDS}}}}}}}"
+)
+
+def _empty_record(campaign_id: str) -> Dict[str, Any]:
+    return {
+        "campaign_id": campaign_id,
+        "name": "",
+        "status": "",
+        "effective_status": "",
+        "adset_budgets": [],
+        "ad_id": None,
+        "creative": {},
+        "creative_link": None,
+    }
+
+def _record_from_campaign(c: Dict[str, Any]) -> Dict[str, Any]:
+    """Разбирает вложенный ответ по одной кампании в плоскую запись."""
+    rec = _empty_record(c["id"])
+    rec["name"] = c.get("name") or ""
+    rec["status"] = c.get("status") or ""
+    rec["effective_status"] = c.get("effective_status") or ""
+
+    adsets_edge = c.get("adsets") or {}
+    adsets = adsets_edge.get("data", []) or []
+    if (adsets_edge.get("paging") or {}).get("next"):
+        # adset'ов больше, чем влезло во вложенный limit — бюджеты догрузим отдельно
+        rec["adset_budgets"] = fetch_adsets_daily_budgets(c["id"])
+    else:
+        rec["adset_budgets"] = _budgets_of(adsets)
+
+    for adset in adsets:
+        ads = ((adset.get("ads") or {}).get("data", [])) or []
+        if ads:
+            rec["ad_id"] = ads[0]["id"]
+            rec["creative"] = ads[0].get("creative") or {}
+            break
+    return rec
+
+def _id_filters(campaign_ids: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Параметры filtering для /campaigns: без ids — один запрос по всему аккаунту, иначе — по чанкам id."""
+    if campaign_ids is None:
+        return [{}]
+    return [
+        {"filtering": json.dumps(
+            [{"field": "id", "operator": "IN", "value": campaign_ids[i:i + FB_ENRICH_FILTER_IDS]}],
+            separators=(",", ":"),
+        )}
+        for i in range(0, len(campaign_ids), FB_ENRICH_FILTER_IDS)
+    ]
+
+def fetch_campaign_enrichment(
+    ad_account_id: str,
+    campaign_ids: Optional[Iterable[str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    campaign_id -> {status, effective_status, adset_budgets, ad_id, creative, creative_link}
+    постраничным вложенным запросом к /act_X/campaigns плюс пакетное (Batch API)
+    разрешение ссылок на креативы. campaign_ids — только эти кампании
+    (filtering id IN, по FB_ENRICH_FILTER_IDS за запрос): на аккаунтах с тысячами
+    архивных/остановленных кампаний не тянем и не разрешаем лишнее. None — все кампании.
+    """
+    account = _sanitize_account_id(ad_account_id)
+    ids = None if campaign_ids is None else [cid for cid in dict.fromkeys(campaign_ids) if cid]
+    records: Dict[str, Dict[str, Any]] = {}
+    for flt in _id_filters(ids):
+        params = {"fields": CAMPAIGN_TREE_FIELDS, **flt}
+        for c in iter_rows(f"/{account}/campaigns", params, page_size=FB_ENRICH_PAGE_SIZE):
+            records[c["id"]] = _record_from_campaign(c)
+
+    links = resolve_creative_links({r["ad_id"]: r["creative"] for r in records.values() if r["ad_id"]})
+    for r in records.values():
+        if r["ad_id"]:
+            r["creative_link"] = links.get(r["ad_id"])
+    return records
+
+def enrich_campaigns(ad_account_id: str, campaign_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Записи обогащения для нужных кампаний (обычно — из инсайтов за период).
+    Кампании, которых нет в /campaigns (удалённые/архивные), добиваем пакетными
+    запросами по одной кампании (fetch_*_batch); статус у них остаётся пустым.
+    """
+    ids: List[str] = [cid for cid in dict.fromkeys(campaign_ids) if cid]
+    records = fetch_campaign_enrichment(ad_account_id, ids) if ids else {}
+
+    missing = [cid for cid in ids if cid not in records]
+    if missing:
+        try:
+            budgets = fetch_adsets_daily_budgets_batch(missing)
+            creatives = fetch_creative_links_batch(missing)
+        except Exception as e:
+            # batch целиком не прошёл — по одной кампании, параллельно и с изоляцией ошибок
+            print(f"⚠️ Batch-обогащение не удалось ({type(e).__name__}: {e}), иду по кампаниям")
+            records.update(enrich_each(missing))
+            return records
+        for cid in missing:
+            rec = _empty_record(cid)
+            rec["adset_budgets"] = budgets.get(cid) or []
+            rec["ad_id"] = (creatives.get(cid) or {}).get("ad_id")
+            rec["creative_link"] = (creatives.get(cid) or {}).get("link")
+            records[cid] = rec
+    return records
+
+# =====================================================================
+#            ПАРАЛЛЕЛЬНОЕ ОБОГАЩЕНИЕ ПО ОДНОЙ КАМПАНИИ
+# =====================================================================
+
+def enrich_one(campaign_id: str) -> Dict[str, Any]:
+    """Запись обогащения одной кампании обычными (не пакетными) вызовами."""
+    rec = _empty_record(campaign_id)
+    rec["adset_budgets"] = fetch_adsets_daily_budgets(campaign_id)
+    rec["ad_id"] = fetch_any_ad_id_of_campaign(campaign_id)
+    if rec["ad_id"]:
+        rec["creative_link"] = get_best_creative_link_for_ad(rec["ad_id"])
+    return rec
+
+def enrich_each(
+    campaign_ids: Iterable[str],
+    concurrency: int = FB_REPORT_CONCURRENCY,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    enrich_one для многих кампаний в пуле из concurrency потоков (лимит на отчёт;
+    общий потолок запросов процесса держит fb_client). Ошибка одной кампании
+    не роняет остальные — для неё вернётся пустая запись.
+    """
+    ids: List[str] = [cid for cid in dict.fromkeys(campaign_ids) if cid]
+    records: Dict[str, Dict[str, Any]] = {}
+    for cid, (rec, err) in zip(ids, run_bounded(enrich_one, ids, concurrency)):
+        if err is not None:
+            print(f"⚠️ Обогащение кампании {cid} не удалось: {type(err).__name__}: {err}")
+            rec = _empty_record(cid)
+        records[cid] = rec
+    return records
+
+__all__ = [
+    "fetch_campaign_enrichment",
+    "enrich_campaigns",
+    "enrich_one",
+    "enrich_each",
+]
@@ -1,18 +1,154 @@
 # fb/fb_client.py
-import requests
 import json
-from typing import Dict, Any
-from config import FB_API_VERSION, FB_ACCESS_TOKEN
+import random
+import re
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    FB_GRAPH_URL,
+    FB_API_VERSION,
+    FB_ACCESS_TOKEN,
+    FB_POOL_SIZE,
+    FB_TIMEOUT,
+    FB_MAX_RETRIES,
+    FB_BACKOFF_BASE,
+    FB_BACKOFF_MAX,
+    FB_PAGE_SIZE,
+    FB_REPORT_CONCURRENCY,
+)
+from utils import run_bounded
+from .cache import get_cache, cache_key, ttl_for
+from .rate_limiter import LIMITER, account_from_path
+
+BASE_URL = f"{FB_GRAPH_URL}/{FB_API_VERSION}"
+
+# Коды ошибок Graph API, означающие троттлинг (повторяем с паузой):
+#   4 — app limit, 17 — user limit, 32 — page limit, 613 — custom rate limit
+THROTTLE_CODES = {4, 17, 32, 613}
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                         ОБЩАЯ СЕССИЯ (keep-alive пул)
+# ──────────────────────────────────────────────────────────────────────────────
 
-BASE_URL = f"https://graph.facebook.com/{FB_API_VERSION}"
+_SESSION: requests.Session | None = None
+_SESSION_LOCK = threading.Lock()
 
-def get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+
+def get_session() -> requests.Session:
     """
-    GET к Graph API. Добавляет access_token.
-    Нормализует time_range (dict -> JSON string), если он передан.
-    В случае ошибки печатает понятное тело ответа.
+    Одна requests.Session на процесс: keep-alive соединения к graph.facebook.com
+    переиспользуются между вызовами и потоками (размер пула — FB_POOL_SIZE).
     """
-    url = f"{BASE_URL}/{path.lstrip('/')}"
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=FB_POOL_SIZE, pool_maxsize=FB_POOL_SIZE)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _SESSION = s
+    return _SESSION
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                              ПОВТОРЫ / BACKOFF
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _error_code(r: requests.Response) -> int | None:
+    """Достаёт error.code из тела ответа Graph (если оно есть)."""
+    try:
+        return int(((r.json() or {}).get("error") or {}).get("code"))
+    except Exception:
+        return None
+
+
+def _is_throttled(r: requests.Response) -> bool:
+    """429 или троттлинг-коды 4/17/32/613 — Graph запрос не выполнял."""
+    return r.status_code == 429 or (r.status_code >= 400 and _error_code(r) in THROTTLE_CODES)
+
+
+def _is_retryable(r: requests.Response, method: str = "GET") -> bool:
+    """
+    GET: 5xx и троттлинг — повторяем; остальное — сразу ошибка.
+    POST (создание async-отчёта, Batch API) — только троттлинг: после 5xx запрос
+    мог выполниться на стороне Graph, и повтор создал бы дубль.
+    """
+    if method == "GET" and r.status_code >= 500:
+        return True
+    return _is_throttled(r)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Экспоненциальная пауза с full jitter: random(0, min(max, base * 2^attempt))."""
+    return random.uniform(0, min(FB_BACKOFF_MAX, FB_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _raise_for_response(r: requests.Response, url: str, params: Dict[str, Any]):
+    try:
+        detail = r.json()
+    except Exception:
+        detail = r.text
+    safe_params = {k: v for k, v in params.items() if k != "access_token"}
+    raise requests.HTTPError(
+        f"{r.status_code} {r.reason} for URL: {url}\n"
+        f"Params={safe_params}\n"
+        f"Response={detail}",
+        response=r,
+    )
+
+
+def _send(method: str, url: str, params: Dict[str, Any], retries: int | None = None) -> requests.Response:
+    """
+    Отправляет запрос через общую сессию с повторами:
+      - 429, коды 4/17/32/613 → пауза и повтор
+      - только GET: 5xx, обрыв/сброс соединения, таймаут → пауза и повтор
+        (POST после таймаута мог выполниться — не повторяем)
+    После retries (по умолчанию FB_MAX_RETRIES) повторов возвращает последний ответ
+    (или бросает ошибку сети); retries=0 — одна попытка.
+    """
+    max_retries = FB_MAX_RETRIES if retries is None else retries
+    session = get_session()
+    account = account_from_path(urlsplit(url).path)
+    attempt = 0
+    while True:
+        try:
+            # общий лимитер: потолок параллельности + паузы по заголовкам usage
+            with LIMITER.slot(account):
+                if method == "GET":
+                    r = session.get(url, params=params, timeout=FB_TIMEOUT)
+                else:
+                    r = session.request(method, url, data=params, timeout=FB_TIMEOUT)
+            LIMITER.observe(account, r.headers)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if method != "GET" or attempt >= max_retries:
+                raise
+            delay = _backoff_delay(attempt)
+            print(f"⚠️ FB {type(e).__name__}, повтор через {delay:.1f}s ({attempt + 1}/{max_retries})")
+        else:
+            if _is_throttled(r):   # и голый 429 без кода Graph
+                LIMITER.observe_throttle(account)
+            if not _is_retryable(r, method) or attempt >= max_retries:
+                return r
+            delay = _backoff_delay(attempt)
+            print(f"⚠️ FB {r.status_code} (code={_error_code(r)}), повтор через {delay:.1f}s "
+                  f"({attempt + 1}/{max_retries})")
+        time.sleep(delay)
+        attempt += 1
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                                   GET
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Добавляет access_token и приводит time_range к JSON-строке."""
     p = dict(params or {})
     p["access_token"] = FB_ACCESS_TOKEN
 
@@ -27,21 +163,264 @@ def get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
         if "time_range[until]" in p: tr["until"] = p.pop("time_range[until]")
         if tr:
             p["time_range"] = json.dumps(tr, separators=(",", ":"))
+    return p
 
-    r = requests.get(url, params=p, timeout=60)
+
+def get(
+    path: str,
+    params: Dict[str, Any],
+    use_cache: bool = True,
+    retries: int | None = None,
+) -> Dict[str, Any]:
+    """
+    GET к Graph API. Добавляет access_token.
+    Нормализует time_range (dict -> JSON string), если он передан.
+    Повторяет запрос при 5xx/троттлинге/сбросе соединения (см. _send; retries — сколько раз).
+    Успешные ответы кладёт в локальный кэш (fb/cache.py) с TTL по эндпоинту.
+    В случае ошибки печатает понятное тело ответа.
+    """
+    url = f"{BASE_URL}/{path.lstrip('/')}"
+    p = _normalize_params(params)
+
+    cache = get_cache() if use_cache else None
+    ttl = ttl_for(path, p) if cache else 0
+    key = cache_key(path, p) if ttl > 0 else None
+    if key:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    r = _send("GET", url, p, retries=retries)
 
     if r.status_code >= 400:
-        try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        raise requests.HTTPError(
-            f"{r.status_code} {r.reason} for URL: {url}\n"
-            f"Params={p}\n"
-            f"Response={detail}"
-        )
+        _raise_for_response(r, url, p)
+
+    try:
+        data = r.json()
+    except Exception:
+        return {"raw": r.text}
+    if key:
+        cache.put(key, path, data, ttl)
+    return data
+
+
+def post(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """POST к Graph API (form-data); повторяется только при троттлинге (см. _send)."""
+    url = f"{BASE_URL}/{path.lstrip('/')}"
+    p = _normalize_params(params)
+
+    r = _send("POST", url, p)
+
+    if r.status_code >= 400:
+        _raise_for_response(r, url, p)
 
     try:
         return r.json()
     except Exception:
         return {"raw": r.text}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                         ПАГИНАЦИЯ (курсоры Graph API)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def iter_pages(
+    path: str,
+    params: Dict[str, Any],
+    page_size: int | None = None,
+    first_retries: int | None = None,
+    use_cache: bool = True,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Постранично обходит edge Graph API по курсорам (paging.cursors.after),
+    отдавая список строк `data` каждой страницы. Память — одна страница.
+    page_size (limit) по умолчанию — FB_PAGE_SIZE.
+    first_retries — повторов для первой страницы (0 — сразу отдать ошибку вызывающему).
+    use_cache=False — страницы мимо кэша ответов (одноразовые edge, напр. результат async-отчёта).
+    """
+    p = dict(params or {})
+    p["limit"] = page_size or p.get("limit") or FB_PAGE_SIZE
+    retries = first_retries
+    while True:
+        resp = get(path, p, use_cache=use_cache, retries=retries)
+        retries = None
+        yield resp.get("data", []) or []
+
+        paging = resp.get("paging") or {}
+        after = (paging.get("cursors") or {}).get("after")
+        if not paging.get("next") or not after:
+            return
+        p["after"] = after
+
+
+def iter_rows(
+    path: str, params: Dict[str, Any], page_size: int | None = None, use_cache: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """Те же страницы, что и iter_pages, но построчно."""
+    for page in iter_pages(path, params, page_size=page_size, use_cache=use_cache):
+        yield from page
+
+
+def get_all(path: str, params: Dict[str, Any], page_size: int | None = None) -> List[Dict[str, Any]]:
+    """Собирает все страницы в один список (для небольших edge)."""
+    return list(iter_rows(path, params, page_size=page_size))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                     BATCH API (до 50 под-запросов за POST)
+# ──────────────────────────────────────────────────────────────────────────────
+
+BATCH_LIMIT = 50
+
+# Ссылка на результат другого под-запроса: {result=<name>:$.data.*.id}
+_RESULT_REF_RE = re.compile(r"\{result=([^:}]+):")
+
+
+def batch_op(
+    path: str,
+    params: Dict[str, Any] | None = None,
+    name: str | None = None,
+    raw_query: str = "",
+) -> Dict[str, Any]:
+    """
+    Описание одного под-запроса для batch().
+    params кодируются как обычно; raw_query добавляется в query как есть —
+    туда кладём JSONPath-ссылки ({result=name:$.data.*.id}), их нельзя экранировать.
+    Именованные под-запросы всегда возвращают тело (omit_response_on_success=false).
+    """
+    p = {k: v for k, v in _normalize_params(params).items() if k != "access_token"}
+    query = "&".join(q for q in (raw_query, urlencode(p)) if q)
+    op: Dict[str, Any] = {
+        "method": "GET",
+        "relative_url": f"{path.lstrip('/')}" + (f"?{query}" if query else ""),
+    }
+    if name:
+        op["name"] = name
+        op["omit_response_on_success"] = False
+    return op
+
+
+def _batch_groups(ops: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Разбивает под-запросы на группы, которые нельзя разносить по разным POST:
+    под-запрос и все, на чьи результаты он ссылается, должны ехать в одном batch.
+    """
+    parent = list(range(len(ops)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    by_name = {op["name"]: i for i, op in enumerate(ops) if op.get("name")}
+    for i, op in enumerate(ops):
+        for ref in _RESULT_REF_RE.findall(op.get("relative_url", "")):
+            if ref in by_name:
+                parent[find(i)] = find(by_name[ref])
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(ops)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def _pack_chunks(groups: List[List[int]]) -> List[List[int]]:
+    """Жадно укладывает группы в чанки по BATCH_LIMIT под-запросов."""
+    chunks: List[List[int]] = []
+    cur: List[int] = []
+    for g in groups:
+        if len(g) > BATCH_LIMIT:
+            raise ValueError(f"Группа зависимых под-запросов больше {BATCH_LIMIT}: {len(g)}")
+        if len(cur) + len(g) > BATCH_LIMIT:
+            chunks.append(cur)
+            cur = []
+        cur.extend(g)
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def _parse_batch_item(item: Dict[str, Any] | None) -> Optional[Dict[str, Any]]:
+    """Тело ответа под-запроса: dict при 2xx, {'error': ...} при ошибке, None если FB не выполнил."""
+    if item is None:
+        return None
+    try:
+        body = json.loads(item.get("body") or "null")
+    except Exception:
+        body = {"raw": item.get("body")}
+    if int(item.get("code") or 0) >= 400:
+        err = (body or {}).get("error") if isinstance(body, dict) else None
+        return {"error": err or {"code": item.get("code"), "message": str(body)}}
+    return body if isinstance(body, dict) else {"data": body}
+
+
+def _cached_op(cache, op: Dict[str, Any]):
+    """
+    Для кэшируемого под-запроса (без имени и JSONPath-ссылок, TTL > 0)
+    вернёт (key, ttl, path, hit), иначе None.
+    """
+    rel = op.get("relative_url", "")
+    if op.get("name") or _RESULT_REF_RE.search(rel):
+        return None
+    parts = urlsplit(rel)
+    params = dict(parse_qsl(parts.query, keep_blank_values=True))
+    ttl = ttl_for(parts.path, params)
+    if ttl <= 0:
+        return None
+    key = cache_key(parts.path, params)
+    return key, ttl, parts.path, cache.get(key)
+
+
+def batch(ops: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Выполняет под-запросы (см. batch_op) через Graph Batch API: по BATCH_LIMIT за один POST,
+    не разрывая зависимые группы. Возвращает результаты в порядке ops:
+      - dict тела ответа при успехе,
+      - {"error": {...}} при ошибке под-запроса,
+      - None, если FB не успел выполнить под-запрос (после одного повтора).
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(ops)
+
+    # Независимые под-запросы сначала ищем в кэше — в batch уходят только промахи
+    cache = get_cache()
+    keys: Dict[int, tuple] = {}
+    if cache:
+        for i, op in enumerate(ops):
+            cached = _cached_op(cache, op)
+            if cached is None:
+                continue
+            key, ttl, path, hit = cached
+            if hit is not None:
+                results[i] = hit
+            else:
+                keys[i] = (key, ttl, path)
+    pending = [i for i in range(len(ops)) if results[i] is None]
+
+    def _post_chunk(payload: List[Dict[str, Any]]) -> List[Any]:
+        resp = post("", {"batch": json.dumps(payload, separators=(",", ":")), "include_headers": "false"})
+        return resp if isinstance(resp, list) else []
+
+    for attempt in range(2):
+        if not pending:
+            break
+        sub = [ops[i] for i in pending]
+        chunks = _pack_chunks(_batch_groups(sub))
+        # POST'ы чанков — параллельно (общий потолок LIMITER соблюдается в _send)
+        outcomes = run_bounded(_post_chunk, [[sub[j] for j in ch] for ch in chunks], FB_REPORT_CONCURRENCY)
+        for chunk, (items, err) in zip(chunks, outcomes):
+            if err is not None:
+                raise err
+            for j, item in zip(chunk, items):
+                results[pending[j]] = _parse_batch_item(item)
+        for i in pending:
+            res = results[i]
+            if i in keys and res is not None and "error" not in res:
+                key, ttl, path = keys[i]
+                cache.put(key, path, res, ttl)
+        # повторяем только невыполненные (null) под-запросы без ссылок на другие
+        pending = [
+            i for i in pending
+            if results[i] is None and not _RESULT_REF_RE.search(ops[i].get("relative_url", ""))
+        ]
+    return results
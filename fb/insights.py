@@ -1,11 +1,25 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, Any, List, Callable, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Callable, Tuple
 from collections import defaultdict
+from itertools import chain
 from datetime import datetime, date
 import datetime as dt
 import json
-
-from .fb_client import get
+import threading
+import time
+
+import requests
+
+from config import (
+    FB_DAILY_STORE_ENABLED,
+    FB_ASYNC_MIN_DAYS,
+    FB_ASYNC_MIN_ROWS,
+    FB_ASYNC_POLL_MIN,
+    FB_ASYNC_POLL_MAX,
+    FB_ASYNC_TIMEOUT,
+)
+from .fb_client import iter_rows, iter_pages, get, post, _is_throttled
+from .daily_store import get_store, day_ranges
 
 # =====================================================================
 #                         ВСПОМОГАТЕЛЬНОЕ
@@ -46,9 +60,35 @@ def _sanitize_time_range(since: str, until: str) -> Dict[str, str]:
 #                         ЗАПРОСЫ К FACEBOOK API
 # =====================================================================
 
-def fetch_campaign_insights(ad_account_id: str, since: str, until: str) -> List[Dict[str, Any]]:
+INSIGHT_FIELDS = [
+    "campaign_id",
+    "campaign_name",
+    "objective",
+    "spend",
+    "impressions",
+    "reach",
+    "clicks",
+    "actions",
+]
+
+def iter_campaign_insights(
+    ad_account_id: str,
+    since: str,
+    until: str,
+    page_size: int | None = None,
+    daily: bool = False,
+    fields: List[str] | None = None,
+    async_mode: bool | None = None,
+) -> Iterator[Dict[str, Any]]:
     """
-    Возвращает сырые инсайты по кампаниям за период [since..until], формат дат 'YYYY-MM-DD'.
+    Потоково отдаёт сырые инсайты по кампаниям за период [since..until], формат дат 'YYYY-MM-DD'.
+    Страницы подгружаются по курсорам (paging), размер страницы — page_size / FB_PAGE_SIZE.
+    daily=True — по строке на кампанию за каждый день (time_increment=1).
+    async_mode: True — асинхронный отчёт (report run), False — синхронный GET,
+    None — выбрать автоматически (см. _should_use_async). Первая синхронная страница
+    запрашивается без повторов: таймаут / «слишком много данных» — сразу переключаемся
+    на async, прочие 4xx (параметры, токен, права) — ошибка вызывающему, сбой сети /
+    5xx / троттлинг — обычный синхронный запрос с повторами.
     ВАЖНО: time_range сериализуем в JSON-строку — так избегаем 400 ('time_range must be non-empty').
     """
     account = _sanitize_account_id(ad_account_id)
@@ -57,42 +97,280 @@ def fetch_campaign_insights(ad_account_id: str, since: str, until: str) -> List[
     params = {
         "level": "campaign",
         "time_range": json.dumps(time_range, separators=(",", ":")),
-        "fields": ",".join([
-            "campaign_id",
-            "campaign_name",
-            "objective",
-            "spend",
-            "impressions",
-            "reach",
-            "clicks",
-            "actions",
-        ]),
-        "limit": 5000,
+        "fields": ",".join(fields or INSIGHT_FIELDS),
+    }
+    if daily:
+        params["time_increment"] = 1
+
+    if async_mode is None:
+        async_mode = _should_use_async(account, time_range, daily)
+
+    if async_mode:
+        rows = iter_async_insights(account, params, page_size=page_size)
+    else:
+        path = f"/{account}/insights"
+        pages = iter_pages(path, params, page_size=page_size, first_retries=0)
+        try:
+            first = next(pages, [])
+        except requests.RequestException as e:
+            if _is_too_much_data(e):
+                print(f"⚠️ Синхронные инсайты {account} не прошли ({type(e).__name__}), перехожу на async-отчёт")
+                rows = iter_async_insights(account, params, page_size=page_size)
+            elif _is_client_error(e):
+                raise   # кривые параметры/токен — ни повтор, ни async-отчёт не помогут
+            else:
+                # сбой сети / 5xx / троттлинг — как обычно, с повторами
+                pages = iter_pages(path, params, page_size=page_size)
+                first = next(pages, [])
+                rows = chain(first, chain.from_iterable(pages))
+        else:
+            rows = chain(first, chain.from_iterable(pages))
+
+    seen: set = set()
+    for r in rows:
+        seen.add(r.get("campaign_id"))
+        yield r
+
+    with _SIZE_LOCK:
+        _CAMPAIGNS_HINT[account] = max(len(seen - {None}), _CAMPAIGNS_HINT.get(account, 0))
+
+# =====================================================================
+#                  АСИНХРОННЫЕ ОТЧЁТЫ (report runs)
+# =====================================================================
+
+# account -> сколько кампаний было в последней выгрузке (оценка размера для авто-async)
+_CAMPAIGNS_HINT: Dict[str, int] = {}
+_SIZE_LOCK = threading.Lock()
+
+ASYNC_DONE = "Job Completed"
+ASYNC_FAILED = {"Job Failed", "Job Skipped"}
+
+def _should_use_async(account: str, time_range: Dict[str, str], daily: bool) -> bool:
+    """
+    Async, если период длиннее FB_ASYNC_MIN_DAYS или ожидаемое число строк
+    (кампаний из прошлых выгрузок × дней при daily) не меньше FB_ASYNC_MIN_ROWS.
+    """
+    days = (_to_date(time_range["until"]) - _to_date(time_range["since"])).days + 1
+    if days >= FB_ASYNC_MIN_DAYS:
+        return True
+    with _SIZE_LOCK:
+        campaigns = _CAMPAIGNS_HINT.get(account, 0)
+    return campaigns * (days if daily else 1) >= FB_ASYNC_MIN_ROWS
+
+def _is_too_much_data(e: Exception) -> bool:
+    """
+    Таймаут или ответ Graph «Please reduce the amount of data» (subcode 1487534 или
+    текст сообщения). Голый code 1 («unknown error») — не признак объёма.
+    """
+    if isinstance(e, requests.Timeout):
+        return True
+    resp = getattr(e, "response", None)
+    try:
+        err = (resp.json() or {}).get("error") or {}
+    except Exception:
+        err = {}
+    msg = str(err.get("message", "")).lower()
+    return err.get("error_subcode") == 1487534 or "reduce the amount of data" in msg
+
+def _is_client_error(e: Exception) -> bool:
+    """Ответ 4xx, который не троттлинг: повторять бессмысленно."""
+    resp = getattr(e, "response", None)
+    return resp is not None and 400 <= resp.status_code < 500 and not _is_throttled(resp)
+
+def start_insights_job(ad_account_id: str, params: Dict[str, Any]) -> str:
+    """Создаёт асинхронный отчёт (POST /act_X/insights) и возвращает report_run_id."""
+    account = _sanitize_account_id(ad_account_id)
+    resp = post(f"/{account}/insights", params)
+    run_id = resp.get("report_run_id")
+    if not run_id:
+        raise RuntimeError(f"Graph не вернул report_run_id для {account}: {resp}")
+    return str(run_id)
+
+def wait_insights_job(report_run_id: str, timeout: float = FB_ASYNC_TIMEOUT) -> None:
+    """
+    Опрашивает async_status с растущей паузой (FB_ASYNC_POLL_MIN → FB_ASYNC_POLL_MAX),
+    пока отчёт не готов. Падение/пропуск задания или таймаут — RuntimeError.
+    """
+    deadline = time.monotonic() + timeout
+    delay = FB_ASYNC_POLL_MIN
+    while True:
+        st = get(report_run_id, {"fields": "async_status,async_percent_completion"}, use_cache=False)
+        status = st.get("async_status", "")
+        if status == ASYNC_DONE and int(st.get("async_percent_completion") or 0) >= 100:
+            return
+        if status in ASYNC_FAILED:
+            raise RuntimeError(f"Async-отчёт {report_run_id}: {status}")
+        if time.monotonic() + delay > deadline:
+            raise RuntimeError(f"Async-отчёт {report_run_id} не готов за {timeout:.0f}s ({status})")
+        time.sleep(delay)
+        delay = min(FB_ASYNC_POLL_MAX, delay * 1.5)
+
+def iter_async_insights(
+    ad_account_id: str, params: Dict[str, Any], page_size: int | None = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Создать async-отчёт, дождаться и построчно отдать результат (постранично).
+    report_run_id одноразовый — страницы результата мимо кэша ответов.
+    """
+    run_id = start_insights_job(ad_account_id, params)
+    wait_insights_job(run_id)
+    yield from iter_rows(f"{run_id}/insights", {}, page_size=page_size, use_cache=False)
+
+# =====================================================================
+#              ДНЕВНОЕ ХРАНИЛИЩЕ + ЛОКАЛЬНАЯ АГРЕГАЦИЯ
+# =====================================================================
+
+def sync_daily_store(ad_account_id: str, since: str, until: str) -> int:
+    """
+    Догружает в fb/daily_store только недостающие/ещё изменяемые дни периода
+    (одним запросом на каждый непрерывный отрезок). Возвращает число загруженных дней.
+    """
+    account = _sanitize_account_id(ad_account_id)
+    tr = _sanitize_time_range(since, until)
+    s, u = _to_date(tr["since"]), _to_date(tr["until"])
+
+    store = get_store()
+    stale = store.stale_days(account, s, u)
+    for a, b in day_ranges(stale):
+        rows = list(iter_campaign_insights(account, a.isoformat(), b.isoformat(), daily=True))
+        store.replace_days(account, a, b, rows)
+    return len(stale)
+
+def aggregate_daily_rows(daily_rows: Iterable[Dict[str, Any]], since: str, until: str) -> List[Dict[str, Any]]:
+    """
+    Сворачивает дневные строки в строки «кампания за период» того же вида, что отдаёт Graph:
+    spend/impressions/clicks и actions суммируются, имя/objective — из последнего дня.
+    reach здесь НЕ суммируется (уникальный охват не аддитивен) — его добавляет вызывающий.
+    """
+    by_campaign: Dict[str, Dict[str, Any]] = {}
+    for r in daily_rows:
+        cid = r.get("campaign_id") or ""
+        agg = by_campaign.get(cid)
+        if agg is None:
+            agg = by_campaign[cid] = {
+                "campaign_id": cid, "spend": 0.0, "impressions": 0, "clicks": 0,
+                "_actions": defaultdict(float),
+            }
+        agg["campaign_name"] = r.get("campaign_name") or agg.get("campaign_name", "")
+        agg["objective"] = r.get("objective") or agg.get("objective", "")
+        for key, cast in (("spend", float), ("impressions", int), ("clicks", int)):
+            try:
+                agg[key] += cast(float(r.get(key) or 0))
+            except Exception:
+                pass
+        for a in r.get("actions", []) or []:
+            try:
+                agg["_actions"][a.get("action_type")] += float(a.get("value", 0) or 0)
+            except Exception:
+                pass
+
+    out = []
+    for agg in by_campaign.values():
+        acts = agg.pop("_actions")
+        agg["spend"] = round(agg["spend"], 2)
+        agg["actions"] = [{"action_type": k, "value": v} for k, v in acts.items()]
+        agg["date_start"], agg["date_stop"] = since, until
+        out.append(agg)
+    return out
+
+def _fetch_period_reach(ad_account_id: str, since: str, until: str) -> Dict[str, Any]:
+    """Уникальный охват по кампаниям за период — лёгкий агрегированный запрос (только reach)."""
+    return {
+        r.get("campaign_id"): r.get("reach")
+        for r in iter_campaign_insights(ad_account_id, since, until, fields=["campaign_id", "reach"])
     }
-    data = get(f"/{account}/insights", params)
-    return data.get("data", [])
+
+def fetch_campaign_insights_from_store(ad_account_id: str, since: str, until: str) -> List[Dict[str, Any]]:
+    """Инсайты за период, собранные из дневного хранилища (с догрузкой недостающих дней)."""
+    account = _sanitize_account_id(ad_account_id)
+    tr = _sanitize_time_range(since, until)
+    sync_daily_store(account, tr["since"], tr["until"])
+
+    rows = aggregate_daily_rows(
+        get_store().rows(account, _to_date(tr["since"]), _to_date(tr["until"])),
+        tr["since"], tr["until"],
+    )
+    reach = _fetch_period_reach(account, tr["since"], tr["until"]) if rows else {}
+    for r in rows:
+        r["reach"] = reach.get(r["campaign_id"], 0)
+    return rows
+
+def fetch_campaign_insights(
+    ad_account_id: str, since: str, until: str, use_store: bool = FB_DAILY_STORE_ENABLED
+) -> List[Dict[str, Any]]:
+    """
+    Все инсайты по кампаниям за период.
+    use_store=True — через дневное хранилище (догружаются только недостающие дни),
+    иначе — один агрегированный запрос к Graph (см. iter_campaign_insights).
+    """
+    if use_store:
+        return fetch_campaign_insights_from_store(ad_account_id, since, until)
+    return list(iter_campaign_insights(ad_account_id, since, until))
 
 def fetch_campaign_statuses(ad_account_id: str) -> Dict[str, str]:
     """Карта id кампании -> effective_status."""
     account = _sanitize_account_id(ad_account_id)
     fields = "id,name,status,effective_status"
-    data = get(f"/{account}/campaigns", {"fields": fields, "limit": 5000})
-    return {c["id"]: c.get("effective_status", "") for c in data.get("data", [])}
+    return {
+        c["id"]: c.get("effective_status", "")
+        for c in iter_rows(f"/{account}/campaigns", {"fields": fields})
+    }
 
 # =====================================================================
 #                         ПАРСИНГ ДЕЙСТВИЙ / МЕТРИК
 # =====================================================================
 
-def extract_action(actions: List[Dict[str, Any]], action_type: str) -> float:
-    """Ищет action по типу и возвращает value как float."""
+# Ключ, под которым в строке инсайтов кэшируется разобранная запись (см. parse_row)
+PARSED_KEY = "_parsed"
+
+def _num(x) -> float:
+    try:
+        return float(x or 0)
+    except Exception:
+        return 0.0
+
+def index_actions(actions: List[Dict[str, Any]]) -> Dict[str, float]:
+    """actions (список от Graph) -> {action_type: value}; при дублях берём первый, как extract_action."""
+    out: Dict[str, float] = {}
+    for a in actions or []:
+        t = a.get("action_type")
+        if t is not None and t not in out:
+            out[t] = _num(a.get("value", 0))
+    return out
+
+def parse_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Разбирает строку инсайтов один раз в компактную запись и кэширует её в row[PARSED_KEY]:
+      {"actions": {action_type: float}, "spend", "reach", "clicks", "impressions": float,
+       "goal": цель по objective, "result": (label, value) — заполняет strict_result_value}
+    Все экстракторы и обе агрегации (общая эффективность, таблица кампаний) работают по ней.
+    """
+    p = row.get(PARSED_KEY)
+    if p is None:
+        p = {
+            "actions": index_actions(row.get("actions", []) or []),
+            "spend": _num(row.get("spend")),
+            "reach": _num(row.get("reach")),
+            "clicks": _num(row.get("clicks")),
+            "impressions": _num(row.get("impressions")),
+            "goal": goal_by_objective(row.get("objective", "")),
+            "result": None,
+        }
+        row[PARSED_KEY] = p
+    return p
+
+def extract_action(actions, action_type: str) -> float:
+    """
+    Ищет action по типу и возвращает value как float.
+    actions — индекс {action_type: value} (см. parse_row) или исходный список от Graph.
+    """
     if not actions:
         return 0.0
+    if isinstance(actions, dict):
+        return actions.get(action_type, 0.0)
     for a in actions:
         if a.get("action_type") == action_type:
-            try:
-                return float(a.get("value", 0) or 0)
-            except Exception:
-                return 0.0
+            return _num(a.get("value", 0))
     return 0.0
 
 # Варианты ключей для переписок (могут отличаться)
@@ -102,7 +380,7 @@ MESSAGING_KEYS = [
     "onsite_conversion.meta_messaging_conversation_started_7d",
 ]
 
-def extract_any_messaging(actions: List[Dict[str, Any]]) -> float:
+def extract_any_messaging(actions) -> float:
     for k in MESSAGING_KEYS:
         v = extract_action(actions, k)
         if v and v > 0:
@@ -111,13 +389,11 @@ def extract_any_messaging(actions: List[Dict[str, Any]]) -> float:
 
 def extract_link_clicks(row: Dict[str, Any]) -> float:
     """Предпочтительно actions['link_click'], иначе fallback на поле 'clicks'."""
-    v = extract_action(row.get("actions", []) or [], "link_click")
+    p = parse_row(row)
+    v = p["actions"].get("link_click", 0.0)
     if v and v > 0:
         return v
-    try:
-        return float(row.get("clicks", 0) or 0)
-    except Exception:
-        return 0.0
+    return p["clicks"]
 
 # Варианты ключей покупок
 PURCHASE_KEYS = [
@@ -127,7 +403,7 @@ PURCHASE_KEYS = [
     "offsite_conversion.purchase",
 ]
 
-def extract_any_purchase(actions: List[Dict[str, Any]]) -> float:
+def extract_any_purchase(actions) -> float:
     for k in PURCHASE_KEYS:
         v = extract_action(actions, k)
         if v and v > 0:
@@ -170,10 +446,17 @@ def strict_result_value(row: Dict[str, Any]) -> Tuple[str, float]:
       - Лиды      → actions['lead']
       - Клики     → actions['link_click'] (fallback: поле 'clicks')
       - Продажи   → purchase-экшены
-    Возвращает (label, value).
+    Возвращает (label, value). Результат кэшируется в разобранной записи строки,
+    поэтому повторные вызовы (общая эффективность + таблица кампаний) бесплатны.
     """
-    actions = row.get("actions", []) or []
-    label = goal_by_objective(row.get("objective", ""))
+    p = parse_row(row)
+    if p["result"] is None:
+        p["result"] = _strict_result(p)
+    return p["result"]
+
+def _strict_result(p: Dict[str, Any]) -> Tuple[str, float]:
+    actions = p["actions"]
+    label = p["goal"]
 
     if label == "Переписки":
         return label, extract_action(actions, ACTION_FOR_GOAL["Переписки"])
@@ -184,10 +467,7 @@ def strict_result_value(row: Dict[str, Any]) -> Tuple[str, float]:
     if label == "Клики":
         v = extract_action(actions, ACTION_FOR_GOAL["Клики"])
         if not v or v == 0:
-            try:
-                v = float(row.get("clicks", 0) or 0)
-            except Exception:
-                v = 0.0
+            v = p["clicks"]
         return label, v
 
     if label == "Продажи":
@@ -220,10 +500,7 @@ def build_overall_effectiveness_from_fb(
     total_spend = 0.0
 
     for r in rows:
-        try:
-            total_spend += float(r.get("spend") or 0)
-        except Exception:
-            pass
+        total_spend += parse_row(r)["spend"]
 
         if chooser:
             label, value = chooser(r)
@@ -248,9 +525,18 @@ def build_overall_effectiveness_from_fb(
 
 __all__ = [
     # API
+    "iter_campaign_insights",
     "fetch_campaign_insights",
+    "fetch_campaign_insights_from_store",
+    "sync_daily_store",
+    "aggregate_daily_rows",
     "fetch_campaign_statuses",
+    "start_insights_job",
+    "wait_insights_job",
+    "iter_async_insights",
     # parsers
+    "parse_row",
+    "index_actions",
     "extract_action",
     "extract_any_messaging",
     "extract_link_clicks",
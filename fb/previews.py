@@ -1,6 +1,9 @@
 import re
-from typing import Optional
-from .fb_client import get
+from typing import Dict, List, Optional
+from .fb_client import get, batch, batch_op
+
+CREATIVE_FIELDS = "instagram_permalink_url,object_story_id,effective_object_story_id,thumbnail_url"
+PREVIEW_FORMAT = "DESKTOP_FEED_STANDARD"
 
 def fetch_any_ad_id_of_campaign(campaign_id: str) -> Optional[str]:
     """Берём любой ad внутри кампании (для MVP этого достаточно)."""
@@ -11,6 +14,18 @@ def fetch_any_ad_id_of_campaign(campaign_id: str) -> Optional[str]:
             return ads[0]["id"]
     return None
 
+def _link_from_preview_html(items) -> Optional[str]:
+    """Первая https-ссылка из html превью объявления."""
+    if items:
+        html = items[0].get("body") or items[0].get("html") or items[0].get("html_rendered") or ""
+        m = re.search(r'https://[^\s"<>]+', html)
+        if m:
+            return m.group(0)
+    return None
+
+def ads_library_link(ad_id: str) -> str:
+    return f"https://www.facebook.com/ads/library/?id={ad_id}"
+
 def get_best_creative_link_for_ad(ad_id: str) -> Optional[str]:
     """
     Пытаемся вернуть устойчивую публичную ссылку на креатив:
@@ -22,7 +37,7 @@ def get_best_creative_link_for_ad(ad_id: str) -> Optional[str]:
     # 1) поля креатива
     try:
         ad = get(f"{ad_id}", {
-            "fields": "creative{instagram_permalink_url,object_story_id,effective_object_story_id,thumbnail_url}"
+            "fields": f"creative{{{CREATIVE_FIELDS}}}"
         })
         cr = (ad or {}).get("creative", {}) or {}
 
@@ -49,15 +64,129 @@ def get_best_creative_link_for_ad(ad_id: str) -> Optional[str]:
 
     # 2) как совсем последний вариант — html превью
     try:
-        resp = get(f"{ad_id}/previews", {"ad_format": "DESKTOP_FEED_STANDARD"})
-        items = resp.get("data", [])
-        if items:
-            html = items[0].get("body") or items[0].get("html") or items[0].get("html_rendered") or ""
-            m = re.search(r'https://[^\s"<>]+', html)
-            if m:
-                return m.group(0)
+        resp = get(f"{ad_id}/previews", {"ad_format": PREVIEW_FORMAT})
+        link = _link_from_preview_html(resp.get("data", []))
+        if link:
+            return link
     except Exception:
         pass
 
     # 3) фолбэк — Ads Library по ad_id (не всегда откроется, но линк стабильный)
-    return f"https://www.facebook.com/ads/library/?id={ad_id}"
+    return ads_library_link(ad_id)
+
+# ──────────────────────────────────────────────────────────────────────────────
+#                  ПАКЕТНЫЙ ВАРИАНТ (Graph Batch API)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def resolve_creative_links(creatives: Dict[str, Dict]) -> Dict[str, str]:
+    """
+    ad_id -> creative{...} уже на руках; добиваем ссылки по тем же правилам,
+    что и get_best_creative_link_for_ad, но пакетно:
+      1) instagram_permalink_url
+      2) permalink_url постов (один batch на все story id)
+      3) thumbnail_url
+      4) html превью (один batch на оставшиеся ad)
+      5) Ads Library
+    """
+    links: Dict[str, str] = {}
+    story_ids: Dict[str, List[str]] = {}
+    for ad_id, cr in creatives.items():
+        cr = cr or {}
+        if cr.get("instagram_permalink_url"):
+            links[ad_id] = cr["instagram_permalink_url"]
+            continue
+        story_ids[ad_id] = [cr[k] for k in ("object_story_id", "effective_object_story_id") if cr.get(k)]
+
+    # 2) permalink_url постов
+    sids = list(dict.fromkeys(sid for lst in story_ids.values() for sid in lst))
+    permalinks: Dict[str, str] = {}
+    if sids:
+        try:
+            for sid, res in zip(sids, batch([batch_op(sid, {"fields": "permalink_url"}) for sid in sids])):
+                url = (res or {}).get("permalink_url")
+                if url:
+                    permalinks[sid] = url
+        except Exception:
+            pass
+
+    need_preview: List[str] = []
+    for ad_id, lst in story_ids.items():
+        url = next((permalinks[s] for s in lst if s in permalinks), None)
+        thumb = (creatives.get(ad_id) or {}).get("thumbnail_url")
+        if url or thumb:
+            links[ad_id] = url or thumb
+        else:
+            need_preview.append(ad_id)
+
+    # 4) html превью
+    if need_preview:
+        try:
+            ops = [batch_op(f"{ad_id}/previews", {"ad_format": PREVIEW_FORMAT}) for ad_id in need_preview]
+            for ad_id, res in zip(need_preview, batch(ops)):
+                link = _link_from_preview_html((res or {}).get("data", []))
+                if link:
+                    links[ad_id] = link
+        except Exception:
+            pass
+
+    # 5) Ads Library
+    for ad_id in creatives:
+        links.setdefault(ad_id, ads_library_link(ad_id))
+    return links
+
+def fetch_creative_links_batch(campaign_ids: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    Для многих кампаний сразу: {campaign_id: {"ad_id": ..., "link": ...}}.
+    На каждую кампанию — два зависимых под-запроса в одном batch:
+      adsets кампании → ?ids={result=...:$.data.*.id} с первым ad и его creative.
+    Итого вместо ~5 последовательных вызовов на кампанию — несколько POST на весь аккаунт.
+    """
+    ids = [cid for cid in dict.fromkeys(campaign_ids) if cid]
+    ops = []
+    for i, cid in enumerate(ids):
+        name = f"adsets_{i}"
+        ops.append(batch_op(f"{cid}/adsets", {"fields": "id", "limit": 50}, name=name))
+        ops.append(batch_op(
+            "",
+            {"fields": f"ads.limit(1){{id,creative{{{CREATIVE_FIELDS}}}}}"},
+            raw_query=f"ids={{result={name}:$.data.*.id}}",
+        ))
+    results = batch(ops) if ops else []
+
+    ad_by_campaign: Dict[str, Optional[str]] = {}
+    creatives: Dict[str, Dict] = {}
+    for i, cid in enumerate(ids):
+        adsets_res, ads_res = results[2 * i], results[2 * i + 1]
+        ad_by_campaign[cid] = None
+        if not adsets_res or "error" in adsets_res:
+            # под-запрос не отработал — идём старым путём по одной кампании
+            try:
+                ad_by_campaign[cid] = fetch_any_ad_id_of_campaign(cid)
+            except Exception:
+                pass
+            continue
+        ads_res = ads_res if ads_res and "error" not in ads_res else {}
+        # порядок adset'ов — как в ответе /adsets, как и в fetch_any_ad_id_of_campaign
+        for adset in adsets_res.get("data", []) or []:
+            ads = ((ads_res.get(adset.get("id")) or {}).get("ads") or {}).get("data", [])
+            if ads:
+                ad_by_campaign[cid] = ads[0]["id"]
+                creatives[ads[0]["id"]] = ads[0].get("creative") or {}
+                break
+
+    # ad нашли старым путём — creative ещё не загружен
+    missing = [ad for ad in ad_by_campaign.values() if ad and ad not in creatives]
+    if missing:
+        ops = [batch_op(ad, {"fields": f"creative{{{CREATIVE_FIELDS}}}"}) for ad in missing]
+        try:
+            for ad, res in zip(missing, batch(ops)):
+                creatives[ad] = (res or {}).get("creative") or {}
+        except Exception:
+            for ad in missing:
+                creatives[ad] = {}
+
+    links = resolve_creative_links(creatives)
+    return {
+        cid: {"ad_id": ad, "link": links.get(ad) if ad else None}
+        for cid, ad in ad_by_campaign.items()
+    }
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# fb/rate_limiter.py
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Mapping, Optional
+
+from config import (
+    FB_MAX_CONCURRENCY,
+    FB_USAGE_SLOW_PCT,
+    FB_USAGE_PAUSE_PCT,
+    FB_USAGE_MAX_DELAY,
+    FB_USAGE_PAUSE_SEC,
+)
+
+# =====================================================================
+#          ОБЩИЙ ЛИМИТЕР ЗАПРОСОВ К GRAPH (по заголовкам usage)
+# =====================================================================
+
+APP_SCOPE = "app"
+
+_ACCOUNT_RE = re.compile(r"(act_\d+)")
+
+def account_from_path(path: str) -> Optional[str]:
+    """'…/act_123/insights' -> 'act_123' (или None, если в пути нет аккаунта)."""
+    m = _ACCOUNT_RE.search(path or "")
+    return m.group(1) if m else None
+
+def _json_header(headers: Mapping[str, str], name: str) -> Any:
+    raw = headers.get(name)
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+def _pct(d: Dict[str, Any], *keys: str) -> float:
+    vals = []
+    for k in keys:
+        try:
+            vals.append(float(d.get(k) or 0))
+        except Exception:
+            pass
+    return max(vals or [0.0])
+
+class GraphRateLimiter:
+    """
+    Процессный адаптивный лимитер для Graph API.
+      - Потолок одновременных запросов (FB_MAX_CONCURRENCY) — общий для всех потоков/отчётов.
+      - Читает X-App-Usage, X-Ad-Account-Usage, X-Business-Use-Case-Usage и хранит
+        загрузку по скоупам: 'app' и 'act_<id>'.
+      - От FB_USAGE_SLOW_PCT% — притормаживает (пауза растёт до FB_USAGE_MAX_DELAY),
+        от FB_USAGE_PAUSE_PCT% — ставит скоуп на паузу; estimated_time_to_regain_access
+        и reset_time_duration имеют приоритет над дефолтной паузой.
+    """
+
+    def __init__(self, max_concurrency: int = FB_MAX_CONCURRENCY):
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._usage: Dict[str, float] = {}          # scope -> % загрузки
+        self._blocked_until: Dict[str, float] = {}  # scope -> time.time()
+        self._business_account: Dict[str, str] = {}  # business id -> последний act_ этого бизнеса
+
+    # ── ожидание перед запросом ───────────────────────────────────────────────
+    def _delay_locked(self, scope: str, now: float) -> float:
+        blocked = self._blocked_until.get(scope, 0.0) - now
+        if blocked > 0:
+            return blocked
+        u = self._usage.get(scope, 0.0)
+        if u >= FB_USAGE_PAUSE_PCT:
+            return FB_USAGE_PAUSE_SEC
+        if u >= FB_USAGE_SLOW_PCT:
+            span = max(FB_USAGE_PAUSE_PCT - FB_USAGE_SLOW_PCT, 1.0)
+            return FB_USAGE_MAX_DELAY * (u - FB_USAGE_SLOW_PCT) / span
+        return 0.0
+
+    def delay_for(self, account: Optional[str]) -> float:
+        """Сколько секунд подождать перед запросом (максимум по app и аккаунту)."""
+        now = time.time()
+        with self._lock:
+            d = self._delay_locked(APP_SCOPE, now)
+            if account:
+                d = max(d, self._delay_locked(account, now))
+        return d
+
+    def wait(self, account: Optional[str]) -> None:
+        d = self.delay_for(account)
+        if d > 0:
+            print(f"⏸ FB usage: пауза {d:.1f}s ({account or APP_SCOPE})")
+            time.sleep(d)
+
+    @contextmanager
+    def slot(self, account: Optional[str] = None):
+        """Дождаться квоты и занять один из общих слотов на время запроса."""
+        self.wait(account)
+        with self._slots:
+            yield
+
+    # ── учёт ответа ───────────────────────────────────────────────────────────
+    def _block_locked(self, scope: str, seconds: float) -> None:
+        until = time.time() + seconds
+        if until > self._blocked_until.get(scope, 0.0):
+            self._blocked_until[scope] = until
+
+    def observe(self, account: Optional[str], headers: Mapping[str, str]) -> None:
+        """Обновить загрузку по заголовкам usage из ответа Graph."""
+        app = _json_header(headers, "X-App-Usage")
+        acc = _json_header(headers, "X-Ad-Account-Usage")
+        buc = _json_header(headers, "X-Business-Use-Case-Usage")
+
+        with self._lock:
+            fresh: Dict[str, float] = {}
+            if isinstance(app, dict):
+                fresh[APP_SCOPE] = _pct(app, "call_count", "total_cputime", "total_time")
+
+            if account and isinstance(acc, dict):
+                fresh[account] = _pct(acc, "acc_id_util_pct")
+                reset = _pct(acc, "reset_time_duration")
+                if fresh[account] >= 100 and reset > 0:
+                    self._block_locked(account, reset)
+
+            if isinstance(buc, dict):
+                for business_id, entries in buc.items():
+                    if account:
+                        self._business_account[business_id] = account
+                    scope = account or self._business_account.get(business_id)
+                    for e in entries or []:
+                        pct = _pct(e, "call_count", "total_cputime", "total_time")
+                        eta_min = _pct(e, "estimated_time_to_regain_access")
+                        if scope:
+                            fresh[scope] = max(pct, fresh.get(scope, 0.0))
+                        if eta_min > 0:
+                            # аккаунт не известен — перестраховываемся паузой всего приложения
+                            self._block_locked(scope or APP_SCOPE, eta_min * 60)
+
+            self._usage.update(fresh)
+
+    def observe_throttle(self, account: Optional[str]) -> None:
+        """Graph ответил 429 или кодом троттлинга — ставим скоуп на паузу по умолчанию."""
+        with self._lock:
+            self._block_locked(account or APP_SCOPE, FB_USAGE_PAUSE_SEC)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние: {"usage": {scope: %}, "blocked": {scope: сек паузы}} (бот, /jobs)."""
+        now = time.time()
+        with self._lock:
+            return {
+                "usage": dict(self._usage),
+                "blocked": {k: round(v - now, 1) for k, v in self._blocked_until.items() if v > now},
+            }
+
+# Один лимитер на процесс
+LIMITER = GraphRateLimiter()
@@ -1,58 +1,72 @@
 # report_service.py
 from __future__ import annotations
 
-from typing import Dict, Any, List
+import datetime as dt
+from typing import Dict, Any, List, Optional
 from fb.insights import (
     fetch_campaign_insights,
-    fetch_campaign_statuses,
     strict_result_value,
+    parse_row,
     build_overall_effectiveness_from_fb,
+    PARSED_KEY,
 )
-from sheets.writer import write_monthly_report
+from fb.enrichment import enrich_campaigns
+from fb.budgets import choose_display_daily_budget
+from sheets.writer import write_monthly_report, ensure_period_sheet
+from checkpoint import CheckpointJournal, client_key, FETCHED, ENRICHED, SHEET_CREATED, WRITTEN
+from config import FB_INSIGHTS_MUTABLE_DAYS
 
 
 def _sum_spend(rows: List[Dict[str, Any]]) -> float:
-    s = 0.0
-    for r in rows or []:
-        try:
-            s += float(r.get("spend") or 0)
-        except Exception:
-            pass
-    return s
+    return sum(parse_row(r)["spend"] for r in rows or [])
 
 
-def generate_report(
-    ad_name: str,
-    ad_account_id: str,
-    spreadsheet_id: str,
-    since: str,
-    until: str,
-) -> str:
-    """
-    Генерирует месячный отчёт и возвращает URL таблицы.
-    Даты: YYYY-MM-DD.
-    """
+def _plain_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Строки без закэшированного разбора (PARSED_KEY) — для записи в журнал."""
+    return [{k: v for k, v in r.items() if k != PARSED_KEY} for r in rows or []]
+
+
+def _period_closed(until: str) -> bool:
+    """Период вышел из окна атрибуции FB — его данные из журнала не устарели."""
+    return dt.date.fromisoformat(until) < dt.date.today() - dt.timedelta(days=FB_INSIGHTS_MUTABLE_DAYS)
 
-    print(f"⏳ Формирую отчёт: {ad_name} • {since}..{until}")
-    print(f"   ↳ ad_account_id={ad_account_id} | spreadsheet_id={spreadsheet_id}")
 
-    # 1) Инсайты по кампаниям
+# ── Этапы отчёта ──────────────────────────────────────────────────────────────
+def fetch_stage(ad_account_id: str, since: str, until: str) -> List[Dict[str, Any]]:
+    """1) Инсайты по кампаниям."""
     rows = fetch_campaign_insights(
         ad_account_id=ad_account_id, since=since, until=until
     )
     spend_total = _sum_spend(rows)
     print(f"🔎 FB insights: campaigns={len(rows)} | spend_total={spend_total:.2f}")
+    return rows
 
-    # 2) Статусы кампаний (для сортировки/отображения)
-    status_map = fetch_campaign_statuses(ad_account_id=ad_account_id)
-    print(f"🔎 FB statuses: loaded={len(status_map)}")
 
-    # обогащаем строки статусом
+def enrich_stage(ad_account_id: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """2) Статусы, бюджеты и креативы кампаний — одним вложенным запросом."""
+    enrichment = enrich_campaigns(
+        ad_account_id, [r.get("campaign_id") or r.get("id") for r in rows]
+    )
+    print(f"🔎 FB enrichment: loaded={len(enrichment)}")
+
+    # обогащаем строки статусом, бюджетом и ссылкой на креатив
     for r in rows:
         cid = r.get("campaign_id") or r.get("id") or ""
-        r["effective_status"] = status_map.get(cid, "")
+        rec = enrichment.get(cid) or {}
+        r["effective_status"] = rec.get("effective_status", "")
+        r["daily_budget"] = choose_display_daily_budget(rec.get("adset_budgets") or [])
+        r["preview_link"] = rec.get("creative_link") or ""
+    return rows
+
 
-    # 3) «Общая эффективность» тем же правилом, что и таблица кампаний
+def write_stage(
+    ad_name: str,
+    spreadsheet_id: str,
+    rows: List[Dict[str, Any]],
+    since: str,
+    until: str,
+) -> None:
+    """3) «Общая эффективность» тем же правилом, что и таблица кампаний, и запись в Google Sheet."""
     overall = build_overall_effectiveness_from_fb(
         rows=rows,
         date_from=since,
@@ -65,7 +79,6 @@ def generate_report(
         f"| spend={overall.get('spend', 0)} | period='{overall.get('period')}'"
     )
 
-    # 4) Пишем в Google Sheet
     payload = {"rows": rows, "overall": overall}
     try:
         print(
@@ -85,7 +98,66 @@ def generate_report(
         print(f"❌ Ошибка записи в Google Sheets: {type(e).__name__}: {e}")
         raise
 
-    # 5) Ссылка на файл
+
+def generate_report(
+    ad_name: str,
+    ad_account_id: str,
+    spreadsheet_id: str,
+    since: str,
+    until: str,
+    journal: Optional[CheckpointJournal] = None,
+    run_id: Optional[str] = None,
+) -> str:
+    """
+    Генерирует месячный отчёт и возвращает URL таблицы.
+    Даты: YYYY-MM-DD.
+    С journal/run_id (пакетные прогоны) каждый этап отмечается в журнале
+    (клиент — client_key: аккаунт + файл): пройденные этапы при продолжении прогона
+    пропускаются, их результат берётся из журнала. Данные FB из журнала берутся
+    только за закрытый период — пока он в окне атрибуции, инсайты запрашиваются заново.
+    """
     url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}"
+    print(f"⏳ Формирую отчёт: {ad_name} • {since}..{until}")
+    print(f"   ↳ ad_account_id={ad_account_id} | spreadsheet_id={spreadsheet_id}")
+
+    if journal is None or not run_id:
+        rows = enrich_stage(ad_account_id, fetch_stage(ad_account_id, since, until))
+        write_stage(ad_name, spreadsheet_id, rows, since, until)
+        print(f"✅ Отчёт готов: {ad_name} • {since}..{until}\n{url}")
+        return url
+
+    key = client_key(ad_account_id, spreadsheet_id)
+    done = journal.get(run_id, key, WRITTEN)
+    if done:
+        print(f"⏭ {ad_name}: уже записан в прогоне {run_id}")
+        return done["url"]
+
+    stage = FETCHED
+    try:
+        reuse = _period_closed(until)
+        rows = journal.get(run_id, key, ENRICHED) if reuse else None
+        if rows is None:
+            rows = journal.get(run_id, key, FETCHED) if reuse else None
+            if rows is None:
+                rows = fetch_stage(ad_account_id, since, until)
+                journal.put(run_id, key, FETCHED, _plain_rows(rows))
+            stage = ENRICHED
+            rows = enrich_stage(ad_account_id, rows)
+            journal.put(run_id, key, ENRICHED, _plain_rows(rows))
+        else:
+            print(f"⏭ {ad_name}: данные FB из журнала ({len(rows)} кампаний)")
+
+        stage = SHEET_CREATED
+        if journal.get(run_id, key, SHEET_CREATED) is None:
+            ws = ensure_period_sheet(spreadsheet_id, since, until)
+            journal.put(run_id, key, SHEET_CREATED, {"sheet_id": ws.id, "title": ws.title})
+
+        stage = WRITTEN
+        write_stage(ad_name, spreadsheet_id, rows, since, until)
+        journal.put(run_id, key, WRITTEN, {"url": url})
+    except Exception as e:
+        journal.fail(run_id, key, stage, f"{type(e).__name__}: {e}")
+        raise
+
     print(f"✅ Отчёт готов: {ad_name} • {since}..{until}\n{url}")
     return url
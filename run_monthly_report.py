@@ -3,10 +3,14 @@ import os
 import re
 from dotenv import load_dotenv
 
+import gspread
+
 from sheets.gs_client import get_gs_client
+from sheets import meta_cache, template_manager
 from catalog.master_index import load_clients, find_client_by_name
 
 from sheets.writer import (
+    SheetBatch,
     write_overview_dynamic,
     write_campaign_table,
     insert_gap_after_campaigns,
@@ -14,14 +18,14 @@ from sheets.writer import (
 
 from fb.insights import (
     fetch_campaign_insights,
-    fetch_campaign_statuses,
     strict_result_value,                 # ← используем жёсткий выбор
+    parse_row,
     goal_by_objective,
     build_overall_effectiveness_from_fb,
 )
 
-from fb.budgets import fetch_adsets_daily_budgets, choose_display_daily_budget
-from fb.previews import fetch_any_ad_id_of_campaign, get_best_creative_link_for_ad
+from fb.budgets import choose_display_daily_budget
+from fb.enrichment import enrich_campaigns, enrich_each
 from utils import parse_period_ddmm_dash_ddmm
 from config import FB_ACCESS_TOKEN
 
@@ -33,37 +37,41 @@ load_dotenv()
 
 
 
+def _free_title(period_title: str, existing) -> str:
+    """Имя листа периода, не занятое в existing: 'X', 'X-2', 'X-3', …"""
+    new_title = period_title
+    suffix = 2
+    while new_title in existing:
+        new_title = f"{period_title}-{suffix}"
+        suffix += 1
+    return new_title
+
+
 def _copy_master_template_to_period(
-    gc,
     target_spreadsheet,
     master_spreadsheet_id: str,
     template_sheet_name: str,
     period_title: str,
 ):
-    """Копирует шаблонный лист в файл клиента и переименовывает по периоду."""
-    master = gc.open_by_key(master_spreadsheet_id)
-    tpl_ws = master.worksheet(template_sheet_name)
-    created = tpl_ws.copy_to(target_spreadsheet.id)
-    new_sheet_id = created["sheetId"]
-
-    get_by_id = getattr(target_spreadsheet, "get_worksheet_by_id", None)
-    ws = get_by_id(new_sheet_id) if callable(get_by_id) else None
-    if not ws:
-        for w in target_spreadsheet.worksheets():
-            if getattr(w, "id", None) == new_sheet_id:
-                ws = w
-                break
-    if not ws:
-        raise RuntimeError(f"Не удалось найти скопированный лист по id={new_sheet_id}")
-
-    existing = {w.title for w in target_spreadsheet.worksheets()}
-    new_title = period_title
-    suffix = 2
-    while new_title in existing:
-        new_title = f"{period_title}-{suffix}"
-        suffix += 1
-    ws.update_title(new_title)
-    return ws
+    """
+    Создаёт в файле клиента лист периода из шаблона.
+    Мастер-шаблон копируется в файл (скрытый лист) только при изменении мастера,
+    сам лист — быстрый дубликат внутри файла (sheets/template_manager.py).
+    Имя — period_title, при занятости — с суффиксом -2, -3, …
+    """
+    def _create():
+        title = _free_title(period_title, meta_cache.titles(target_spreadsheet))
+        return template_manager.create_period_sheet(
+            target_spreadsheet, master_spreadsheet_id, template_sheet_name, title
+        )
+
+    try:
+        return _create()
+    except gspread.exceptions.APIError as e:
+        # имя уже занято листом, которого нет в кэше — перечитываем и подбираем заново
+        if not meta_cache.invalidate_on_mismatch(target_spreadsheet.id, e):
+            raise
+        return _create()
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -86,28 +94,39 @@ def choose_result_label_value(row):
 #                      ФОРМИРОВАНИЕ СТРОК ДЛЯ КАМПАНИЙ
 # ──────────────────────────────────────────────────────────────────────────────
 
-def build_campaign_rows(insights, statuses_map):
-    """Формирует список строк для блока «Рекламные кампании»."""
+def build_campaign_rows(insights, statuses_map, enrichment=None, concurrency=None):
+    """
+    Формирует список строк для блока «Рекламные кампании».
+    enrichment — записи fb.enrichment (бюджеты, ссылка на креатив); кампании без записи
+    догружаются параллельно (enrich_each, не более concurrency одновременно на отчёт).
+    """
+    enrichment = dict(enrichment or {})
+    missing = [row.get("campaign_id") for row in insights if row.get("campaign_id") not in enrichment]
+    if missing:
+        kw = {"concurrency": concurrency} if concurrency else {}
+        enrichment.update(enrich_each(missing, **kw))
+
     tmp = []
     for row in insights:
         cid = row.get("campaign_id")
         name = row.get("campaign_name") or ""
-        spend = float(row.get("spend", 0) or 0)
+        parsed = parse_row(row)
+        spend = parsed["spend"]
 
         # цель и результат по жёстким правилам
         goal_label, result_val = choose_result_label_value(row)
         price = f"{(spend / result_val):.2f}" if result_val and result_val > 0 else ""
 
         # бюджеты и предпросмотр
-        adset_budgets_minor = fetch_adsets_daily_budgets(cid)
+        rec = enrichment.get(cid) or {}
+        adset_budgets_minor = rec.get("adset_budgets") or []
         daily_budget_display = choose_display_daily_budget(adset_budgets_minor)
-        ad_id = fetch_any_ad_id_of_campaign(cid)
-        preview = get_best_creative_link_for_ad(ad_id) if ad_id else ""
+        preview = rec.get("creative_link") or ""
 
         eff_status = (statuses_map.get(cid, "") or "").upper()
         status_display = "Активна" if "ACTIVE" in eff_status else "Неактивна"
 
-        reach = int(float(row.get("reach", 0) or 0))
+        reach = int(parsed["reach"])
 
         tmp.append([
             name, goal_label, status_display, result_val, price, reach,
@@ -145,7 +164,7 @@ def main(client_query: str, period_text: str):
     since, until = parse_period_ddmm_dash_ddmm(period_text)
 
     # 3. Открываем Google Sheet клиента
-    doc = gc.open_by_key(spreadsheet_id)
+    doc = meta_cache.open_doc(gc, spreadsheet_id)
 
     # 4. Копируем шаблон
     master_tpl_id = client.get("report_template_spreadsheet_id") or os.getenv("TEMPLATE_SPREADSHEET_ID")
@@ -154,7 +173,6 @@ def main(client_query: str, period_text: str):
         raise RuntimeError("No TEMPLATE_SPREADSHEET_ID (env or master_index)")
 
     ws = _copy_master_template_to_period(
-        gc=gc,
         target_spreadsheet=doc,
         master_spreadsheet_id=master_tpl_id,
         template_sheet_name=template_name,
@@ -163,18 +181,22 @@ def main(client_query: str, period_text: str):
 
     # 5. Данные Facebook
     insights = fetch_campaign_insights(ad_account_id, since, until)
-    statuses = fetch_campaign_statuses(ad_account_id)
+    # статусы, бюджеты и креативы — одним вложенным запросом по кампаниям
+    enrichment = enrich_campaigns(ad_account_id, [r.get("campaign_id") for r in insights])
+    statuses = {cid: rec.get("effective_status", "") for cid, rec in enrichment.items()}
 
     # 6. Общая эффективность
     overall = build_overall_effectiveness_from_fb(
         insights, since, until, chooser=choose_result_label_value
     )
-    write_overview_dynamic(ws, overall["period"], overall)
+    batch = SheetBatch(ws)
+    write_overview_dynamic(ws, overall["period"], overall, batch=batch)
 
     # 7. Кампании
-    rows = build_campaign_rows(insights, statuses)
-    last_row = write_campaign_table(ws, rows)
-    insert_gap_after_campaigns(ws, last_row, gap=2)
+    rows = build_campaign_rows(insights, statuses, enrichment)
+    last_row = write_campaign_table(ws, rows, batch=batch)
+    insert_gap_after_campaigns(ws, last_row, gap=2, batch=batch)
+    batch.flush()
 
     # 8. Ссылка на лист
     return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}#gid={ws.id}"
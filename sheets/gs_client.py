@@ -2,9 +2,14 @@
 from __future__ import annotations
 from oauth2client.service_account import ServiceAccountCredentials
 from googleapiclient.discovery import build
+from requests.adapters import HTTPAdapter
 import gspread
-from config import GOOGLE_SERVICE_ACCOUNT_JSON
+from gspread.http_client import HTTPClient
+from config import GOOGLE_SERVICE_ACCOUNT_JSON, GOOGLE_POOL_SIZE, GOOGLE_RPS, GOOGLE_BURST, GOOGLE_API_URL
+from utils import TokenBucket
+from sheets import meta_cache
 import os
+import threading
 
 # Доступы к Google API
 SCOPES = [
@@ -13,45 +18,135 @@ SCOPES = [
 ]
 
 # ───────────────────────────────────────────────────────────────
-# КЛИЕНТЫ
+# КЛИЕНТЫ (один на процесс, потокобезопасно)
 # ───────────────────────────────────────────────────────────────
 
+# Бюджет запросов к Google на процесс: делят все потоки (бот, пакетные прогоны, проверки)
+GOOGLE_BUCKET = TokenBucket(GOOGLE_RPS, GOOGLE_BURST)
+
+class ThrottledHTTPClient(HTTPClient):
+    """HTTP-клиент gspread, который перед каждым запросом берёт токен из GOOGLE_BUCKET."""
+
+    def request(self, *args, **kwargs):
+        GOOGLE_BUCKET.acquire()
+        return super().request(*args, **kwargs)
+
+# ── Локальная заглушка (GOOGLE_API_URL): переписываем адреса Google на неё ──
+_GOOGLE_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+def _redirect_url(url: str) -> str:
+    for host in _GOOGLE_HOSTS:
+        if url.startswith(host):
+            return GOOGLE_API_URL + url[len(host):]
+    return url
+
+class RedirectAdapter(HTTPAdapter):
+    """HTTPAdapter сессии gspread, отправляющий запросы на GOOGLE_API_URL."""
+
+    def send(self, request, *args, **kwargs):
+        request.url = _redirect_url(request.url)
+        return super().send(request, *args, **kwargs)
+
+def _redirect_http():
+    """httplib2.Http для Drive-сервиса с той же подменой адресов (включая batch)."""
+    import httplib2
+
+    class _RedirectHttp(httplib2.Http):
+        def request(self, uri, *args, **kwargs):
+            return super().request(_redirect_url(uri), *args, **kwargs)
+
+    return _RedirectHttp()
+
+_LOCK = threading.RLock()   # RLock: get_gs_client берёт креды под тем же локом
+_CREDS = None
+_GC: gspread.Client | None = None
+_DRIVE_LOCAL = threading.local()   # httplib2 не потокобезопасен → Drive-сервис на поток
+
+def _get_credentials():
+    """Сервисный аккаунт читается с диска один раз; токен обновляется и переиспользуется всеми клиентами."""
+    global _CREDS
+    if _CREDS is None:
+        with _LOCK:
+            if _CREDS is None and GOOGLE_API_URL:
+                # заглушке авторизация не нужна
+                from google.auth.credentials import AnonymousCredentials
+                _CREDS = AnonymousCredentials()
+            elif _CREDS is None:
+                _CREDS = ServiceAccountCredentials.from_json_keyfile_name(
+                    GOOGLE_SERVICE_ACCOUNT_JSON, SCOPES
+                )
+    return _CREDS
+
 def get_gs_client() -> gspread.Client:
-    """Авторизация gspread (для работы с таблицами)."""
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        GOOGLE_SERVICE_ACCOUNT_JSON, SCOPES
-    )
-    return gspread.authorize(creds)
+    """
+    Авторизация gspread (для работы с таблицами).
+    Клиент создаётся один раз на процесс; его AuthorizedSession (keep-alive пул
+    на GOOGLE_POOL_SIZE соединений) общая для всех потоков, а запросы идут
+    через общий бюджет GOOGLE_RPS.
+    """
+    global _GC
+    if _GC is None:
+        with _LOCK:
+            if _GC is None:
+                gc = gspread.authorize(_get_credentials(), http_client=ThrottledHTTPClient)
+                adapter_cls = RedirectAdapter if GOOGLE_API_URL else HTTPAdapter
+                adapter = adapter_cls(pool_connections=GOOGLE_POOL_SIZE, pool_maxsize=GOOGLE_POOL_SIZE)
+                gc.http_client.session.mount("https://", adapter)
+                _GC = gc
+    return _GC
 
 def get_drive_service():
-    """Создать сервис Google Drive API (для копирования файлов)."""
-    creds = ServiceAccountCredentials.from_json_keyfile_name(
-        GOOGLE_SERVICE_ACCOUNT_JSON, SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
+    """
+    Сервис Google Drive API (для копирования файлов).
+    Discovery-документ — встроенный (static_discovery), без сетевого запроса;
+    сервис кэшируется на поток, учётные данные — общие.
+    """
+    drive = getattr(_DRIVE_LOCAL, "service", None)
+    if drive is None:
+        # с заглушкой — свой транспорт без авторизации, иначе — сервисный аккаунт
+        auth = {"http": _redirect_http()} if GOOGLE_API_URL else {"credentials": _get_credentials()}
+        drive = build(
+            "drive", "v3",
+            static_discovery=True,
+            cache_discovery=False,
+            **auth,
+        )
+        _DRIVE_LOCAL.service = drive
+    return drive
+
+def reset_clients():
+    """Сбросить закэшированные клиенты (например, после смены ключа сервисного аккаунта)."""
+    global _CREDS, _GC
+    with _LOCK:
+        _CREDS = None
+        _GC = None
+    _DRIVE_LOCAL.__dict__.clear()
 
 # ───────────────────────────────────────────────────────────────
 # УТИЛИТЫ ДЛЯ ЧТЕНИЯ/ЗАПИСИ
 # ───────────────────────────────────────────────────────────────
+# Таблицы и листы — через sheets/meta_cache.py: открываются один раз на процесс.
+
+def _sheet(spreadsheet_id: str, tab: str | None = None) -> gspread.Worksheet:
+    """Лист tab (или первый лист) таблицы spreadsheet_id."""
+    doc = meta_cache.open_doc(get_gs_client(), spreadsheet_id)
+    if tab is None:
+        return doc.sheet1
+    return meta_cache.get_worksheet(doc, tab) or doc.worksheet(tab)
 
 def get_values(spreadsheet_id: str, range_: str):
     """Прочитать диапазон из Google Sheets (list of lists)."""
-    gc = get_gs_client()
-    ws = gc.open_by_key(spreadsheet_id)
-    sheet = ws.worksheet(range_.split("!")[0]) if "!" in range_ else ws.sheet1
+    sheet = _sheet(spreadsheet_id, range_.split("!")[0] if "!" in range_ else None)
     return sheet.get(range_.split("!")[1] if "!" in range_ else range_)
 
 def update_value(spreadsheet_id: str, cell: str, value: str):
     """Записать значение в конкретную ячейку (A1-формат)."""
-    gc = get_gs_client()
-    ws = gc.open_by_key(spreadsheet_id)
-    sheet = ws.worksheet(cell.split("!")[0]) if "!" in cell else ws.sheet1
+    sheet = _sheet(spreadsheet_id, cell.split("!")[0] if "!" in cell else None)
     sheet.update_acell(cell.split("!")[1] if "!" in cell else cell, value)
 
 def find_row_index(spreadsheet_id: str, tab: str, col_letter: str, needle: str):
     """Найти номер строки (int) по значению needle в заданной колонке."""
-    gc = get_gs_client()
-    ws = gc.open_by_key(spreadsheet_id).worksheet(tab)
+    ws = _sheet(spreadsheet_id, tab)
     values = ws.col_values(_col_to_index(col_letter))
     for i, v in enumerate(values, start=1):
         if v.strip().lower() == needle.strip().lower():
@@ -78,9 +173,10 @@ def create_spreadsheet_copy(
     """
     Создать копию Google Spreadsheet (src_id) с новым именем dst_title.
     Если указан dst_folder_id — поместить копию в эту папку.
-    Возвращает ID созданного файла.
+    Возвращает ID созданного файла. Новым клиентам таблицы выдаёт пул (sheets/pool.py).
     """
     drive = get_drive_service()
+    GOOGLE_BUCKET.acquire()
     body = {"name": dst_title}
     if dst_folder_id:
         body["parents"] = [dst_folder_id]
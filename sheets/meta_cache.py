@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# sheets/meta_cache.py
+"""
+Кэш метаданных таблиц Google Sheets (на процесс).
+
+  spreadsheet_id -> открытый gspread.Spreadsheet (без повторных open_by_key)
+  spreadsheet_id -> {title листа: properties (sheetId, gridProperties, hidden …)}
+  spreadsheet_id -> {title листа: {key: value} developer metadata листа}
+
+Метаданные листов читаются одним fetch_sheet_metadata с маской полей и дальше
+правятся локально после наших же add/duplicate/copy/rename (remember/rename/forget_sheet).
+Если API ответил ошибкой «лист уже есть / нет такого листа» — кэш таблицы
+сбрасывается (invalidate_on_mismatch) и при следующем обращении читается заново.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import gspread
+
+from config import GS_META_TTL
+
+_SHEETS_FIELDS = "sheets(properties,developerMetadata(metadataKey,metadataValue))"
+
+# Фрагменты сообщений API об id/имени листа и диапазоне — значит, наша картина листов
+# устарела. Общие «not found» (файл, метаданные, 404) сюда не относятся.
+_MISMATCH_MARKERS = (
+    "A sheet with the name",     # addSheet/duplicate/rename: «… already exists»
+    "A grid with id",            # duplicateSheet с занятым newSheetId
+    "No grid with id",
+    "Unable to parse range",
+    "exceeds grid limits",
+    "WorksheetNotFound",
+)
+
+_LOCK = threading.Lock()
+_DOCS: Dict[str, gspread.Spreadsheet] = {}
+_SHEETS: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_DEV_META: Dict[str, Dict[str, Dict[str, str]]] = {}
+_FETCHED_AT: Dict[str, float] = {}
+
+# ── ТАБЛИЦЫ ──────────────────────────────────────────────────────────────────
+def open_doc(gc: gspread.Client, spreadsheet_id: str) -> gspread.Spreadsheet:
+    """open_by_key с кэшем: одна таблица открывается один раз на процесс."""
+    with _LOCK:
+        doc = _DOCS.get(spreadsheet_id)
+    if doc is None:
+        doc = gc.open_by_key(spreadsheet_id)
+        with _LOCK:
+            doc = _DOCS.setdefault(spreadsheet_id, doc)
+    return doc
+
+# ── ЛИСТЫ ────────────────────────────────────────────────────────────────────
+def sheet_props(doc: gspread.Spreadsheet, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+    """title -> properties всех листов таблицы (копия; читается из API не чаще GS_META_TTL)."""
+    sid = doc.id
+    with _LOCK:
+        cached = _SHEETS.get(sid)
+        fresh = cached is not None and time.time() - _FETCHED_AT.get(sid, 0.0) < GS_META_TTL
+        if fresh and not refresh:
+            return dict(cached)
+
+    meta = doc.fetch_sheet_metadata(params={"fields": _SHEETS_FIELDS})
+    props = {s["properties"]["title"]: s["properties"] for s in meta.get("sheets", [])}
+    dev = {
+        s["properties"]["title"]: {m["metadataKey"]: m.get("metadataValue", "") for m in s.get("developerMetadata", [])}
+        for s in meta.get("sheets", [])
+    }
+    with _LOCK:
+        _SHEETS[sid] = props
+        _DEV_META[sid] = dev
+        _FETCHED_AT[sid] = time.time()
+    return dict(props)
+
+def titles(doc: gspread.Spreadsheet) -> set:
+    return set(sheet_props(doc))
+
+def _worksheet(doc: gspread.Spreadsheet, props: Dict[str, Any]) -> gspread.Worksheet:
+    return gspread.Worksheet(doc, props, doc.id, doc.client)
+
+def get_worksheet(doc: gspread.Spreadsheet, title: str) -> Optional[gspread.Worksheet]:
+    """Лист по имени из кэша (None, если такого нет) — без запроса к API."""
+    props = sheet_props(doc).get(title)
+    return _worksheet(doc, props) if props else None
+
+def sheet_dev_meta(doc: gspread.Spreadsheet, title: str) -> Dict[str, str]:
+    """Developer metadata листа {key: value} (из того же кэша, без отдельного запроса)."""
+    sheet_props(doc)
+    with _LOCK:
+        return dict((_DEV_META.get(doc.id) or {}).get(title) or {})
+
+def remember(
+    doc: gspread.Spreadsheet,
+    props: Dict[str, Any],
+    dev_meta: Dict[str, str] | None = None,
+) -> gspread.Worksheet:
+    """
+    Учесть лист, созданный нами (add/duplicate/copy_to), и вернуть его Worksheet.
+    props — SheetProperties из ответа API (или ws._properties);
+    dev_meta — developer metadata, которую мы на него повесили.
+    """
+    with _LOCK:
+        sheets = _SHEETS.get(doc.id)
+        if sheets is not None:
+            sheets[props["title"]] = props
+            _DEV_META.setdefault(doc.id, {})[props["title"]] = dict(dev_meta or {})
+    return _worksheet(doc, props)
+
+def remember_dev_meta(doc: gspread.Spreadsheet, title: str, values: Dict[str, str]) -> None:
+    """Поправить в кэше developer metadata листа после нашей записи."""
+    with _LOCK:
+        if doc.id in _SHEETS:
+            _DEV_META.setdefault(doc.id, {}).setdefault(title, {}).update(values)
+
+def remember_row_count(doc: gspread.Spreadsheet, title: str, rows: int) -> None:
+    """Поправить в кэше число строк сетки листа после наших вставок/удалений."""
+    with _LOCK:
+        props = (_SHEETS.get(doc.id) or {}).get(title)
+        if props is not None:
+            props.setdefault("gridProperties", {})["rowCount"] = rows
+
+def rename(doc: gspread.Spreadsheet, ws: gspread.Worksheet, new_title: str) -> None:
+    """Переименовать лист и поправить кэш без перечитывания."""
+    old_title = ws.title
+    ws.update_title(new_title)
+    with _LOCK:
+        sheets = _SHEETS.get(doc.id)
+        if sheets is not None:
+            props = sheets.pop(old_title, None) or dict(ws._properties)
+            props["title"] = new_title
+            sheets[new_title] = props
+            dev = _DEV_META.setdefault(doc.id, {})
+            dev[new_title] = dev.pop(old_title, {})
+
+def forget_sheet(doc: gspread.Spreadsheet, title: str) -> None:
+    with _LOCK:
+        sheets = _SHEETS.get(doc.id)
+        if sheets is not None:
+            sheets.pop(title, None)
+            (_DEV_META.get(doc.id) or {}).pop(title, None)
+
+# ── СБРОС ────────────────────────────────────────────────────────────────────
+def invalidate(spreadsheet_id: str | None = None) -> None:
+    """Сбросить кэш одной таблицы (или всех)."""
+    with _LOCK:
+        if spreadsheet_id is None:
+            _DOCS.clear(); _SHEETS.clear(); _DEV_META.clear(); _FETCHED_AT.clear()
+        else:
+            _SHEETS.pop(spreadsheet_id, None)
+            _DEV_META.pop(spreadsheet_id, None)
+            _FETCHED_AT.pop(spreadsheet_id, None)
+
+def invalidate_on_mismatch(spreadsheet_id: str, err: Exception) -> bool:
+    """Если ошибка говорит о расхождении с реальными листами — сбросить кэш таблицы. True, если сбросили."""
+    text = f"{type(err).__name__}: {err}"
+    if any(m in text for m in _MISMATCH_MARKERS):
+        invalidate(spreadsheet_id)
+        return True
+    return False
+
+__all__ = [
+    "open_doc",
+    "sheet_props",
+    "titles",
+    "get_worksheet",
+    "sheet_dev_meta",
+    "remember",
+    "remember_dev_meta",
+    "rename",
+    "forget_sheet",
+    "invalidate",
+    "invalidate_on_mismatch",
+]
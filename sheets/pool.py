@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# sheets/pool.py
+"""
+Пул заранее созданных таблиц отчётов для новых клиентов.
+
+В папке GDRIVE_FOLDER_ID держим POOL_SIZE копий TEMPLATE_SPREADSHEET_ID, уже
+расшаренных на POOL_SHARE_WITH. Свободные копии помечены Drive appProperties
+mr_pool=free; при выдаче клиенту — переименовываются и получают mr_pool=assigned.
+Копирование и выдача правами идут пачками через Drive batch HTTP
+(до POOL_BATCH_SIZE подзапросов в одном HTTP-запросе), id таблиц пишутся
+в Monthly одной пачкой (catalog/master_index.write_spreadsheet_ids).
+
+CLI:
+    python -m sheets.pool status
+    python -m sheets.pool refill [--size 20]
+    python -m sheets.pool assign --missing          # всем строкам Monthly без spreadsheet_id
+    python -m sheets.pool assign --client "acme" --client "gravo 2"
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    GDRIVE_FOLDER_ID,
+    TEMPLATE_SPREADSHEET_ID,
+    POOL_SIZE,
+    POOL_SHARE_WITH,
+    POOL_BATCH_SIZE,
+    POOL_REFILL_SEC,
+)
+from sheets.gs_client import get_drive_service, get_gs_client, GOOGLE_BUCKET
+from catalog.master_index import load_clients, write_spreadsheet_ids
+from utils import normalize
+
+POOL_KEY = "mr_pool"
+FREE, ASSIGNED = "free", "assigned"
+
+_LOCK = threading.Lock()   # выдача и пополнение — по одному в процессе
+
+# ── Drive batch ──────────────────────────────────────────────────────────────
+def _run_batch(calls: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Выполнить запросы Drive пачками по POOL_BATCH_SIZE (один HTTP-запрос на пачку,
+    но по токену GOOGLE_BUCKET на каждый подзапрос). Возвращает [{"ok": bool, "result"| "error"}] в порядке calls.
+    """
+    drive = get_drive_service()
+    out: List[Dict[str, Any]] = [{} for _ in calls]
+
+    def _cb_for(i: int) -> Callable:
+        def _cb(request_id, response, exception):
+            out[i] = {"ok": False, "error": str(exception)} if exception else {"ok": True, "result": response}
+        return _cb
+
+    for start in range(0, len(calls), POOL_BATCH_SIZE):
+        batch = drive.new_batch_http_request()
+        for i in range(start, min(start + POOL_BATCH_SIZE, len(calls))):
+            batch.add(calls[i], callback=_cb_for(i))
+            GOOGLE_BUCKET.acquire()   # квота Google считает каждый подзапрос batch
+        batch.execute()
+    return out
+
+def _share_with() -> List[str]:
+    return [e.strip() for e in (POOL_SHARE_WITH or "").split(",") if e.strip()]
+
+# ── состояние пула ───────────────────────────────────────────────────────────
+def list_free() -> List[Dict[str, Any]]:
+    """Свободные таблицы пула (старые первыми)."""
+    drive = get_drive_service()
+    q = (
+        f"'{GDRIVE_FOLDER_ID}' in parents and trashed = false and "
+        f"appProperties has {{ key='{POOL_KEY}' and value='{FREE}' }}"
+    )
+    files, token = [], None
+    while True:
+        GOOGLE_BUCKET.acquire()
+        res = drive.files().list(
+            q=q, fields="nextPageToken, files(id, name, createdTime)", orderBy="createdTime",
+            pageSize=1000, pageToken=token, supportsAllDrives=True, includeItemsFromAllDrives=True,
+        ).execute()
+        files += res.get("files", [])
+        token = res.get("nextPageToken")
+        if not token:
+            return files
+
+def _copy_many(n: int) -> List[Dict[str, Any]]:
+    """Создать n копий шаблона (и расшарить) пачками; возвращает [{id, name}] созданных."""
+    if n <= 0:
+        return []
+    drive = get_drive_service()
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    names = [f"Monthly_report_pool_{stamp}_{i + 1}" for i in range(n)]
+    copies = [
+        drive.files().copy(
+            fileId=TEMPLATE_SPREADSHEET_ID,
+            body={"name": name, "parents": [GDRIVE_FOLDER_ID], "appProperties": {POOL_KEY: FREE}},
+            fields="id",
+            supportsAllDrives=True,
+        )
+        for name in names
+    ]
+    files = []
+    for name, r in zip(names, _run_batch(copies)):
+        if r["ok"]:
+            files.append({"id": r["result"]["id"], "name": name})
+        else:
+            print(f"⚠️ pool: копия не создана: {r['error']}")
+    ids = [f["id"] for f in files]
+
+    perms = [
+        drive.permissions().create(
+            fileId=fid, body={"type": "user", "role": "writer", "emailAddress": email},
+            sendNotificationEmail=False, supportsAllDrives=True, fields="id",
+        )
+        for fid in ids for email in _share_with()
+    ]
+    for r in _run_batch(perms):
+        if not r["ok"]:
+            print(f"⚠️ pool: доступ не выдан: {r['error']}")
+    return files
+
+def refill(size: int = POOL_SIZE) -> int:
+    """Дополнить пул до size свободных таблиц. Возвращает, сколько создано."""
+    with _LOCK:
+        missing = size - len(list_free())
+        created = _copy_many(missing)
+    if created:
+        print(f"📦 pool: создано {len(created)} таблиц")
+    return len(created)
+
+def start_refiller(size: int = POOL_SIZE, interval: float = POOL_REFILL_SEC) -> threading.Thread:
+    """Фоновый поток, пополняющий пул раз в interval секунд."""
+    def _loop():
+        while True:
+            try:
+                refill(size)
+            except Exception as e:
+                print(f"⚠️ pool refill: {type(e).__name__}: {e}")
+            time.sleep(interval)
+    t = threading.Thread(target=_loop, name="pool-refill", daemon=True)
+    t.start()
+    return t
+
+def _refill_async(size: int = POOL_SIZE) -> None:
+    threading.Thread(target=lambda: refill(size), name="pool-refill-once", daemon=True).start()
+
+# ── выдача клиентам ──────────────────────────────────────────────────────────
+def _release(files: List[Dict[str, Any]]) -> None:
+    """Вернуть выданные, но не записанные в Monthly таблицы в пул (прежнее имя, mr_pool=free)."""
+    drive = get_drive_service()
+    updates = [
+        drive.files().update(
+            fileId=f["id"],
+            body={"name": f["name"], "appProperties": {POOL_KEY: FREE, "mr_client": None}},
+            fields="id", supportsAllDrives=True,
+        )
+        for f in files
+    ]
+    for f, r in zip(files, _run_batch(updates)):
+        if not r["ok"]:
+            print(f"⚠️ pool: таблица {f['id']} осталась assigned без строки в Monthly: {r['error']}")
+
+def assign(
+    ad_names: List[str],
+    size: int = POOL_SIZE,
+    background_refill: bool = True,
+) -> Dict[str, Optional[str]]:
+    """
+    Выдать таблицы из пула клиентам ad_names: переименовать в Monthly_report_<клиент>,
+    пометить assigned и записать spreadsheet_id в Monthly одной пачкой.
+    Таблицы, чей id в Monthly не записался (клиента нет в Monthly, запись упала),
+    возвращаются в пул — assigned без строки в Monthly не остаётся.
+    Если свободных не хватает — недостающие копируются сразу (тоже пачками);
+    после выдачи пул пополняется в фоне (background_refill).
+    Возвращает {ad_name: spreadsheet_id | None}.
+    """
+    names = list(dict.fromkeys(n for n in ad_names if n))
+    if not names:
+        return {}
+    result: Dict[str, Optional[str]] = {n: None for n in names}
+    with _LOCK:
+        free = list_free()
+        if len(free) < len(names):
+            free += _copy_many(len(names) - len(free))
+
+        drive = get_drive_service()
+        pairs = list(zip(names, free))
+        updates = [
+            drive.files().update(
+                fileId=f["id"],
+                body={"name": f"Monthly_report_{name}", "appProperties": {POOL_KEY: ASSIGNED, "mr_client": name}},
+                fields="id", supportsAllDrives=True,
+            )
+            for name, f in pairs
+        ]
+        assigned = []
+        for (name, f), r in zip(pairs, _run_batch(updates)):
+            if r["ok"]:
+                assigned.append((name, f))
+            else:
+                print(f"⚠️ pool: не удалось выдать таблицу {name}: {r['error']}")
+
+        written: Dict[str, bool] = {}
+        try:
+            # мимо общей очереди master_index: упавшая запись не должна отложиться
+            # и дописать в Monthly id таблиц, которые ниже вернутся в пул
+            written = write_spreadsheet_ids(get_gs_client(), {name: f["id"] for name, f in assigned})
+        finally:
+            # и при исключении: всё, что не попало в Monthly, — обратно в пул
+            unwritten = [f for name, f in assigned if not written.get(normalize(name))]
+            if unwritten:
+                print(f"⚠️ pool: id не записан в Monthly для {len(unwritten)} таблиц — возвращаю их в пул")
+                _release(unwritten)
+        for name, f in assigned:
+            if written.get(normalize(name)):
+                result[name] = f["id"]
+
+    if background_refill:
+        _refill_async(size)
+    return result
+
+def assign_missing(size: int = POOL_SIZE, background_refill: bool = True) -> Dict[str, Optional[str]]:
+    """Выдать таблицы всем строкам Monthly с пустым spreadsheet_id."""
+    clients = load_clients(get_gs_client())
+    names = [c["ad_name"] for c in clients if not (c.get("spreadsheet_id") or "").strip()]
+    return assign(names, size, background_refill)
+
+# ── CLI ──────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m sheets.pool", description="Пул таблиц для новых клиентов")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="сколько свободных таблиц")
+    rp = sub.add_parser("refill", help="дополнить пул")
+    rp.add_argument("--size", type=int, default=POOL_SIZE)
+    ap_ = sub.add_parser("assign", help="выдать таблицы клиентам")
+    g = ap_.add_mutually_exclusive_group(required=True)
+    g.add_argument("--missing", action="store_true", help="всем строкам Monthly без spreadsheet_id")
+    g.add_argument("--client", action="append", help="ad_name клиента, можно несколько раз")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "status":
+        free = list_free()
+        print(json.dumps({"free": len(free), "target": POOL_SIZE, "files": free}, ensure_ascii=False, indent=2))
+    elif args.cmd == "refill":
+        print(f"📦 Создано: {refill(args.size)}")
+    else:
+        # из CLI пополняем синхронно — фоновый поток умер бы вместе с процессом
+        res = assign_missing(background_refill=False) if args.missing else assign(args.client, background_refill=False)
+        print(json.dumps(res, ensure_ascii=False, indent=2))
+        print(f"📦 Пул пополнен: +{refill()}")
+
+if __name__ == "__main__":
+    main()
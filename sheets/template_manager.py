@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# sheets/template_manager.py
+"""
+Шаблон отчёта внутри файла клиента.
+
+Медленный межфайловый copy_to из мастер-шаблона делается только когда мастер
+изменился: копия лежит в файле клиента скрытым листом _tpl_<имя шаблона>
+с developer metadata tpl_version = modifiedTime мастер-файла (Drive).
+Листы периодов создаются быстрым duplicateSheet внутри файла — одним batchUpdate
+вместе со снятием «скрытости».
+
+Используется обоими путями: sheets/writer.py (report_service) и run_monthly_report.py.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Dict, Tuple
+
+import gspread
+
+from config import TEMPLATE_VERSION_TTL
+from sheets import meta_cache
+from sheets.gs_client import get_gs_client, get_drive_service, GOOGLE_BUCKET
+
+MANAGED_PREFIX = "_tpl_"
+VERSION_KEY = "tpl_version"
+
+_VERSIONS: Dict[str, Tuple[str, float]] = {}   # master_id -> (modifiedTime, когда спросили)
+_VERSIONS_LOCK = threading.Lock()
+_DOC_LOCKS: Dict[str, threading.Lock] = {}    # spreadsheet_id -> лок синхронизации шаблона
+
+def managed_title(template_sheet_name: str) -> str:
+    return f"{MANAGED_PREFIX}{template_sheet_name}"
+
+def _doc_lock(spreadsheet_id: str) -> threading.Lock:
+    with _VERSIONS_LOCK:
+        return _DOC_LOCKS.setdefault(spreadsheet_id, threading.Lock())
+
+# ── ВЕРСИЯ МАСТЕРА ───────────────────────────────────────────────────────────
+def master_version(master_spreadsheet_id: str) -> str:
+    """modifiedTime мастер-файла из Drive; кэшируется на TEMPLATE_VERSION_TTL секунд."""
+    now = time.time()
+    with _VERSIONS_LOCK:
+        cached = _VERSIONS.get(master_spreadsheet_id)
+        if cached and now - cached[1] < TEMPLATE_VERSION_TTL:
+            return cached[0]
+    GOOGLE_BUCKET.acquire()
+    meta = get_drive_service().files().get(
+        fileId=master_spreadsheet_id, fields="modifiedTime", supportsAllDrives=True
+    ).execute()
+    version = meta.get("modifiedTime") or ""
+    with _VERSIONS_LOCK:
+        _VERSIONS[master_spreadsheet_id] = (version, now)
+    return version
+
+# ── СИНХРОНИЗАЦИЯ ШАБЛОНА В ФАЙЛ КЛИЕНТА ─────────────────────────────────────
+def _new_sheet_id(doc: gspread.Spreadsheet) -> int:
+    taken = {p.get("sheetId") for p in meta_cache.sheet_props(doc).values()}
+    while True:
+        sid = random.randint(1, 2**31 - 1)
+        if sid not in taken:
+            return sid
+
+def ensure_template(
+    doc: gspread.Spreadsheet,
+    master_spreadsheet_id: str,
+    template_sheet_name: str,
+) -> gspread.Worksheet:
+    """
+    Скрытый лист-шаблон в файле клиента актуальной версии.
+    Если его нет или мастер менялся — copy_to из мастера и один batchUpdate:
+    удалить старую копию, переименовать/скрыть новую, повесить tpl_version.
+    """
+    title = managed_title(template_sheet_name)
+    version = master_version(master_spreadsheet_id)
+
+    with _doc_lock(doc.id):
+        current = meta_cache.get_worksheet(doc, title)
+        if current is not None and meta_cache.sheet_dev_meta(doc, title).get(VERSION_KEY) == version:
+            return current
+
+        master = meta_cache.open_doc(get_gs_client(), master_spreadsheet_id)
+        src = meta_cache.get_worksheet(master, template_sheet_name)
+        if src is None:
+            # кэш мастера мог устареть (шаблон переименовали) — спрашиваем API напрямую
+            meta_cache.invalidate(master_spreadsheet_id)
+            src = master.worksheet(template_sheet_name)
+        created = src.copy_to(doc.id)
+        print(f"📄 Шаблон '{template_sheet_name}' скопирован в {doc.id} (версия {version})")
+
+        requests = []
+        if current is not None:
+            requests.append({"deleteSheet": {"sheetId": current.id}})
+        requests += [
+            {"updateSheetProperties": {
+                "properties": {"sheetId": created["sheetId"], "title": title, "hidden": True},
+                "fields": "title,hidden",
+            }},
+            {"createDeveloperMetadata": {"developerMetadata": {
+                "metadataKey": VERSION_KEY,
+                "metadataValue": version,
+                "location": {"sheetId": created["sheetId"]},
+                "visibility": "DOCUMENT",
+            }}},
+        ]
+        doc.batch_update({"requests": requests})
+
+        if current is not None:
+            meta_cache.forget_sheet(doc, title)
+        meta_cache.forget_sheet(doc, created["title"])
+        props = dict(created, title=title, hidden=True)
+        return meta_cache.remember(doc, props, {VERSION_KEY: version})
+
+# ── ЛИСТ ПЕРИОДА ─────────────────────────────────────────────────────────────
+def create_period_sheet(
+    doc: gspread.Spreadsheet,
+    master_spreadsheet_id: str,
+    template_sheet_name: str,
+    title: str,
+    index: int | None = None,
+) -> gspread.Worksheet:
+    """
+    Лист title — копия шаблона внутри файла (duplicateSheet + unhide одним batchUpdate).
+    index — позиция нового листа (None — в конец, как copy_to).
+    """
+    tpl = ensure_template(doc, master_spreadsheet_id, template_sheet_name)
+    new_id = _new_sheet_id(doc)
+    dup = {"sourceSheetId": tpl.id, "newSheetId": new_id, "newSheetName": title}
+    if index is not None:
+        dup["insertSheetIndex"] = index
+    res = doc.batch_update({"requests": [
+        {"duplicateSheet": dup},
+        {"updateSheetProperties": {
+            "properties": {"sheetId": new_id, "hidden": False},
+            "fields": "hidden",
+        }},
+    ]})
+    props = dict(res["replies"][0]["duplicateSheet"]["properties"], hidden=False)
+    return meta_cache.remember(doc, props)
+
+__all__ = [
+    "MANAGED_PREFIX",
+    "managed_title",
+    "master_version",
+    "ensure_template",
+    "create_period_sheet",
+]
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-  # sheets/writer.py
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+import hashlib
+import json
 import re
 import gspread
 
-from config import TEMPLATE_SHEET_NAME  # ← имя листа-шаблона из .env
+from sheets import meta_cache, template_manager
+from config import TEMPLATE_SHEET_NAME, TEMPLATE_SPREADSHEET_ID  # ← шаблон из .env
 
 # ── Якоря под твой шаблон ─────────────────────────────────────────────────────
 OVERVIEW_START_CELL  = "A45"   # якорь блока «Общая эффективность»: тут стоит "Период"
@@ -55,57 +58,188 @@ def _rowcol_to_a1(row: int, col: int) -> str:
 def _range_a1(r1: int, c1: int, r2: int, c2: int) -> str:
     return f"{_rowcol_to_a1(r1, c1)}:{_rowcol_to_a1(r2, c2)}"
 
-def _format_center(ws: gspread.Worksheet, a1_range: str):
-    try:
-        ws.format(a1_range, {"horizontalAlignment": "CENTER"})
-    except Exception:
-        pass
-
-def _format_header(ws: gspread.Worksheet, a1_range: str):
-    try:
-        ws.format(a1_range, {
-            "textFormat": {"bold": True},
-            "horizontalAlignment": "CENTER",
-            "backgroundColor": {"red": 0.90, "green": 0.95, "blue": 0.98}
-        })
-    except Exception:
-        pass
-
-def _format_currency_usd(ws: gspread.Worksheet, a1_range: str):
-    try:
-        ws.format(a1_range, {"numberFormat": {"type": "CURRENCY", "pattern": "\"$\"#,##0.00"}})
-    except Exception:
-        pass
-
-def _set_basic_filter(ws: gspread.Worksheet, a1_range: str):
-    try:
-        ws.set_basic_filter(a1_range)
-    except Exception:
-        pass
+def _a1_to_grid(sheet_id: int, a1_range: str) -> Dict[str, int]:
+    """'A45:C46' / 'A45' -> GridRange (0-based, конец не включается)."""
+    parts = a1_range.split(":")
+    r1, c1 = _a1_to_rowcol(parts[0])
+    r2, c2 = _a1_to_rowcol(parts[-1])
+    return {
+        "sheetId": sheet_id,
+        "startRowIndex": r1 - 1, "endRowIndex": r2,
+        "startColumnIndex": c1 - 1, "endColumnIndex": c2,
+    }
+
+# ── ПАКЕТНАЯ ЗАПИСЬ ───────────────────────────────────────────────────────────
+class SheetBatch:
+    """
+    Накопитель изменений одного листа. Всё, что раньше уходило отдельными вызовами
+    (batch_clear, ws.update, ws.format, set_basic_filter, freeze), копится здесь и
+    отправляется в flush() одним spreadsheets.batchUpdate: очистки, структура, форматы
+    и developer metadata в порядке добавления, значения (updateCells) — в конце,
+    уже после очисток/вставок. batchUpdate атомарен: состояние листа (LAYOUT_KEY)
+    не может записаться без значений, к которым относится.
+    Форматирование «косметическое»: если batchUpdate с ним упал, повторяем без него,
+    чтобы данные всё равно записались (как раньше, когда ошибки формата глотались).
+    """
 
-def _freeze_rows(ws: gspread.Worksheet, rows: int):
-    try:
-        ws.freeze(rows=rows)
-    except Exception:
-        pass
+    def __init__(self, ws: gspread.Worksheet):
+        self.ws = ws
+        self.sheet_id = ws.id
+        self.requests: List[Tuple[Dict[str, Any], bool]] = []   # (request, essential)
+        self.values: List[Dict[str, Any]] = []                  # updateCells, уходят после requests
+        self.row_count = ws.row_count   # строк в сетке листа с учётом накопленных вставок/удалений
+
+    # ── значения ──────────────────────────────────────────────────────────────
+    def clear(self, a1_range: str):
+        """Очистить значения (формат сохраняется) — аналог ws.batch_clear."""
+        self.requests.append(({"updateCells": {
+            "range": _a1_to_grid(self.sheet_id, a1_range),
+            "fields": "userEnteredValue",
+        }}, True))
+
+    def update(self, a1_range: str, values: List[List[Any]]):
+        """Записать значения как есть (RAW) с левого верхнего угла a1_range."""
+        row, col = _a1_to_rowcol(a1_range.split(":")[0])
+        self.values.append({"updateCells": {
+            "start": {"sheetId": self.sheet_id, "rowIndex": row - 1, "columnIndex": col - 1},
+            "rows": [{"values": [{"userEnteredValue": _cell_value(v)} for v in r]} for r in values],
+            "fields": "userEnteredValue",
+        }})
+
+    # ── оформление ────────────────────────────────────────────────────────────
+    def format(self, a1_range: str, fmt: Dict[str, Any]):
+        self.requests.append(({"repeatCell": {
+            "range": _a1_to_grid(self.sheet_id, a1_range),
+            "cell": {"userEnteredFormat": fmt},
+            "fields": "userEnteredFormat(" + ",".join(fmt.keys()) + ")",
+        }}, False))
+
+    def set_basic_filter(self, a1_range: str):
+        self.requests.append(({"setBasicFilter": {
+            "filter": {"range": _a1_to_grid(self.sheet_id, a1_range)},
+        }}, False))
+
+    # ── структура ─────────────────────────────────────────────────────────────
+    def insert_rows(self, before_row: int, count: int, inherit: bool = False):
+        """
+        Вставить count пустых строк перед строкой before_row (1-based), как ws.insert_row.
+        inherit=True — строки берут оформление строки выше (продолжение таблицы).
+        """
+        self.row_count += count
+        self.requests.append(({"insertDimension": {
+            "range": {
+                "sheetId": self.sheet_id, "dimension": "ROWS",
+                "startIndex": before_row - 1, "endIndex": before_row - 1 + count,
+            },
+            "inheritFromBefore": inherit,
+        }}, True))
+
+    def delete_rows(self, first_row: int, count: int):
+        """Удалить count строк, начиная с first_row (1-based)."""
+        self.row_count -= count
+        self.requests.append(({"deleteDimension": {
+            "range": {
+                "sheetId": self.sheet_id, "dimension": "ROWS",
+                "startIndex": first_row - 1, "endIndex": first_row - 1 + count,
+            },
+        }}, True))
+
+    def append_rows(self, count: int):
+        """Добавить count пустых строк в конец листа (расширить сетку)."""
+        self.row_count += count
+        self.requests.append(({"appendDimension": {
+            "sheetId": self.sheet_id, "dimension": "ROWS", "length": count,
+        }}, True))
+
+    def freeze(self, rows: int = 0, cols: int = 0):
+        self.requests.append(({"updateSheetProperties": {
+            "properties": {
+                "sheetId": self.sheet_id,
+                "gridProperties": {"frozenRowCount": rows, "frozenColumnCount": cols},
+            },
+            "fields": "gridProperties.frozenRowCount,gridProperties.frozenColumnCount",
+        }}, False))
+
+    # ── developer metadata листа ──────────────────────────────────────────────
+    def create_dev_meta(self, key: str, value: str):
+        self.requests.append(({"createDeveloperMetadata": {"developerMetadata": {
+            "metadataKey": key,
+            "metadataValue": value,
+            "location": {"sheetId": self.sheet_id},
+            "visibility": "DOCUMENT",
+        }}}, True))
+
+    def update_dev_meta(self, key: str, value: str):
+        self.requests.append(({"updateDeveloperMetadata": {
+            "dataFilters": [{"developerMetadataLookup": {
+                "metadataKey": key,
+                "metadataLocation": {"sheetId": self.sheet_id},
+            }}],
+            "developerMetadata": {"metadataValue": value},
+            "fields": "metadataValue",
+        }}, True))
+
+    # ── отправка ──────────────────────────────────────────────────────────────
+    def flush(self) -> int:
+        """Отправить накопленное. Возвращает число API-запросов (0..1)."""
+        doc = self.ws.spreadsheet
+        calls = 0
+        requests = self.requests + [(v, True) for v in self.values]
+        if requests:
+            try:
+                doc.batch_update({"requests": [r for r, _ in requests]})
+            except gspread.exceptions.APIError as e:
+                meta_cache.invalidate_on_mismatch(doc.id, e)
+                essential = [r for r, ess in requests if ess]
+                if len(essential) == len(requests):
+                    raise
+                print(f"⚠️ Форматирование не применилось ({e}); повторяю без него")
+                if essential:
+                    doc.batch_update({"requests": essential})
+            calls += 1
+            if self.row_count != self.ws.row_count:
+                # сетка изменилась — иначе следующая запись этого листа (ws из meta_cache) видит старую
+                self.ws._properties.setdefault("gridProperties", {})["rowCount"] = self.row_count
+                meta_cache.remember_row_count(doc, self.ws.title, self.row_count)
+        self.requests, self.values = [], []
+        return calls
+
+def _cell_value(v: Any) -> Dict[str, Any]:
+    """Значение ячейки для updateCells — как valueInputOption=RAW (строка остаётся строкой)."""
+    if v is None:
+        return {}
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, (int, float)):
+        return {"numberValue": v}
+    return {"stringValue": str(v)}
+
+def _format_center(batch: SheetBatch, a1_range: str):
+    batch.format(a1_range, {"horizontalAlignment": "CENTER"})
+
+def _format_header(batch: SheetBatch, a1_range: str):
+    batch.format(a1_range, {
+        "textFormat": {"bold": True},
+        "horizontalAlignment": "CENTER",
+        "backgroundColor": {"red": 0.90, "green": 0.95, "blue": 0.98}
+    })
+
+def _format_currency_usd(batch: SheetBatch, a1_range: str):
+    batch.format(a1_range, {"numberFormat": {"type": "CURRENCY", "pattern": "\"$\"#,##0.00"}})
+
+def _set_basic_filter(batch: SheetBatch, a1_range: str):
+    batch.set_basic_filter(a1_range)
 
 # ── ОТКРЫТИЕ/ШАБЛОН (если нужно где-то ещё) ──────────────────────────────────
 def open_target_sheet(gc: gspread.Client, monthly_report_url: str) -> gspread.Spreadsheet:
     m = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", monthly_report_url)
     if not m:
         raise ValueError(f"Bad Google Sheet URL: {monthly_report_url}")
-    return gc.open_by_key(m.group(1))
+    return meta_cache.open_doc(gc, m.group(1))
 
 # ── «ОБЩАЯ ЭФФЕКТИВНОСТЬ» ─────────────────────────────────────────────────────
-def write_overview_dynamic(ws: gspread.Worksheet, period_text: str, overall: Dict[str, Any]):
-    """
-    Пишет блок «Общая эффективность» динамически:
-      - Заголовок: Период | <цели с >0> | Расходы
-      - Значения:  <period> | <суммы>    | <spend>
-    overall: {"period": "...", "goals": {"Переписки": 583, ...}, "spend": 123.45}
-    """
-    start_row, start_col = _a1_to_rowcol(OVERVIEW_START_CELL)
-
+def _render_overview(period_text: str, overall: Dict[str, Any]) -> Tuple[List[Any], List[Any]]:
+    """(шапка, значения) блока «Общая эффективность»."""
     goals = []
     goals_dict = (overall.get("goals") or {})
     for g in sorted(goals_dict.keys()):
@@ -114,107 +248,142 @@ def write_overview_dynamic(ws: gspread.Worksheet, period_text: str, overall: Dic
 
     headers = ["Период"] + goals + ["Расходы"]
     values  = [period_text] + [goals_dict.get(g, "—") or "—" for g in goals] + [overall.get("spend", 0) or 0]
+    return headers, values
+
+def write_overview_dynamic(
+    ws: gspread.Worksheet,
+    period_text: str,
+    overall: Dict[str, Any],
+    batch: SheetBatch | None = None,
+    clear_cols: int = 0,
+):
+    """
+    Пишет блок «Общая эффективность» динамически:
+      - Заголовок: Период | <цели с >0> | Расходы
+      - Значения:  <period> | <суммы>    | <spend>
+    overall: {"period": "...", "goals": {"Переписки": 583, ...}, "spend": 123.45}
+    batch — общий SheetBatch отчёта; без него изменения отправляются сразу.
+    clear_cols — ширина прошлой записи блока (чтобы при меньшем числе целей не остался хвост).
+    """
+    own = batch is None
+    batch = batch or SheetBatch(ws)
+    start_row, start_col = _a1_to_rowcol(OVERVIEW_START_CELL)
 
+    headers, values = _render_overview(period_text, overall)
     end_col = start_col + len(headers) - 1
 
     # очистим область под шапку+строку значений
-    ws.batch_clear([_range_a1(start_row, start_col, start_row + 1, end_col)])
+    batch.clear(_range_a1(start_row, start_col, start_row + 1, max(end_col, start_col + clear_cols - 1)))
 
     # запись
-    ws.update(_range_a1(start_row, start_col, start_row, end_col), [headers])
-    ws.update(_range_a1(start_row + 1, start_col, start_row + 1, end_col), [values])
+    batch.update(_range_a1(start_row, start_col, start_row + 1, end_col), [headers, values])
 
     # форматирование
-    _format_header(ws, _range_a1(start_row, start_col, start_row, end_col))
+    _format_header(batch, _range_a1(start_row, start_col, start_row, end_col))
     if end_col > start_col:
-        _format_center(ws, _range_a1(start_row + 1, start_col + 1, start_row + 1, end_col))
-    _format_currency_usd(ws, _range_a1(start_row + 1, end_col, start_row + 1, end_col))
+        _format_center(batch, _range_a1(start_row + 1, start_col + 1, start_row + 1, end_col))
+    _format_currency_usd(batch, _range_a1(start_row + 1, end_col, start_row + 1, end_col))
+
+    if own:
+        batch.flush()
 
 # ── ТАБЛИЦА КАМПАНИЙ ──────────────────────────────────────────────────────────
-def write_campaign_table(ws: gspread.Worksheet, rows: List[List[Any]]) -> int:
+def write_campaign_table(
+    ws: gspread.Worksheet,
+    rows: List[List[Any]],
+    batch: SheetBatch | None = None,
+) -> int:
     """
     Пишем шапку с A53 и строки с A54 (см. CAMPAIGNS_START_CELL).
     Возвращает last_row — номер последней строки с данными.
+    batch — общий SheetBatch отчёта; без него изменения отправляются сразу.
     """
+    own = batch is None
+    batch = batch or SheetBatch(ws)
     header_row, start_col = _a1_to_rowcol(CAMPAIGNS_START_CELL)
     data_start = header_row + 1
     end_col = start_col + len(CAMPAIGNS_HEADERS) - 1
     last_row = data_start + max(len(rows), 1) - 1
 
-    # чистим диапазон под таблицу
-    ws.batch_clear([_range_a1(header_row, start_col, max(last_row, header_row + 1), end_col)])
+    # в лист шаблона (1000 строк) большая таблица не влезает — расширяем сетку
+    if last_row > batch.row_count:
+        batch.append_rows(last_row - batch.row_count)
 
-    # шапка
-    ws.update(_range_a1(header_row, start_col, header_row, end_col), [CAMPAIGNS_HEADERS])
-    _format_header(ws, _range_a1(header_row, start_col, header_row, end_col))
+    # чистим диапазон под таблицу
+    batch.clear(_range_a1(header_row, start_col, max(last_row, header_row + 1), end_col))
 
-    # данные
-    if rows:
-        ws.update(_range_a1(data_start, start_col, last_row, end_col), rows)
+    # шапка + данные одним диапазоном
+    batch.update(_range_a1(header_row, start_col, header_row + len(rows), end_col), [CAMPAIGNS_HEADERS] + rows)
+    _format_header(batch, _range_a1(header_row, start_col, header_row, end_col))
 
     # оформление таблицы
-    _apply_campaigns_format(ws, header_row, start_col, last_row, end_col)
+    _apply_campaigns_format(batch, header_row, start_col, last_row, end_col)
 
     # 🔓 гарантированно снимаем закрепление (и строк, и столбцов)
-    try:
-        ws.freeze(rows=0, cols=0)
-    except Exception:
-        pass
+    batch.freeze(rows=0, cols=0)
 
+    if own:
+        batch.flush()
     return last_row
 
-def insert_gap_after_campaigns(ws: gspread.Worksheet, last_row_of_table: int, gap: int = 2):
-    """Вставляет gap строк сразу после таблицы кампаний, смещая вниз весь шаблон."""
+# Блок итогового резюме под таблицей кампаний
+SUMMARY_VALUES = [
+    ["✅ Итоговое резюме для клиента", ""],
+    ["Краткий абзац 2–3 предложения:", ""],
+]
+
+def insert_gap_after_campaigns(
+    ws: gspread.Worksheet,
+    last_row_of_table: int,
+    gap: int = 2,
+    batch: SheetBatch | None = None,
+):
+    """
+    Вставляет gap пустых строк + блок резюме сразу после таблицы кампаний,
+    смещая вниз весь шаблон: один insertDimension и значения/формат в общем пакете.
+    """
+    own = batch is None
+    batch = batch or SheetBatch(ws)
     insert_at = last_row_of_table + 1
-    # 1️⃣ Вставляем пустые строки
-    for _ in range(gap):
-        ws.insert_row([], insert_at)   # вставляем ПЕРЕД index
+    summary_row = insert_at + gap
 
-    # 2️⃣ Добавляем блок итогового резюме
-    summary_values = [
-        ["✅ Итоговое резюме для клиента", ""],
-        ["Краткий абзац 2–3 предложения:", ""],
-    ]
-    ws.update(f"A{insert_at + gap}:B{insert_at + gap + 1}", summary_values)
+    # 1️⃣ Вставляем строки под разрыв и резюме одним запросом
+    batch.insert_rows(insert_at, gap + len(SUMMARY_VALUES))
+
+    # 2️⃣ Блок итогового резюме
+    batch.update(f"A{summary_row}:B{summary_row + len(SUMMARY_VALUES) - 1}", SUMMARY_VALUES)
 
     # 3️⃣ Немного оформления (жирный заголовок)
-    try:
-        ws.format(f"A{insert_at + gap}", {
-            "textFormat": {"bold": True, "fontSize": 11},
-            "horizontalAlignment": "LEFT"
-        })
-    except Exception:
-        pass
+    batch.format(f"A{summary_row}", {
+        "textFormat": {"bold": True, "fontSize": 11},
+        "horizontalAlignment": "LEFT"
+    })
+
+    if own:
+        batch.flush()
 
     # 4️⃣ Возвращаем позицию после вставленного блока
-    return insert_at + gap + len(summary_values)
+    return summary_row + len(SUMMARY_VALUES)
 
-def _apply_campaigns_format(ws: gspread.Worksheet, header_row: int, start_col: int, last_row: int, end_col: int):
-    """Оформление: заморозка, фильтр, центровка чисел, валютные форматы."""
-    _freeze_rows(ws, header_row)
-    _set_basic_filter(ws, _range_a1(header_row, start_col, max(last_row, header_row + 1), end_col))
+def _apply_campaigns_format(batch: SheetBatch, header_row: int, start_col: int, last_row: int, end_col: int):
+    """Оформление: фильтр, центровка чисел, валютные форматы (закрепление снимает write_campaign_table)."""
+    _set_basic_filter(batch, _range_a1(header_row, start_col, max(last_row, header_row + 1), end_col))
 
     header_to_index = {name: i for i, name in enumerate(CAMPAIGNS_HEADERS)}  # 0-based
 
     for col_name in _CAMPAIGNS_CENTER_COLS:
         if col_name in header_to_index:
             c = start_col + header_to_index[col_name]
-            _format_center(ws, _range_a1(header_row + 1, c, max(last_row, header_row + 1), c))
+            _format_center(batch, _range_a1(header_row + 1, c, max(last_row, header_row + 1), c))
 
     for col_name in _CAMPAIGNS_CURRENCY_COLS:
         if col_name in header_to_index:
             c = start_col + header_to_index[col_name]
-            _format_currency_usd(ws, _range_a1(header_row + 1, c, max(last_row, header_row + 1), c))
+            _format_currency_usd(batch, _range_a1(header_row + 1, c, max(last_row, header_row + 1), c))
 
 # ── ДОБАВЛЕНО: выбор листа по периоду + дублирование шаблона ────────────────
 from sheets.gs_client import get_gs_client
-from fb.insights import strict_result_value
-
-def _safe_float(x, default=0.0) -> float:
-    try:
-        return float(x or 0)
-    except Exception:
-        return default
+from fb.insights import strict_result_value, parse_row
 
 def _build_campaign_rows(raw_rows: List[Dict[str, Any]]) -> List[List[Any]]:
     """Собирает строки для таблицы кампаний в порядке CAMPAIGNS_HEADERS."""
@@ -224,12 +393,13 @@ def _build_campaign_rows(raw_rows: List[Dict[str, Any]]) -> List[List[Any]]:
         status = r.get("effective_status") or r.get("status") or ""
         goal, result_val = strict_result_value(r)
 
-        spend = _safe_float(r.get("spend"), 0.0)
+        parsed = parse_row(r)
+        spend = parsed["spend"]
         price = spend / result_val if result_val and result_val > 0 else None
-        reach = _safe_float(r.get("reach"), 0.0)
+        reach = parsed["reach"]
 
-        budget = None        # заполним позже, если подключим fb/budgets.py
-        preview_link = ""    # можно подставить через fb/previews.py
+        budget = r.get("daily_budget")          # см. report_service (fb/enrichment.py)
+        preview_link = r.get("preview_link") or ""
 
         out.append([name, goal, status, result_val, price, reach, budget, spend, preview_link])
     return out
@@ -249,23 +419,100 @@ def _period_title(since: str, until: str) -> str:
     except Exception:
         return f"{since}..{until}"
 
+def _create_period_sheet(doc: gspread.Spreadsheet, title: str) -> gspread.Worksheet:
+    tpl = meta_cache.get_worksheet(doc, TEMPLATE_SHEET_NAME)
+    if tpl is not None:
+        new_ws = doc.duplicate_sheet(source_sheet_id=tpl.id, new_sheet_name=title)
+    elif TEMPLATE_SPREADSHEET_ID:
+        # своего шаблона в файле нет — берём мастер, синхронизированный в файл (template_manager)
+        return template_manager.create_period_sheet(doc, TEMPLATE_SPREADSHEET_ID, TEMPLATE_SHEET_NAME, title)
+    else:
+        # нет шаблона — создаём пустой
+        new_ws = doc.add_worksheet(title=title, rows=300, cols=40)
+    return meta_cache.remember(doc, new_ws._properties)
+
 def _ensure_period_worksheet(doc: gspread.Spreadsheet, title: str) -> gspread.Worksheet:
     """
     Возвращает лист с именем title. Если нет — делает копию шаблона TEMPLATE_SHEET_NAME
-    и переименовывает. Если шаблона нет — создаёт пустой лист.
+    и переименовывает. Если шаблона в файле нет — копию мастер-шаблона
+    (TEMPLATE_SPREADSHEET_ID, см. sheets/template_manager.py), иначе пустой лист.
+    Список листов берётся из кэша метаданных (sheets/meta_cache.py).
     """
-    for ws in doc.worksheets():
-        if ws.title == title:
-            return ws
-
-    # пробуем найти шаблон
+    ws = meta_cache.get_worksheet(doc, title)
+    if ws is not None:
+        return ws
     try:
-        tpl = doc.worksheet(TEMPLATE_SHEET_NAME)
-        new_ws = doc.duplicate_sheet(source_sheet_id=tpl.id, new_sheet_name=title)
-        return new_ws
-    except Exception:
-        # нет шаблона — создаём пустой
-        return doc.add_worksheet(title=title, rows=300, cols=40)
+        return _create_period_sheet(doc, title)
+    except gspread.exceptions.APIError as e:
+        # кэш разошёлся с таблицей (лист создали/удалили руками) — перечитываем один раз
+        if not meta_cache.invalidate_on_mismatch(doc.id, e):
+            raise
+        return meta_cache.get_worksheet(doc, title) or _create_period_sheet(doc, title)
+
+def ensure_period_sheet(spreadsheet_id: str, since: str, until: str) -> gspread.Worksheet:
+    """Лист периода в файле клиента (создаётся из шаблона при первом обращении)."""
+    doc = meta_cache.open_doc(get_gs_client(), spreadsheet_id)
+    return _ensure_period_worksheet(doc, _period_title(since, until))
+
+# ── СОСТОЯНИЕ ЛИСТА (для повторных запусков) ────────────────────────────────
+# На листе периода храним developer metadata LAYOUT_KEY: хэши блоков и геометрию
+# последней записи. Повторный запуск с теми же данными ничего не отправляет,
+# с изменёнными — только изменившиеся блоки/строки; разрыв и резюме не вставляются
+# повторно, а таблица растёт/сжимается на разницу строк.
+LAYOUT_KEY = "mr_layout"
+_LAYOUT_VERSION = 1
+# Больше стольких строк — хэши по строкам не храним (лимит размера метаданных), таблица пишется целиком
+_ROW_HASHES_MAX = 1000
+
+def _digest(obj: Any, n: int = 12) -> str:
+    raw = json.dumps(obj, ensure_ascii=False, default=str, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:n]
+
+def _layout_state(headers: List[Any], values: List[Any], table_rows: List[List[Any]]) -> Dict[str, Any]:
+    header_row, _ = _a1_to_rowcol(CAMPAIGNS_START_CELL)
+    return {
+        "v": _LAYOUT_VERSION,
+        "overview": _digest([headers, values]),
+        "ov_cols": len(headers),
+        "table": _digest([CAMPAIGNS_HEADERS] + table_rows),
+        "last_row": header_row + max(len(table_rows), 1),
+        "rows": [_digest(r, 6) for r in table_rows] if len(table_rows) <= _ROW_HASHES_MAX else None,
+    }
+
+def _load_layout(ws: gspread.Worksheet) -> Optional[Dict[str, Any]]:
+    raw = meta_cache.sheet_dev_meta(ws.spreadsheet, ws.title).get(LAYOUT_KEY)
+    try:
+        state = json.loads(raw) if raw else None
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) and state.get("v") == _LAYOUT_VERSION else None
+
+def _update_campaign_table(
+    ws: gspread.Worksheet,
+    batch: SheetBatch,
+    old: Dict[str, Any],
+    new: Dict[str, Any],
+    table_rows: List[List[Any]],
+):
+    """Таблица поменялась: при том же числе строк — только изменившиеся строки, иначе ±разница строк и перезапись."""
+    header_row, start_col = _a1_to_rowcol(CAMPAIGNS_START_CELL)
+    end_col = start_col + len(CAMPAIGNS_HEADERS) - 1
+    old_last, new_last = old["last_row"], new["last_row"]
+
+    old_hashes, new_hashes = old.get("rows"), new.get("rows")
+    if old_last == new_last and old_hashes is not None and new_hashes is not None and len(old_hashes) == len(new_hashes):
+        for i, (was, now) in enumerate(zip(old_hashes, new_hashes)):
+            if was != now:
+                r = header_row + 1 + i
+                batch.update(_range_a1(r, start_col, r, end_col), [table_rows[i]])
+        return
+
+    # двигаем только хвост таблицы — разрыв, резюме и шаблон ниже остаются на месте относительно неё
+    if new_last > old_last:
+        batch.insert_rows(old_last + 1, new_last - old_last, inherit=True)
+    elif new_last < old_last:
+        batch.delete_rows(new_last + 1, old_last - new_last)
+    write_campaign_table(ws, table_rows, batch=batch)
 
 # ── ТОЧКА ВХОДА ───────────────────────────────────────────────────────────────
 def write_monthly_report(
@@ -274,51 +521,59 @@ def write_monthly_report(
     data: Dict[str, Any],
     since: str,
     until: str
-) -> None:
+) -> int:
     """
     Главная точка записи:
       1) Создаёт/находит лист периода (из шаблона, если он есть)
       2) Пишет блок «Общая эффективность»
       3) Пишет таблицу кампаний
-      4) Добавляет 2 пустые строки после таблицы и снимает закрепления
-    Ожидает data = {"overall": {...}, "rows": [...]}
+      4) Добавляет 2 пустые строки и блок резюме после таблицы, снимает закрепления
+    Всё — одним spreadsheets.batchUpdate (вместе с состоянием LAYOUT_KEY, атомарно).
+    Повторная запись того же листа идёт по разнице с прошлой (LAYOUT_KEY):
+    без изменений — ни одного запроса на запись.
+    Ожидает data = {"overall": {...}, "rows": [...]}. Возвращает число запросов записи.
     """
-    gc = get_gs_client()
-    doc = gc.open_by_key(spreadsheet_id)
-
     # 👉 работаем с листом периода, а не с sheet1
-    title = _period_title(since, until)
-    ws: gspread.Worksheet = _ensure_period_worksheet(doc, title)
+    ws: gspread.Worksheet = ensure_period_sheet(spreadsheet_id, since, until)
 
-    # 1) Общая эффективность
     overall: Dict[str, Any] = (data or {}).get("overall") or {}
     period_text = overall.get("period") or f"{since}–{until}"
-    write_overview_dynamic(ws, period_text, overall)
-
-    # 2) Таблица кампаний
     table_rows = _build_campaign_rows((data or {}).get("rows") or [])
-    last_row = write_campaign_table(ws, table_rows)
-
-    # 3) Разрыв после таблицы
-    target_row = insert_gap_after_campaigns(ws, last_row, gap=2)
-
-    # 4) Добавим финальный блок "Итоговое резюме для клиента"
-    summary_values = [
-        ["✅ Итоговое резюме для клиента", ""],
-        ["Краткий абзац 2–3 предложения:", ""],
-    ]
-    # вставляем эти строки под таблицей
-    # Пишем в A..B две строки подряд
-    ws.update(f"A{target_row}:B{target_row+1}", summary_values)
-
-    # Немного оформления заголовка
-    try:
-        ws.format(f"A{target_row}", {"textFormat": {"bold": True, "fontSize": 11}})
-    except Exception:
-        pass
 
-    # 4) На всякий случай — снять закрепление ещё раз
-    try:
-        ws.freeze(rows=0, cols=0)
-    except Exception:
-        pass
+    headers, values = _render_overview(period_text, overall)
+    new = _layout_state(headers, values, table_rows)
+    old = _load_layout(ws)
+    if old and old["overview"] == new["overview"] and old["table"] == new["table"]:
+        print(f"⏭ Лист '{ws.title}' не изменился — запись пропущена")
+        return 0
+
+    # все значения и оформление листа копим и отправляем одним пакетом в конце
+    batch = SheetBatch(ws)
+    layout_json = json.dumps(new, separators=(",", ":"))
+
+    if old is None:
+        # 1) Общая эффективность
+        write_overview_dynamic(ws, period_text, overall, batch=batch)
+
+        # 2) Таблица кампаний
+        last_row = write_campaign_table(ws, table_rows, batch=batch)
+
+        # 3) Разрыв после таблицы + блок "Итоговое резюме для клиента"
+        insert_gap_after_campaigns(ws, last_row, gap=2, batch=batch)
+
+        # 4) На всякий случай — снять закрепление ещё раз
+        batch.freeze(rows=0, cols=0)
+        if LAYOUT_KEY in meta_cache.sheet_dev_meta(ws.spreadsheet, ws.title):
+            batch.update_dev_meta(LAYOUT_KEY, layout_json)   # старый формат состояния
+        else:
+            batch.create_dev_meta(LAYOUT_KEY, layout_json)
+    else:
+        if old["overview"] != new["overview"]:
+            write_overview_dynamic(ws, period_text, overall, batch=batch, clear_cols=old.get("ov_cols", 0))
+        if old["table"] != new["table"]:
+            _update_campaign_table(ws, batch, old, new, table_rows)
+        batch.update_dev_meta(LAYOUT_KEY, layout_json)
+
+    calls = batch.flush()
+    meta_cache.remember_dev_meta(ws.spreadsheet, ws.title, {LAYOUT_KEY: layout_json})
+    return calls
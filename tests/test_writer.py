@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# tests/test_writer.py
+"""
+Запись листа периода (sheets/writer.py) против заглушки Sheets/Drive (fakes/stand.py).
+
+    python -m pytest -q tests
+"""
+import importlib
+import os
+
+import pytest
+
+from fakes.stand import Stand
+from fakes.synthetic import make_world
+
+SINCE, UNTIL = "2025-09-01", "2025-09-30"
+
+@pytest.fixture(scope="module")
+def stand():
+    with Stand(make_world(accounts=1)) as st:
+        saved = dict(os.environ)
+        st.apply_env()
+        os.environ["GOOGLE_RPS"] = "0"
+        try:
+            yield st
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+
+@pytest.fixture(scope="module")
+def writer(stand):
+    # config.py читает окружение при импорте — модули бота грузим уже после apply_env
+    import config
+    importlib.reload(config)
+    from sheets import gs_client, meta_cache, writer
+    for mod in (gs_client, meta_cache, writer):
+        importlib.reload(mod)
+    return writer
+
+def _client_sheet_id(stand) -> str:
+    from catalog.master_index import load_clients
+    from sheets.gs_client import get_gs_client
+    return load_clients(get_gs_client())[0]["spreadsheet_id"]
+
+def _data(spend_first: str):
+    rows = [
+        {"campaign_name": f"Кампания {i}", "objective": "OUTCOME_TRAFFIC",
+         "spend": spend_first if i == 0 else "10", "reach": "100", "clicks": "5"}
+        for i in range(3)
+    ]
+    return {"overall": {"period": "01.09–30.09", "goals": {"Клики": 15}, "spend": 30}, "rows": rows}
+
+def _table_cell(writer, ssid: str, a1: str):
+    ws = writer.ensure_period_sheet(ssid, SINCE, UNTIL)
+    return ws.acell(a1, value_render_option="UNFORMATTED_VALUE").value
+
+def test_failed_write_is_retried_on_next_run(stand, writer, monkeypatch):
+    """Упавшая запись значений не должна оставлять LAYOUT_KEY, совпадающий с новыми данными."""
+    import gspread
+
+    ssid = _client_sheet_id(stand)
+    assert writer.write_monthly_report(ssid, "client", _data("10"), SINCE, UNTIL) > 0
+    assert _table_cell(writer, ssid, "H51") == 10
+
+    # любой запрос, несущий значения ячеек, падает; структура/метаданные проходят
+    real_batch_update = gspread.Spreadsheet.batch_update
+
+    def failing_batch_update(self, body):
+        if any("rows" in r.get("updateCells", {}) for r in body.get("requests", [])):
+            raise RuntimeError("values write failed")
+        return real_batch_update(self, body)
+
+    def failing_values_update(self, body):
+        raise RuntimeError("values write failed")
+
+    monkeypatch.setattr(gspread.Spreadsheet, "batch_update", failing_batch_update)
+    monkeypatch.setattr(gspread.Spreadsheet, "values_batch_update", failing_values_update)
+    with pytest.raises(RuntimeError):
+        writer.write_monthly_report(ssid, "client", _data("25"), SINCE, UNTIL)
+    monkeypatch.undo()
+
+    # следующий запуск (новый процесс — кэш метаданных пуст) видит старое состояние
+    # листа и дописывает изменения
+    from sheets import meta_cache
+    meta_cache.invalidate(ssid)
+    assert writer.write_monthly_report(ssid, "client", _data("25"), SINCE, UNTIL) > 0
+    assert _table_cell(writer, ssid, "H51") == 25
+    assert writer.write_monthly_report(ssid, "client", _data("25"), SINCE, UNTIL) == 0
@@ -1,5 +1,9 @@
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Callable, Iterable, List, Tuple
 from dateutil import tz
 
 def extract_spreadsheet_id_from_url(url: str) -> str:
@@ -31,3 +35,57 @@ def parse_period_ddmm_dash_ddmm(s: str, year_hint: int | None = None) -> tuple[s
     if until < since:
         until = f"{year+1}-{int(m2):02d}-{int(d2):02d}"
     return since, until
+
+def run_bounded(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int,
+) -> List[Tuple[Any, Exception | None]]:
+    """
+    Выполняет fn(item) для всех items в пуле из max_workers потоков.
+    Возвращает [(result, error), ...] в порядке items: исключение одного элемента
+    не прерывает остальные (result=None, error=исключение).
+    """
+    items = list(items)
+
+    def _safe(item):
+        try:
+            return fn(item), None
+        except Exception as e:
+            return None, e
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [_safe(it) for it in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(_safe, items))
+
+
+class TokenBucket:
+    """
+    Потокобезопасное ведро токенов: в среднем rate запросов в секунду, всплеск до burst.
+    acquire() блокирует поток, пока не появится токен.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Взять токены; возвращает, сколько секунд пришлось ждать."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                need = (tokens - self._tokens) / self.rate
+            time.sleep(need)
+            waited += need
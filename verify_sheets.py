@@ -1,79 +1,146 @@
 # verify_sheets.py
+"""
+Проверка доступа сервисного аккаунта к таблицам клиентов из листа Monthly.
+
+Таблицы открываются через sheets/meta_cache.py, как и при записи отчётов:
+на файл — открытие и список листов (маска полей без данных ячеек); с проверкой записи (WRITE_CHECK=1 или --write) — плюс чтение Drive
+capabilities.canEdit. Сама запись не делается: иначе у файла менялись бы
+modifiedTime и ревизии, а для мастер-шаблона — и версия (template_manager),
+и каждая проверка заставляла бы пересинхронизировать шаблон.
+Файлы проверяются параллельно (VERIFY_WORKERS), общий темп — GOOGLE_BUCKET
+из sheets/gs_client.py (под квоту Sheets).
+
+    python verify_sheets.py
+    python verify_sheets.py --write --json > verify.json
+"""
 from __future__ import annotations
+import argparse
+import json
 import os, sys, time
-import gspread
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
-from sheets.gs_client import get_gs_client
+import gspread
+from sheets.gs_client import get_gs_client, get_drive_service, GOOGLE_BUCKET
+from sheets import meta_cache
 from catalog.master_index import load_clients
-from config import MONTHLY_SHEET_ID, MONTHLY_SHEET_NAME
+from config import MONTHLY_SHEET_ID, MONTHLY_SHEET_NAME, VERIFY_WORKERS
 
 WRITE_CHECK = os.getenv("WRITE_CHECK", "0") == "1"  # 0 = только чтение, 1 = тест записи
 
-def main():
+def _check_file(gc, ssid: str, write: bool) -> Dict[str, Any]:
+    """Одна таблица: метаданные (+ право на запись). Возвращает {title, sheets, write_ok}."""
+    doc = meta_cache.open_doc(gc, ssid)
+    out = {"title": doc.title, "sheets": sorted(meta_cache.titles(doc)), "write_ok": None}
+    if write:
+        # право на запись — из Drive, без записи в файл
+        GOOGLE_BUCKET.acquire()
+        caps = get_drive_service().files().get(
+            fileId=ssid, fields="capabilities/canEdit", supportsAllDrives=True
+        ).execute().get("capabilities") or {}
+        if not caps.get("canEdit"):
+            raise RuntimeError("нет права на запись (capabilities.canEdit = false)")
+        out["write_ok"] = True
+    return out
+
+def _error_text(e: Exception) -> str:
+    # open_by_key отдаёт 404/403 исключениями без текста ответа
+    if isinstance(e, gspread.exceptions.SpreadsheetNotFound):
+        return "таблица не найдена (404)"
+    if isinstance(e, PermissionError):
+        return "нет доступа у сервисного аккаунта (403)"
+    return str(e) or type(e).__name__
+
+def _report(monthly: Dict[str, Any], write: bool, started: float,
+            ok=(), warn=(), err=()) -> Dict[str, Any]:
+    """Сводка одной формы для всех исходов — --json не зависит от пути."""
+    return {
+        "monthly": monthly,
+        "write_check": write,
+        "ok": list(ok), "warn": list(warn), "err": list(err),
+        "seconds": round(time.time() - started, 1),
+    }
+
+def verify(write: bool = WRITE_CHECK, workers: int = VERIFY_WORKERS) -> Dict[str, Any]:
+    """Проверяет Monthly и все таблицы клиентов; возвращает сводку для JSON."""
+    started = time.time()
     gc = get_gs_client()
 
-    # 1) Проверяем доступ к листу Monthly
+    # 1) Проверяем доступ к листу Monthly (открытая таблица пригодится load_clients)
     try:
-        doc = gc.open_by_key(MONTHLY_SHEET_ID).worksheet(MONTHLY_SHEET_NAME)
-        print(f"✅ Monthly доступен: {MONTHLY_SHEET_ID} / лист '{MONTHLY_SHEET_NAME}'")
+        if MONTHLY_SHEET_NAME not in meta_cache.titles(meta_cache.open_doc(gc, MONTHLY_SHEET_ID)):
+            raise RuntimeError(f"нет листа '{MONTHLY_SHEET_NAME}'")
     except Exception as e:
-        print(f"❌ Нет доступа к Monthly ({MONTHLY_SHEET_ID}): {e}")
-        sys.exit(1)
+        return _report({"ok": False, "error": _error_text(e)}, write, started)
 
     # 2) Читаем всех клиентов
     try:
         clients: List[Dict[str, Any]] = load_clients(gc)
     except Exception as e:
-        print(f"❌ Не удалось загрузить клиентов из Monthly: {e}")
-        sys.exit(1)
+        return _report({"ok": False, "error": f"не удалось загрузить клиентов: {e}"},
+                       write, started)
 
     ok, warn, bad = [], [], []
-
-    # 3) Пробуем открыть каждую таблицу клиента
+    todo = []
     for c in clients:
         name = c.get("ad_name") or "?"
         ssid = (c.get("spreadsheet_id") or "").strip()
-
         if not ssid:
-            warn.append((name, "пустой spreadsheet_id"))
-            print(f"⚠️  {name}: пустой spreadsheet_id")
-            continue
+            warn.append({"ad_name": name, "reason": "пустой spreadsheet_id"})
+        else:
+            todo.append((name, ssid))
 
+    # 3) Таблицы клиентов — параллельно, темп держит общее ведро токенов
+    def _one(item):
+        name, ssid = item
         try:
-            sh = gc.open_by_key(ssid)
-            sheet = sh.sheet1  # просто дергаем первый лист
-            title = sheet.title
-
-            if WRITE_CHECK:
-                # Аккуратный write-check: пишем/очищаем в дальнюю ячейку
-                cell = "ZZ1000"
-                old = sheet.acell(cell).value
-                sheet.update_acell(cell, "__ping__")
-                sheet.update_acell(cell, old or "")
-                print(f"✅✍️  {name}: открыт, запись ок (лист: {title})")
-            else:
-                print(f"✅ {name}: открыт (лист: {title})")
-
-            ok.append(name)
-
+            return {"ad_name": name, "spreadsheet_id": ssid, **_check_file(gc, ssid, write)}, None
         except Exception as e:
-            bad.append((name, str(e)))
-            print(f"❌ {name}: нет доступа/ошибка → {e}")
+            return None, {"ad_name": name, "spreadsheet_id": ssid, "error": _error_text(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for res, err in pool.map(_one, todo):
+            (ok if res else bad).append(res or err)
 
-        # чуть притормозим, чтобы не спамить API
-        time.sleep(0.1)
+    monthly = {"ok": True, "spreadsheet_id": MONTHLY_SHEET_ID, "sheet": MONTHLY_SHEET_NAME}
+    return _report(monthly, write, started, ok, warn, bad)
+
+def _print_human(report: Dict[str, Any]) -> None:
+    m = report["monthly"]
+    if not m["ok"]:
+        print(f"❌ Нет доступа к Monthly ({MONTHLY_SHEET_ID}): {m['error']}")
+        return
+    print(f"✅ Monthly доступен: {MONTHLY_SHEET_ID} / лист '{MONTHLY_SHEET_NAME}'")
+    for r in report["ok"]:
+        mark = "✅✍️ " if r["write_ok"] else "✅"
+        print(f"{mark} {r['ad_name']}: открыт (файл: {r['title']}, листов: {len(r['sheets'])})")
 
     # 4) Сводка
     print("\n— РЕЗЮМЕ —")
-    print(f"ОК: {len(ok)} | WARN: {len(warn)} | ERR: {len(bad)}")
-    if warn:
+    print(f"ОК: {len(report['ok'])} | WARN: {len(report['warn'])} | ERR: {len(report['err'])} "
+          f"| за {report['seconds']:.0f} с")
+    if report["warn"]:
         print("⚠️  WARN:")
-        for n, msg in warn:
-            print(f"  - {n}: {msg}")
-    if bad:
+        for w in report["warn"]:
+            print(f"  - {w['ad_name']}: {w['reason']}")
+    if report["err"]:
         print("❌ ERR:")
-        for n, err in bad:
-            print(f"  - {n}: {err}")
+        for e in report["err"]:
+            print(f"  - {e['ad_name']}: {e['error']}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Проверка доступа к таблицам клиентов")
+    ap.add_argument("--write", action="store_true", default=WRITE_CHECK, help="проверить и запись")
+    ap.add_argument("--workers", type=int, default=VERIFY_WORKERS, help="параллельных проверок")
+    ap.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = ap.parse_args(argv)
+
+    report = verify(write=args.write, workers=args.workers)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_human(report)
+    if not report["monthly"]["ok"]:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()